@@ -0,0 +1,263 @@
+"""
+Benchmarks for TempoApp startup and interaction latency.
+
+The app is run against the local ImageServer stand-in
+(``tempods.local_imageserver``), so no network access is needed and results
+are comparable between runs. Results are written as JSON, and can be compared
+against an earlier results file to flag regressions::
+
+    python benchmarks/bench_app.py --output bench.json
+    python benchmarks/bench_app.py --output new.json --compare bench.json
+"""
+
+from argparse import ArgumentParser
+from asyncio import new_event_loop, run_coroutine_threadsafe
+from datetime import date, timedelta
+from os import chdir, environ
+from pathlib import Path
+from tempfile import mkdtemp
+from threading import Thread
+from time import perf_counter
+
+import json
+import platform
+import subprocess
+import sys
+
+import numpy as np
+
+from tempods.local_imageserver import LocalImageServer
+from tempods.tracing import trace_snapshot
+from tempods.transport import request_metrics
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_DATA_DIR = REPO_ROOT / "notebooks"
+FIRST_DATE = date(2024, 11, 13)
+COLD_DAY_SPACING = 5
+# How long to wait for a change to be applied before giving up
+TIMEOUT = 60
+
+
+def summarize(samples):
+    values = np.asarray(samples, dtype=float) * 1000
+    return {
+        "n": len(values),
+        "mean_ms": float(values.mean()),
+        "median_ms": float(np.median(values)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "min_ms": float(values.min()),
+        "max_ms": float(values.max()),
+    }
+
+
+class UiThread:
+    """
+    A thread running an event loop, which the apps are created and changed
+    on, as on a Solara server (see ``load_test.SimulatedSession``). Their UI
+    dispatchers then apply background results on it, as they would there.
+    """
+
+    def __init__(self):
+        self.loop = new_event_loop()
+        self.thread = Thread(target=self.loop.run_forever, name="bench-ui", daemon=True)
+        self.thread.start()
+
+    def call(self, func, *args):
+        async def handle():
+            return func(*args)
+        return run_coroutine_threadsafe(handle(), self.loop).result(TIMEOUT)
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+def timed(func, *args):
+    start = perf_counter()
+    func(*args)
+    return perf_counter() - start
+
+
+def wait_idle(scheduler):
+    if not scheduler.wait_idle(TIMEOUT):
+        raise TimeoutError(f"Not applied within {TIMEOUT} s")
+
+
+def bench_startup(ui, repeats):
+    from tempods.app import TempoApp
+
+    samples = {}
+    app = None
+    for _ in range(repeats):
+        if app is not None:
+            ui.call(app.close)
+        start = perf_counter()
+        app = ui.call(TempoApp)
+        # The map is usable once the app is created; the timeseries viewer and
+        # overlays are built in the background after that
+        samples.setdefault("startup.first_map", []).append(perf_counter() - start)
+        if not app.wait_ready(TIMEOUT):
+            raise TimeoutError(f"App not ready within {TIMEOUT} s")
+        samples.setdefault("startup.total", []).append(perf_counter() - start)
+        for phase, elapsed in app.startup_phases.phases.items():
+            samples.setdefault(f"startup.{phase}", []).append(elapsed)
+        for phase, elapsed in app.secondary_phases.phases.items():
+            samples.setdefault(f"startup.secondary.{phase}", []).append(elapsed)
+    return samples, app
+
+
+def bench_update_image(ui, app, repeats):
+    # Time both the widget callback and the (normally deferred) application of
+    # the final value to the TEMPO layer
+    samples = []
+    for i in range(repeats):
+        def step():
+            # Always move to a different time step, so that each one is a change
+            steps = [t for t in app.time_axis.tolist() if t != app.time_slider.value]
+            app.time_slider.value = steps[i % len(steps)]
+
+        def update():
+            ui.call(step)
+            wait_idle(app.timestep_scheduler)
+        samples.append(timed(update))
+    return {"update_image": samples}
+
+
+def bench_update_date(ui, app, repeats):
+    samples = {"update_date.cold": [], "update_date.warm": []}
+    # The time step catalog prefetches the days either side of each date it's
+    # asked for, so the cold days are spaced far enough apart that none of
+    # them was prefetched by the previous one
+    days = [FIRST_DATE + timedelta(days=10 + COLD_DAY_SPACING * i) for i in range(repeats)]
+
+    def change_date(day):
+        ui.call(setattr, app.date_chooser, "value", day)
+        wait_idle(app.date_scheduler)
+
+    for day in days:
+        samples["update_date.cold"].append(timed(change_date, day))
+    for day in days:
+        # Step away first so that the date actually changes
+        change_date(FIRST_DATE)
+        samples["update_date.warm"].append(timed(change_date, day))
+    return samples
+
+
+def bench_update_slider_value(ui, app, repeats):
+    fractions = np.linspace(0, 1, repeats)
+    samples = [timed(ui.call, app.on_timeseries_click, {"domain": {"x": float(x)}}) for x in fractions]
+    wait_idle(app.timestep_scheduler)
+    return {"update_slider_value": samples}
+
+
+def bench_subset_selection(ui, app, repeats):
+    widget = app.powerplant_widget
+    n_types = len(widget.type_options)
+    n_sizes = len(widget.size_options)
+    samples = {"subsets.type_selections": [], "subsets.size_selections": []}
+    for i in range(repeats):
+        types = [t for t in range(n_types) if (i >> t) & 1]
+        sizes = [s for s in range(n_sizes) if ((i + 1) >> s) & 1]
+
+        samples["subsets.type_selections"].append(timed(ui.call, setattr, widget, "type_selections", types))
+        samples["subsets.size_selections"].append(timed(ui.call, setattr, widget, "size_selections", sizes))
+    return samples
+
+
+def metadata():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    import tempods
+    return {
+        "tempods_version": tempods.__version__,
+        "git_commit": commit,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "timestamp": date.today().isoformat(),
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Return the benchmarks whose median is more than ``threshold`` (a fraction)
+    slower than in ``baseline``.
+    """
+    regressions = []
+    for name, stats in results["benchmarks"].items():
+        previous = baseline.get("benchmarks", {}).get(name)
+        if previous is None or previous["median_ms"] == 0:
+            continue
+        ratio = stats["median_ms"] / previous["median_ms"]
+        if ratio > 1 + threshold:
+            regressions.append((name, previous["median_ms"], stats["median_ms"], ratio))
+    return regressions
+
+
+def run(repeats, startup_repeats):
+    ui = UiThread()
+    app = None
+    try:
+        samples, app = bench_startup(ui, startup_repeats)
+        samples.update(bench_update_image(ui, app, repeats))
+        samples.update(bench_update_date(ui, app, max(repeats // 5, 3)))
+        samples.update(bench_update_slider_value(ui, app, repeats))
+        samples.update(bench_subset_selection(ui, app, repeats))
+    finally:
+        if app is not None:
+            ui.call(app.close)
+        ui.close()
+    return {
+        "metadata": metadata(),
+        "benchmarks": {name: summarize(values) for name, values in sorted(samples.items())},
+        "requests": request_metrics(),
+        "trace": trace_snapshot(),
+    }
+
+
+def main(args=None):
+    parser = ArgumentParser(description="Benchmark TempoApp against the local ImageServer stand-in")
+    parser.add_argument("--output", default="bench.json", help="Where to write the JSON results")
+    parser.add_argument("--compare", default=None, help="An earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Fractional slowdown in the median that counts as a regression")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--startup-repeats", type=int, default=3)
+    parser.add_argument("--data-dir", default=str(DEFAULT_DATA_DIR),
+                        help="Directory containing Power_Plants.csv and coastlines.geojson")
+    parsed = parser.parse_args(args)
+
+    output = Path(parsed.output).resolve()
+    baseline_path = Path(parsed.compare).resolve() if parsed.compare else None
+
+    with LocalImageServer() as server:
+        environ["TEMPODS_IMAGESERVER_URL"] = server.url
+        environ["TEMPODS_TILE_SERVER"] = server.tile_server
+        environ["TEMPODS_TRANSPORT"] = "live"
+        environ["TEMPODS_CACHE_DIR"] = mkdtemp(prefix="tempods-bench-")
+        chdir(parsed.data_dir)
+        results = run(parsed.repeats, parsed.startup_repeats)
+
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    for name, stats in results["benchmarks"].items():
+        print(f"{name:32s} median {stats['median_ms']:9.2f} ms   p95 {stats['p95_ms']:9.2f} ms")
+
+    if baseline_path is not None:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, parsed.threshold)
+        for name, before, after, ratio in regressions:
+            print(f"REGRESSION {name}: {before:.2f} ms -> {after:.2f} ms ({ratio:.2f}x)")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+"""
+Load test for many concurrent TempoApp sessions in one worker process.
+
+Each simulated session creates its own app on a thread of its own running an
+event loop, as Solara does for each connection, and then repeatedly performs
+scripted interactions (slider scrubs, date changes and subset toggles) on
+that thread with a random think time in between, until the test ends.
+With ``--target solara``, each session also runs in its own Solara virtual
+kernel context, as it would on a Solara server. The app is run against the
+local ImageServer stand-in (``tempods.local_imageserver``), or against a frame
+store with ``--frame-store``, so no network access or display is needed.
+
+Several session counts can be given, to find where latency degrades::
+
+    python benchmarks/load_test.py --sessions 1,5,10,20 --duration 30 --output load.json
+
+For each session count, the results include the throughput, the p50/p95/p99
+latency of each interaction, the startup time of the sessions, the memory
+used per session (both measured from the process RSS and as estimated by the
+apps themselves), and how often each interaction failed with each error. The
+first occurrence of each error is logged with its traceback.
+"""
+
+from argparse import ArgumentParser
+from asyncio import new_event_loop, run_coroutine_threadsafe
+from collections import Counter
+from contextlib import nullcontext
+from datetime import timedelta
+from os import chdir, environ, sysconf
+from pathlib import Path
+from tempfile import mkdtemp
+from threading import Thread
+from time import perf_counter, sleep
+from typing import Callable, Dict, List
+
+import gc
+import json
+import resource
+
+import numpy as np
+
+from bench_app import DEFAULT_DATA_DIR, FIRST_DATE, metadata, summarize
+from tempods.local_imageserver import LocalImageServer
+from tempods.tracing import trace_snapshot
+from tempods.transport import request_metrics
+from cosmicds.logger import setup_logger
+
+logger = setup_logger("LOAD_TEST")
+
+ACTIONS = ("scrub", "date", "subsets")
+DEFAULT_MIX = "scrub=0.7,date=0.1,subsets=0.2"
+# Date changes pick a day within this many days of FIRST_DATE
+DATE_RANGE_DAYS = 30
+# How long an action may take to be applied before it counts as an error
+ACTION_TIMEOUT = 60
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    mix = {}
+    for part in text.split(","):
+        action, _, weight = part.partition("=")
+        action = action.strip()
+        if action not in ACTIONS:
+            raise ValueError(f"Unknown action {action!r}, should be one of {ACTIONS}")
+        mix[action] = float(weight)
+    total = sum(mix.values())
+    return {action: weight / total for action, weight in mix.items()}
+
+
+def rss_bytes() -> int:
+    """
+    The resident memory of this process (or, where /proc isn't available, the
+    peak resident memory).
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _virtual_kernel_context(index: int):
+    # Importing the Solara server app patches ipywidgets so that each virtual
+    # kernel context keeps its own widgets
+    import solara.server.app  # noqa: F401
+    from solara.server import kernel, kernel_context
+
+    return kernel_context.VirtualKernelContext(id=f"load-test-{index}", session_id=f"load-test-{index}",
+                                               kernel=kernel.Kernel())
+
+
+class SimulatedSession:
+    """
+    One simulated user of the app. As on a Solara server, the app lives on a
+    thread of its own running an event loop, which handles the session's
+    widget changes (as the browser's messages would be) one at a time, and
+    which the app's UI dispatcher applies background results on.
+    """
+
+    def __init__(self, index: int, target: str, seed: int):
+        self.index = index
+        self.target = target
+        self.rng = np.random.default_rng(seed)
+        self.app = None
+        self.context = None
+        self.loop = new_event_loop()
+        self.thread = Thread(target=self.loop.run_forever, name=f"load-test-session-{index}", daemon=True)
+        # The number of times each distinct error was raised by each action
+        self.errors: Dict[str, Counter] = {action: Counter() for action in ACTIONS}
+        self.samples: Dict[str, List[float]] = {action: [] for action in ACTIONS}
+
+    def _entered(self):
+        return self.context if self.context is not None else nullcontext()
+
+    def _call(self, func: Callable, *args):
+        """
+        Call ``func`` on the session's thread, within its kernel context.
+        """
+        async def handle():
+            with self._entered():
+                return func(*args)
+        return run_coroutine_threadsafe(handle(), self.loop).result(ACTION_TIMEOUT)
+
+    def start(self) -> float:
+        from tempods.app import TempoApp
+
+        self.thread.start()
+        if self.target == "solara":
+            self.context = _virtual_kernel_context(self.index)
+        start = perf_counter()
+        self.app = self._call(TempoApp)
+        self.app.wait_ready()
+        return perf_counter() - start
+
+    def _wait(self, scheduler):
+        if not scheduler.wait_idle(ACTION_TIMEOUT):
+            raise TimeoutError(f"Not applied within {ACTION_TIMEOUT} s")
+
+    def _scrub(self):
+        steps = [step for step in self.app.time_axis.tolist() if step != self.app.time_slider.value]
+        if steps:
+            self.app.time_slider.value = steps[self.rng.integers(len(steps))]
+
+    def scrub(self):
+        self._call(self._scrub)
+        self._wait(self.app.timestep_scheduler)
+
+    def _date(self):
+        day = FIRST_DATE + timedelta(days=int(self.rng.integers(DATE_RANGE_DAYS)))
+        if day == self.app.date_chooser.value:
+            day += timedelta(days=DATE_RANGE_DAYS)
+        self.app.date_chooser.value = day
+
+    def date(self):
+        self._call(self._date)
+        self._wait(self.app.date_scheduler)
+
+    def subsets(self):
+        widget = self.app.powerplant_widget
+        types = [t for t in range(len(widget.type_options)) if self.rng.random() < 0.5]
+        sizes = [s for s in range(len(widget.size_options)) if self.rng.random() < 0.5]
+        self._call(widget.set_selections, types, sizes)
+
+    def run(self, mix: Dict[str, float], deadline: float, think_time: float):
+        actions = list(mix)
+        weights = [mix[action] for action in actions]
+        while perf_counter() < deadline:
+            action = actions[self.rng.choice(len(actions), p=weights)]
+            start = perf_counter()
+            try:
+                getattr(self, action)()
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                if error not in self.errors[action]:
+                    logger.exception(f"Session {self.index}: {action} failed")
+                self.errors[action][error] += 1
+            else:
+                self.samples[action].append(perf_counter() - start)
+            if think_time > 0:
+                sleep(min(self.rng.exponential(think_time), max(deadline - perf_counter(), 0)))
+
+    def memory_estimate(self) -> dict:
+        return self._call(self.app.memory_estimate)
+
+    def close(self):
+        self._call(self.app.close)
+        if self.context is not None:
+            self.context.close()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.app = None
+
+
+def run_level(n_sessions: int, target: str, mix: Dict[str, float], duration: float,
+              think_time: float, seed: int) -> dict:
+    from tempods.sessions import live_sessions
+
+    gc.collect()
+    rss_before = rss_bytes()
+    sessions = [SimulatedSession(i, target, seed + i) for i in range(n_sessions)]
+    startup = [session.start() for session in sessions]
+    rss_started = rss_bytes()
+
+    start = perf_counter()
+    threads = [Thread(target=session.run, args=(mix, start + duration, think_time),
+                      name=f"load-test-{session.index}", daemon=True)
+               for session in sessions]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = perf_counter() - start
+
+    rss_after = rss_bytes()
+    estimates = [session.memory_estimate()["total"] for session in sessions]
+    shared_bytes = live_sessions()["shared_bytes"]
+    for session in sessions:
+        session.close()
+
+    samples = {action: [value for session in sessions for value in session.samples[action]]
+               for action in ACTIONS}
+    total = sum(len(values) for values in samples.values())
+    return {
+        "sessions": n_sessions,
+        "duration_s": elapsed,
+        "startup": summarize(startup),
+        "throughput_per_s": total / elapsed,
+        "action_throughput_per_s": {action: len(values) / elapsed for action, values in samples.items()},
+        "latency": {action: summarize(values) for action, values in samples.items() if values},
+        "errors": sum(sum(session.errors[action].values()) for session in sessions for action in ACTIONS),
+        "error_details": {action: dict(sum((session.errors[action] for session in sessions), Counter()))
+                          for action in ACTIONS},
+        "memory": {
+            "rss_before_bytes": rss_before,
+            "rss_started_bytes": rss_started,
+            "rss_after_bytes": rss_after,
+            "rss_per_session_bytes": (rss_after - rss_before) / n_sessions,
+            "estimated_per_session_bytes": float(np.median(estimates)),
+            "shared_bytes": shared_bytes,
+        },
+    }
+
+
+def print_level(result: dict):
+    memory = result["memory"]
+    print(f"{result['sessions']:4d} sessions: {result['throughput_per_s']:8.1f} actions/s, "
+          f"{result['errors']} errors, {memory['rss_per_session_bytes'] / 2 ** 20:7.1f} MB RSS/session "
+          f"({memory['estimated_per_session_bytes'] / 2 ** 20:.1f} MB estimated)")
+    for action, stats in result["latency"].items():
+        print(f"      {action:8s} p50 {stats['median_ms']:9.2f} ms   p95 {stats['p95_ms']:9.2f} ms   "
+              f"p99 {stats['p99_ms']:9.2f} ms   (n={stats['n']})")
+    for action, errors in result["error_details"].items():
+        for error, count in errors.items():
+            print(f"      {action:8s} {count:5d} x {error}")
+
+
+def main(args=None):
+    parser = ArgumentParser(description="Load test TempoApp with many concurrent simulated sessions")
+    parser.add_argument("--sessions", default="1,5,10",
+                        help="Comma-separated numbers of concurrent sessions to test in turn")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds to drive each set of sessions for")
+    parser.add_argument("--think-time", type=float, default=0.5,
+                        help="Mean pause (in seconds, exponentially distributed) between a session's actions")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Relative frequency of each action")
+    parser.add_argument("--target", choices=("app", "solara"), default="app",
+                        help="Create apps directly, or each in its own Solara virtual kernel context")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--frame-store", default=None,
+                        help="Serve frames from this frame store (offline mode) rather than synthetic data")
+    parser.add_argument("--output", default="load.json", help="Where to write the JSON results")
+    parser.add_argument("--data-dir", default=str(DEFAULT_DATA_DIR),
+                        help="Directory containing Power_Plants.csv and coastlines.geojson")
+    parsed = parser.parse_args(args)
+
+    levels = [int(n) for n in parsed.sessions.split(",")]
+    mix = parse_mix(parsed.mix)
+    output = Path(parsed.output).resolve()
+
+    # Nothing is displayed, so make sure nothing needs a display
+    environ.setdefault("MPLBACKEND", "Agg")
+    results = {"metadata": metadata(), "config": dict(vars(parsed), mix=mix), "levels": []}
+    with LocalImageServer() as server:
+        environ["TEMPODS_IMAGESERVER_URL"] = server.url
+        environ["TEMPODS_TILE_SERVER"] = server.tile_server
+        environ["TEMPODS_TRANSPORT"] = "live"
+        environ["TEMPODS_CACHE_DIR"] = mkdtemp(prefix="tempods-load-")
+        if parsed.frame_store is not None:
+            environ["TEMPODS_FRAME_STORE"] = str(Path(parsed.frame_store).resolve())
+        chdir(parsed.data_dir)
+        for n_sessions in levels:
+            result = run_level(n_sessions, parsed.target, mix, parsed.duration, parsed.think_time, parsed.seed)
+            results["levels"].append(result)
+            print_level(result)
+        results["requests"] = request_metrics()
+        results["trace"] = trace_snapshot()
+
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
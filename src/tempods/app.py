@@ -1,70 +1,133 @@
+from cosmicds.logger import setup_logger
 from cosmicds.utils import load_template
-from glue_jupyter.view import Viewer
 import ipyvuetify as v
-from ipyvuetify.VuetifyTemplate import VuetifyTemplate
-from ipywidgets import DOMWidget, widget_serialization
-from traitlets import Dict, Instance
+from concurrent.futures import CancelledError, Future
+from ipywidgets import widget_serialization
+from threading import Event
+from traitlets import Bool, Dict
+from typing import TYPE_CHECKING, Optional
 
+from datetime import date
 from os import getenv
-import json
-import glue_jupyter as gj
-from glue_map.data import RemoteGeoData_ArcGISImageServer, Data
-from glue_map.map.state import MapViewerState
-from tempods.components.subset_control_widget import SubsetControlWidget
-
-from glue.config import colormaps
-from ipyleaflet import Map, Marker, LayersControl, TileLayer, WidgetControl, GeoJSON
-from datetime import date, datetime, timezone, timedelta
-from ipywidgets import SelectionSlider, Layout, Label, VBox, Dropdown, DatePicker, HTML, AppLayout, widgets, FloatSlider
-import pandas as pd
-import numpy as np
-
+import time
+from tempods.scheduler import LatestValueScheduler
+from tempods.sessions import SESSIONS, array_ids, close_widgets, close_with_kernel, estimate_nbytes, widget_tree
+from tempods.tasks import UiDispatcher, remote_executor
+from tempods.time_axis import TimeAxis
+from tempods.timing import PhaseTimer
+from tempods.tracing import traced
+
+# glue, glue_jupyter, glue_map and ipyleaflet (and through them pandas and
+# matplotlib) take most of a second to import, so they are imported where
+# they're first used rather than when this module is imported
+if TYPE_CHECKING:
+    from glue_jupyter.view import Viewer
+    from ipyvuetify.VuetifyTemplate import VuetifyTemplate
+    from tempods.hotspots import Hotspots
+    from tempods.plant_sampling import PlantSamples
+    from tempods.region_stats import Region
+
+logger = setup_logger("APP")
 
 v.theme.dark = True
 
+# These can be pointed at a local stand-in (see tempods.local_imageserver) with
+# the TEMPODS_IMAGESERVER_URL and TEMPODS_TILE_SERVER environment variables
+ASDC_URL = "https://gis.earthdata.nasa.gov/image/rest/services/C2930763263-LARC_CLOUD/"
+STADIA_TILE_SERVER = "https://tiles.stadiamaps.com/tiles"
+FIRST_DATE = date(2024, 11, 13)
+
 
 class TempoApp(v.VuetifyTemplate):
+    """
+    The TEMPO data story app. The map and its controls are built first; the
+    timeseries viewer, coastlines, plant table and hotspot overlay are built
+    afterwards (see ``build_secondary``), so that the map can be shown and
+    used as early as possible.
+
+    Startup phases and the main callbacks are timed by ``tempods.tracing``;
+    with ``debug`` (or the TEMPODS_DEBUG_PANEL environment variable) a panel
+    showing these timings is added below the viewers.
+
+    Each app is listed in ``tempods.sessions.SESSIONS`` until it is closed.
+    Call ``close`` when the session ends to release its glue data, viewers,
+    widgets and callbacks (e.g. in Solara, from the cleanup of a
+    ``use_effect`` in the component that creates the app).
+    """
+
     template = load_template("app.vue", __file__, traitlet=True).tag(sync=True)
     viewers = Dict().tag(sync=True, **widget_serialization)
     # Calling this just "widgets" or "components" caused problems - must be some name clashes with ipyvuetify
     extra_widgets = Dict().tag(sync=True, **widget_serialization)
+    # Whether a remote call (e.g. loading a new date) is in progress
+    loading = Bool(False).tag(sync=True)
+
+    def __init__(self, *args, defer: bool = True, debug: Optional[bool] = None, **kwargs):
+        from glue_jupyter import jglue
+        from glue_map.data import RemoteGeoData_ArcGISImageServer
+        from glue_map.map.state import MapViewerState
+        from ipyleaflet import TileLayer, WidgetControl
+        from ipywidgets import DatePicker, Layout, SelectionSlider
+        from tempods.components.opacity_control import OpacityControl
+        from tempods.components.playback_control import PlaybackControl
+        from tempods.components.subset_control_widget import SubsetControlWidget
+        from tempods.datasets import power_plants_data, power_plants_index
+        from tempods.frame_store import frame_store, store_frame_loader, store_image_server, store_time_step_catalog
+        from tempods.frames import FramePrefetcher, ImageServerFrameSource, frame_loader
+        from tempods.region_stats import RegionalStatistics
+        from tempods.timesteps import time_step_catalog
 
-
-    def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-
-        self.glue_app = gj.jglue()
-        asdc_url = "https://gis.earthdata.nasa.gov/image/rest/services/C2930763263-LARC_CLOUD/"
+        self.startup_phases = PhaseTimer(trace="startup")
+        self.startup_phases.mark("imports")
+        self.debug = bool(getenv("TEMPODS_DEBUG_PANEL")) if debug is None else debug
+        # Results of remote calls made on worker threads are applied here
+        self.ui = UiDispatcher()
+        self.closed = False
+        self.session_id = SESSIONS.register(self)
+        # On a Solara server, the app is closed along with the browser session
+        close_with_kernel(self, self.ui.kernel_context)
+
+        self.glue_app = jglue()
+        asdc_url = getenv("TEMPODS_IMAGESERVER_URL", ASDC_URL)
+        # In offline mode, frames are read from a local store (see
+        # tempods.frame_store) and served to the map by a local ImageServer,
+        # which the browser must be able to reach (see store_image_server)
+        self.frame_store_path = getenv("TEMPODS_FRAME_STORE")
+        if self.frame_store_path:
+            asdc_url = store_image_server(self.frame_store_path).url
+            time_steps = store_time_step_catalog(self.frame_store_path)
+            loader = store_frame_loader(self.frame_store_path)
+        else:
+            time_steps = time_step_catalog(asdc_url)
+            loader = frame_loader(asdc_url)
         tempo_data = RemoteGeoData_ArcGISImageServer(asdc_url,
                                                      name='TEMPO')
-
-        power_data = self.glue_app.load_data("Power_Plants.csv")
+        self.tempo_data = tempo_data
+        self.frames = FramePrefetcher(loader)
+        # Regional statistics are computed locally from the cached frames
+        grid = frame_store(self.frame_store_path) if self.frame_store_path else ImageServerFrameSource(asdc_url)
+        self.grid = grid
+        self.region_stats = RegionalStatistics(self.frames.cache.get, extent=grid.extent, shape=grid.shape)
+        self.startup_phases.mark("glue_app")
+
+        # The catalog is parsed (and Size_binned derived) once per process;
+        # each session gets its own lightweight view of the shared arrays
+        power_data = power_plants_data()
+        self.power_data = power_data
+        self.glue_app.add_data(power_data)
         self.glue_app.add_data(tempo_data)
+        self.startup_phases.mark("load_data")
 
         # Our remote dataset does not have real components representing latitude and longitude. We link to the only components
         # it does have so that we can display this on the same viewer without trigger and IncompatibleAttribute error
         self.glue_app.add_link(self.glue_app.data_collection["Power_Plants"], 'Longitude',  self.glue_app.data_collection["TEMPO"], 'Pixel Axis 0')
         self.glue_app.add_link(self.glue_app.data_collection["Power_Plants"], 'Latitude', self.glue_app.data_collection["TEMPO"], 'TEMPO_NO2_L3_V03_HOURLY_TROPOSPHERIC_VERTICAL_COLUMN_BETA')
+        self.startup_phases.mark("add_link")
 
-        big = (power_data['Install_MW'] > 100)
-        med = (power_data['Install_MW'] > 10) & (power_data['Install_MW'] <= 100)
-        small = (power_data['Install_MW'] <= 10)
-        power_data.add_component(big*9 + med*4 + small*1, label='Size_binned')
-
-        with open('coastlines.geojson', 'r') as f:
-            coastdata = json.load(f)
-        geo_json = GeoJSON(
-            data=coastdata,
-            style={
-                'color': 'black',
-                'opacity': 1,
-                'fillOpacity': 0,
-                'weight': 0.5
-            },
-        )
-
-        stadia_base_url = "https://tiles.stadiamaps.com/tiles/stamen_toner_lines/{z}/{x}/{y}{r}.png"
-        stadia_labels_url="https://tiles.stadiamaps.com/tiles/stamen_toner_labels/{z}/{x}/{y}{r}.png"
+        tile_server = getenv("TEMPODS_TILE_SERVER", STADIA_TILE_SERVER)
+        stadia_base_url = tile_server + "/stamen_toner_lines/{z}/{x}/{y}{r}.png"
+        stadia_labels_url = tile_server + "/stamen_toner_labels/{z}/{x}/{y}{r}.png"
 
         stadia_api_key = getenv("STADIA_API_KEY")
         if stadia_api_key is not None:
@@ -76,14 +139,171 @@ class TempoApp(v.VuetifyTemplate):
         map_viewer.map.panes = {"labels": {"zIndex": 650}}
 
         _ = map_viewer.map.add(TileLayer(url=stadia_labels_url, pane='labels'))
-        _ = map_viewer.map.add(geo_json)
+        self.startup_phases.mark("map_viewer")
 
-        powerplant_widget = SubsetControlWidget(power_data, map_viewer)
+        # Only plants near the current view are sent, clustered at low zoom
+        powerplant_widget = SubsetControlWidget(power_data, map_viewer, render_mode="single",
+                                                index=power_plants_index())
 
         self.add_widget(powerplant_widget, "powerplant")
         self.add_viewer(map_viewer, "map")
+        self.startup_phases.mark("subsets")
+
+        # The date picker, rather than the timeseries viewer (which is built
+        # later), decides the first date shown
+        date_chooser = DatePicker(description='Pick a Date')
+        date_chooser.value = FIRST_DATE
+        self.time_axis = TimeAxis(time_steps.get_time_steps(date_chooser.value))
+        self.startup_phases.mark("time_steps")
+
+        slider = SelectionSlider(description='Time (UTC):', options=self.time_axis.options(), layout=Layout(width='600px', height='25px'))
+        self.frames.update(slider.value, self.time_axis.tolist())
+
+        # Built by build_secondary
+        self.timeseries_viewer: Optional["Viewer"] = None
+        self.coastlines = None
+        self.plant_table = None
+        self._plant_sampling: Optional[Future] = None
+        self.region_plot = None
+        self.region_subsets = None
+        self._region_sampling: Optional[Future] = None
+        self.plant_sampler = None
+        self.hotspot_overlay = None
+        self.hotspot_toggle = None
+        self.hotspots: Optional["Hotspots"] = None
+        self.debug_panel = None
+        self.secondary_phases = PhaseTimer()
+        self.secondary_ready = Event()
+
+        @traced("app.apply_timestep")
+        def apply_timestep(timestep):
+            map_viewer.layers[0].state.timestep = timestep
+            if self.timeseries_viewer is not None:
+                self.timeseries_viewer.timemark.x = self.time_axis.timemark(timestep)
+            self.update_hotspots(timestep)
+
+        @traced("app.load_date")
+        def load_date(value):
+            return value, TimeAxis(time_steps.get_time_steps(value))
+
+        @traced("app.apply_date")
+        def apply_date(loaded):
+            value, time_axis = loaded
+            self.time_axis = time_axis
+            slider.options = time_axis.options()
+            self.frames.update(slider.value, time_axis.tolist())
+            if self.timeseries_viewer is not None:
+                self.timeseries_viewer.state.t_date = value.isoformat()
+            self.refresh_plant_table()
+            self.refresh_region_plot()
+
+        # Bursts of slider and date changes are coalesced so that only the latest
+        # value reaches the TEMPO layer, rather than one remote request per value.
+        # Time steps for a new date are fetched on the shared remote executor, so
+        # a slow server never blocks this (or any other) session.
+        self.timestep_scheduler = LatestValueScheduler(apply_timestep, dispatch=self.ui)
+        self.date_scheduler = LatestValueScheduler(apply_date, prepare=load_date,
+                                                   executor=remote_executor(),
+                                                   dispatch=self.ui,
+                                                   on_busy=self._set_loading)
+
+        @traced("app.update_image")
+        def update_image(change):
+            # Prefetching also cancels queued fetches for timesteps we've moved past
+            self.frames.update(change.new)
+            self.timestep_scheduler.submit(change.new)
+        
+        @traced("app.update_date")
+        def update_date(change):
+            self.date_scheduler.submit(change.new)
+            
+        date_chooser.observe(update_date, 'value')
+        
+        slider.observe(update_image, 'value')
+        control = WidgetControl(widget=slider, position='bottomleft')
+        map_viewer.map.add(control)
 
-        timeseries_viewer = self.glue_app.new_data_viewer('timeseries', data=tempo_data, show=False)
+        self.playback = PlaybackControl(slider, self.frames, dispatch=self.ui)
+        map_viewer.map.add(WidgetControl(widget=self.playback, position='bottomleft'))
+        
+        # Dragging the slider only changes the TEMPO layer in the front end;
+        # the glue layer state (which the opacity is restored from as we scrub
+        # through timesteps) is updated when the drag ends, and throttled during it
+        self.opacity_control = OpacityControl(map_viewer)
+        map_viewer.map.add(WidgetControl(widget=self.opacity_control, position='topleft'))
+        map_viewer.map.add(WidgetControl(widget=date_chooser, position='bottomleft'))
+
+        @traced("app.update_slider_value")
+        def update_slider_value(event):
+            if 'domain' in event and 'x' in event['domain'] and len(self.time_axis) > 0:
+                # The click position is reported as a fraction of the time range
+                slider.value = self.time_axis.nearest_fraction(event['domain']['x'])
+
+        self.map_viewer = map_viewer
+        self.powerplant_widget = powerplant_widget
+        self.time_slider = slider
+        self.date_chooser = date_chooser
+        self.on_timeseries_click = update_slider_value
+        # The map shows the first time step of the date picked above
+        apply_timestep(slider.value)
+        self.startup_phases.mark("controls")
+
+        if not defer:
+            self.build_secondary()
+        else:
+            # In a kernel, this runs once the current cell (and so the display
+            # of the map) has finished
+            self.ui.defer(self.build_secondary)
+
+    def build_secondary(self):
+        """
+        Build the parts of the app that aren't needed for the first view of
+        the map: the timeseries viewer, the coastline overlay, the plant NO2
+        table and the hotspot overlay. ``secondary_ready`` is set once done.
+        """
+        if self.secondary_ready.is_set() or self.closed:
+            self.secondary_ready.set()
+            return
+        try:
+            self._build_secondary()
+        except Exception:
+            logger.exception("Failed to build the timeseries viewer and overlays")
+        finally:
+            self.secondary_ready.set()
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for ``build_secondary`` to finish. Without an event loop, this
+        runs the queued UI callbacks (and so the build) while waiting, if
+        called from the thread that created the app.
+        """
+        if self.ui.loop is not None or not self.ui.is_ui_thread():
+            return self.secondary_ready.wait(timeout)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.secondary_ready.is_set():
+            remaining = 0.05 if deadline is None else min(deadline - time.monotonic(), 0.05)
+            if remaining <= 0:
+                return False
+            self.ui.run_pending(remaining)
+        return True
+
+    def _build_secondary(self):
+        from ipyleaflet import WidgetControl
+        from ipywidgets import Checkbox
+        from tempods.coastlines import CoastlineOverlay
+        from tempods.components.debug_panel import DebugPanel
+        from tempods.components.plant_no2_table import PlantNO2Table
+        from tempods.datasets import power_plants_index
+        from tempods.hotspots import DEFAULT_RADIUS_KM, HotspotOverlay
+        from tempods.plant_sampling import PlantSampler
+        from tempods.region_plot import RegionStatsPlot, RegionSubsets
+
+        phases = self.secondary_phases = PhaseTimer(trace="startup.secondary")
+        phases.mark("imports")
+        map_viewer = self.map_viewer
+
+        timeseries_viewer = self.glue_app.new_data_viewer('timeseries', data=self.tempo_data, show=False)
+        timeseries_viewer.state.t_date = self.date_chooser.value.isoformat()
         timeseries_viewer.figure_widget.layout = {"height": "400px"}
         timeseries_viewer.figure.axes[1].label_offset = "-50"
         timeseries_viewer.figure.axes[1].tick_format = ".0f"
@@ -103,79 +323,291 @@ class TempoApp(v.VuetifyTemplate):
 
 
         timeseries_viewer.figure.axes[0].tick_format = "%H:%M"
+        timeseries_viewer.timemark.x = self.time_axis.timemark(self.time_slider.value)
+        timeseries_viewer.add_event_callback(callback=self.on_timeseries_click, events=['click'])
 
         self.add_viewer(timeseries_viewer, "timeseries")
-        
-        def convert_from_milliseconds(milliseconds_since_epoch):
-            """Converts milliseconds since epoch to a date-time string in 'YYYY-MM-DDTHH:MM:SSZ' format."""
-            dt = datetime.fromtimestamp((milliseconds_since_epoch)/ 1000, tz=timezone(offset=timedelta(hours=0), name="UTC"))
-            date_time_str = dt.strftime('%H:%M')
-            return date_time_str
-        
-        time_values = tempo_data.get_time_steps(timeseries_viewer.state.t_date)
-        time_strings = [convert_from_milliseconds(t) for t in time_values]  
-        time_options = [(time_strings[i], time_values[i]) for i in range(len(time_values))]
-        
-        slider = SelectionSlider(description='Time (UTC):', options=time_options, layout=Layout(width='600px', height='25px'))
-        dt = datetime.fromtimestamp((slider.value)/ 1000, tz=timezone(offset=timedelta(hours=0), name="UTC"))
-        timeseries_viewer.timemark.x = np.array([dt, dt]).astype('datetime64[ms]')
-        
-        date_chooser = DatePicker(description='Pick a Date')
-        date_chooser.value = date(2024, 11, 13)
-        def update_image(change):
-            map_viewer.layers[0].state.timestep = change.new
-            dt = datetime.fromtimestamp((change.new)/ 1000, tz=timezone(offset=timedelta(hours=0), name="UTC"))
-            timeseries_viewer.timemark.x = np.array([dt, dt]).astype('datetime64[ms]')
-        
-        def update_date(change):
-            time_values = tempo_data.get_time_steps(change.new.isoformat())
-            time_strings = [convert_from_milliseconds(t) for t in time_values]  
-            time_options = [(time_strings[i], time_values[i]) for i in range(len(time_values))]
-            slider.options = time_options
-            timeseries_viewer.state.t_date = change.new.isoformat()
-            
-        date_chooser.observe(update_date, 'value')
-        
-        slider.observe(update_image, 'value')
-        control = WidgetControl(widget=slider, position='bottomleft')
-        map_viewer.map.add(control)
-        
-        opacity_slider = FloatSlider(description='', value=1, min=0, max=1, orientation='vertical', readout=False)
-        opacity_slider.layout = {"width":"28px"}
-
-        # Doing the link this simple way does not work, and causes the opacity to be reset
-        # as we scrub through timesteps. Instead, we need to do a callback on the glue state attribute
-        # mylink = widgets.jslink((opacity_slider, 'value'), (map_viewer.map.layers[1], 'opacity'))
-
-        def update_opacity(change):
-            if change.new != change.old:
-                map_viewer.layers[0].state.opacity = change.new
-        opacity_slider.observe(update_opacity, 'value')
-
-        opacity_label = WidgetControl(widget=widgets.Label('Opacity:'), position='topleft')
-        opacity_control = WidgetControl(widget=opacity_slider, position='topleft')
-        map_viewer.map.add(opacity_label)
-        map_viewer.map.add(opacity_control)
-        map_viewer.map.add(WidgetControl(widget=date_chooser, position='bottomleft'))
+        self.timeseries_viewer = timeseries_viewer
+        phases.mark("timeseries_viewer")
 
-        def update_slider_value(event):
-            if 'domain' in event and 'x' in event['domain']:
-                value = event['domain']['x']
-                t = [i[1] for i in slider.options]
-                smax = max(t)
-                smin = min(t)
-                t = [abs(((i - smin) / (smax - smin)) - value) for i in t]
-                min_index = min(range(len(t)), key = t.__getitem__)
-                slider.value = slider.options[min_index][1]
-
-        timeseries_viewer.add_event_callback(callback = update_slider_value, events=['click'])
-
-    def add_viewer(self, viewer: Viewer, label: str):
+        # Only the coastline features in view are sent, at a level of detail
+        # matching the current zoom
+        coastlines = CoastlineOverlay(
+            style={
+                'color': 'black',
+                'opacity': 1,
+                'fillOpacity': 0,
+                'weight': 0.5
+            },
+        )
+        coastlines.connect(map_viewer)
+        self.coastlines = coastlines
+        phases.mark("coastlines")
+
+        self.plant_sampler = PlantSampler.for_data(self.power_data, extent=self.grid.extent, shape=self.grid.shape)
+        self.plant_table = PlantNO2Table(self.power_data)
+        # The frames of the whole day are only sampled while the table is open
+        self.plant_table.observe(lambda change: self.refresh_plant_table(), "open")
+        self.add_widget(self.plant_table, "plant_no2")
+        phases.mark("plant_table")
+
+        # The NO2 within the regions drawn on the map, computed locally from
+        # the frames (and so only loading them while there are regions)
+        self.region_plot = RegionStatsPlot()
+        self.region_subsets = RegionSubsets(self.tempo_data, lambda: self.ui(self.refresh_region_plot))
+        self.add_widget(self.region_plot.figure, "region_stats")
+        self.refresh_region_plot()
+        phases.mark("region_plot")
+
+        # Hotspots in the current frame, and the plants near them
+        self.plant_index = power_plants_index()
+        self.hotspot_radius_km = DEFAULT_RADIUS_KM
+        self.hotspot_overlay = HotspotOverlay()
+        map_viewer.map.add(self.hotspot_overlay.layer)
+        hotspot_toggle = Checkbox(value=False, description='NO2 hotspots', indent=False)
+        hotspot_toggle.observe(lambda change: self.update_hotspots(), 'value')
+        map_viewer.map.add(WidgetControl(widget=hotspot_toggle, position='topright'))
+        self.hotspot_toggle = hotspot_toggle
+        phases.mark("hotspots")
+
+        if self.debug:
+            self.debug_panel = DebugPanel(dispatch=self.ui)
+            self.add_widget(self.debug_panel, "debug")
+
+    def close(self):
+        """
+        Release everything owned by this session (see ``release``) and close
+        the app widget itself. On a Solara server this is called when the
+        session's kernel is closed; elsewhere (e.g. in Jupyter), whoever
+        created the app should call it.
+        """
+        self.release()
+        super().close()
+
+    def release(self):
+        """
+        Stop playback and pending updates, disconnect the callbacks on the
+        viewers, remove the glue data and close every widget below the app
+        (and so its comm). Shared datasets and the shared frame cache are left
+        alone. Releasing twice does nothing.
+        """
+        # An app whose __init__ failed is closed by Widget.__del__ with nothing
+        # to release
+        if getattr(self, "closed", True):
+            return
+        self.closed = True
+        # Queued UI callbacks (including a pending build of the secondary
+        # parts) are dropped
+        self.ui.close()
+        self.secondary_ready.set()
+
+        # Collect the widgets first, since disconnecting removes some of them
+        # (e.g. the coastline layer) from the tree
+        widgets = widget_tree(self)
+        self.playback.stop()
+        if self.debug_panel is not None:
+            self.debug_panel.live = False
+        self.timestep_scheduler.cancel()
+        self.date_scheduler.cancel()
+        for sampling in (self._plant_sampling, self._region_sampling):
+            if sampling is not None:
+                sampling.cancel()
+        if self.region_subsets is not None:
+            self.region_subsets.disconnect()
+        self.frames.stop()
+        if self.coastlines is not None:
+            self.coastlines.disconnect()
+        self.powerplant_widget.disconnect()
+        self.opacity_control.disconnect()
+
+        for viewer in [self.map_viewer, self.timeseries_viewer]:
+            if viewer is not None:
+                viewer.cleanup()
+        self.glue_app.data_collection.clear()
+        self.region_stats.invalidate()
+
+        close_widgets(widget for widget in widgets if widget is not self)
+        self.viewers = {}
+        self.extra_widgets = {}
+        SESSIONS.unregister(self.session_id)
+
+    def memory_estimate(self) -> dict:
+        """
+        The approximate memory (in bytes) held by this session alone, i.e.
+        not counting the datasets and frames shared between sessions.
+        """
+        from tempods.datasets import DATASETS
+
+        # Arrays are only counted once, under the first category reaching them
+        seen = array_ids(DATASETS.loaded())
+        estimate = {
+            "data": 0 if self.closed else estimate_nbytes(list(self.glue_app.data_collection), seen),
+            "subsets": estimate_nbytes(vars(self.powerplant_widget), seen),
+            "region_stats": estimate_nbytes(self.region_stats, seen),
+            "plant_samples": estimate_nbytes(getattr(self.plant_table, "samples", None), seen),
+            "hotspots": estimate_nbytes(self.hotspots, seen),
+        }
+        estimate["total"] = sum(estimate.values())
+        estimate["widgets"] = 0 if self.closed else len(widget_tree(self))
+        return estimate
+
+    def region_timeseries(self, region: "Region", wait: bool = False, timesteps=None) -> dict:
+        """
+        The NO2 statistics within ``region`` for the given time steps (by
+        default, those of the current date), computed from the frames that are
+        already cached (or, with ``wait``, after loading the rest).
+        """
+        steps = self.time_axis.tolist() if timesteps is None else list(timesteps)
+        if wait:
+            for future in [self.frames.loader.request(t) for t in steps]:
+                future.result()
+        return self.region_stats.timeseries(region, steps)
+
+    def find_hotspots(self, frame, method: str = "components") -> "Hotspots":
+        """
+        Detect the hotspots in a frame and join them to the power plants within
+        ``hotspot_radius_km``.
+        """
+        from tempods.hotspots import detect_hotspots
+
+        hotspots = detect_hotspots(frame, extent=self.region_stats.extent, method=method)
+        return hotspots.join_plants(self.plant_index, self.hotspot_radius_km)
+
+    def update_hotspots(self, timestep: Optional[int] = None):
+        """
+        Show the hotspots of the given (by default, the current) time step, if
+        enabled. If the frame isn't loaded yet, they're shown once it is.
+        """
+        if self.hotspot_toggle is None:
+            return
+        if not self.hotspot_toggle.value:
+            self.frames.remove_consumer("hotspots")
+            self.hotspots = None
+            self.hotspot_overlay.clear()
+            return
+        # Hotspots are found in Python, so the frames around the current time
+        # step are worth prefetching while they're shown
+        self.frames.add_consumer("hotspots")
+        timestep = self.time_slider.value if timestep is None else timestep
+        future = self.frames.loader.request(timestep)
+
+        def show(future):
+            if future.cancelled() or timestep != self.time_slider.value:
+                return
+            if future.exception() is not None:
+                logger.warning(f"Couldn't load the frame for hotspots at {timestep}: {future.exception()!r}")
+                return
+            self.hotspots = self.find_hotspots(future.result())
+            self.hotspot_overlay.update(self.hotspots, self.plant_index.lon, self.plant_index.lat,
+                                        self.hotspot_radius_km)
+
+        if future.done():
+            show(future)
+        else:
+            future.add_done_callback(lambda f: self.ui(show, f))
+
+    def sample_plants(self, timesteps=None, wait: bool = False) -> "PlantSamples":
+        """
+        Sample NO2 at every power plant for the given time steps (by default,
+        those of the current date), as a plants x time steps array. Frames
+        that aren't cached are missing (NaN) unless ``wait`` is set.
+        """
+        steps = self.time_axis.tolist() if timesteps is None else list(timesteps)
+        if wait:
+            futures = [self.frames.loader.request(t) for t in steps]
+            frames = [future.result() for future in futures]
+            return self.plant_sampler.sample(frames, steps)
+        return self.plant_sampler.sample_timesteps(self.frames.cache.get, steps)
+
+    def refresh_plant_table(self):
+        """
+        While the plant table is open, load the current date's frames in the
+        background and update the table with the samples once they are all
+        available. While it is closed, nothing is loaded; the samples of an
+        older date are dropped, and the current date is sampled when the
+        table is next opened.
+        """
+        if self.plant_table is None:
+            return
+        steps = self.time_axis.tolist()
+        samples = self.plant_table.samples
+        if samples is not None and list(samples.timesteps) == steps:
+            return
+        if self._plant_sampling is not None:
+            self._plant_sampling.cancel()
+            self._plant_sampling = None
+        if not self.plant_table.open:
+            self.plant_table.update(None)
+            self.plant_table.items_loading = False
+            return
+
+        self.plant_table.items_loading = True
+        future = remote_executor().submit(self.sample_plants, steps, True)
+        self._plant_sampling = future
+        future.add_done_callback(lambda f: self.ui(self._plant_samples_done, f))
+
+    def _plant_samples_done(self, future: Future):
+        # Ignore the results of a sampling that was superseded
+        if future.cancelled() or future is not self._plant_sampling:
+            return
+        self._plant_sampling = None
+        self.plant_table.items_loading = False
+        error = future.exception()
+        if isinstance(error, CancelledError):
+            logger.info("Loading the frames for the plant table was cancelled")
+            self.plant_table.summary = "Loading the NO2 frames was cancelled"
+        elif error is not None:
+            logger.warning(f"Unable to sample NO2 at the power plants: {error!r}")
+            self.plant_table.summary = f"Unable to load the NO2 frames ({type(error).__name__})"
+        else:
+            self.plant_table.update(future.result())
+
+    def refresh_region_plot(self):
+        """
+        Compute the NO2 statistics within each region drawn on the map for the
+        current date in the background, and show them in the region plot once
+        the day's frames are loaded. Nothing is loaded while there are no
+        regions.
+        """
+        if self.region_plot is None:
+            return
+        if self._region_sampling is not None:
+            self._region_sampling.cancel()
+            self._region_sampling = None
+        regions = self.region_subsets.regions()
+        if not regions:
+            self.region_plot.clear()
+            return
+
+        steps = self.time_axis.tolist()
+
+        def sample():
+            return [(label, color, self.region_timeseries(region, wait=True, timesteps=steps))
+                    for label, color, region in regions]
+
+        future = remote_executor().submit(sample)
+        self._region_sampling = future
+        future.add_done_callback(lambda f: self.ui(self._region_samples_done, f))
+
+    def _region_samples_done(self, future: Future):
+        if future.cancelled() or future is not self._region_sampling:
+            return
+        self._region_sampling = None
+        error = future.exception()
+        if error is not None:
+            logger.warning(f"Unable to compute the regional statistics: {error!r}")
+            return
+        self.region_plot.update(future.result())
+
+    def _set_loading(self, loading: bool):
+        self.ui(setattr, self, "loading", loading)
+
+    def add_viewer(self, viewer: "Viewer", label: str):
         current_viewers = {k: v for k, v in self.viewers.items()}
         current_viewers.update({label: viewer._layout})
         self.viewers = current_viewers
 
-    def add_widget(self, component: VuetifyTemplate, label: str):
+    def add_widget(self, component: "VuetifyTemplate", label: str):
         current_widgets = {k: v for k, v in self.extra_widgets.items()}
         current_widgets.update({label: component})
         self.extra_widgets = current_widgets
@@ -0,0 +1,142 @@
+from argparse import ArgumentParser
+from glue.core import Data
+from glue.core.component import CategoricalComponent, Component
+from os import chmod, replace, stat, unlink
+from pathlib import Path
+from tempfile import mkstemp
+from typing import Dict, Union
+from zipfile import BadZipFile
+
+import numpy as np
+import pandas as pd
+
+from tempods.tracing import traced
+from cosmicds.logger import setup_logger
+
+logger = setup_logger("CATALOG")
+
+# The only catalog columns used by the app. Everything else in the CSV is
+# dropped when building the binary catalog.
+NUMERIC_COLUMNS = ("Longitude", "Latitude", "Install_MW")
+CATEGORICAL_COLUMNS = ("PrimSource",)
+CATALOG_COLUMNS = NUMERIC_COLUMNS + CATEGORICAL_COLUMNS
+
+PathLike = Union[str, Path]
+
+
+def binary_path(csv_path: PathLike) -> Path:
+    return Path(csv_path).with_suffix(".npz")
+
+
+def _source_signature(csv_path: PathLike) -> np.ndarray:
+    info = stat(csv_path)
+    return np.array([info.st_mtime_ns, info.st_size], dtype=np.int64)
+
+
+@traced("catalog.read_csv")
+def _read_csv(csv_path: PathLike) -> Dict[str, np.ndarray]:
+    frame = pd.read_csv(csv_path, usecols=list(CATALOG_COLUMNS))
+    arrays = {}
+    for column in NUMERIC_COLUMNS:
+        arrays[column] = frame[column].to_numpy(dtype=np.float32)
+    for column in CATEGORICAL_COLUMNS:
+        categories, codes = np.unique(frame[column].to_numpy(dtype=str), return_inverse=True)
+        arrays[f"{column}_categories"] = categories
+        arrays[f"{column}_codes"] = codes.astype(np.int8)
+    return arrays
+
+
+def write_catalog(arrays: Dict[str, np.ndarray], source_signature: np.ndarray, output_path: PathLike) -> Path:
+    """
+    Write catalog columns (as read by ``_read_csv``) to a binary catalog. The
+    file is written next to ``output_path`` and then moved into place, so that
+    readers never see a partly written catalog.
+    """
+    output_path = Path(output_path)
+    fd, tmp_path = mkstemp(dir=output_path.parent, prefix=f".{output_path.stem}.", suffix=".npz.tmp")
+    try:
+        with open(fd, "wb") as f:
+            np.savez(f, source_signature=source_signature, **arrays)
+        # mkstemp only makes the file readable by its owner
+        chmod(tmp_path, 0o644)
+        replace(tmp_path, output_path)
+    except BaseException:
+        unlink(tmp_path)
+        raise
+    logger.info(f"Wrote binary catalog {output_path}")
+    return output_path
+
+
+def build_catalog(csv_path: PathLike, output_path: PathLike = None) -> Path:
+    """
+    Convert the power plant CSV into a compact binary catalog containing only
+    the columns that the app needs. Categorical columns are stored as integer
+    codes alongside their (sorted) categories.
+    """
+    # Taken before reading, so that a CSV changed meanwhile makes the catalog stale
+    signature = _source_signature(csv_path)
+    return write_catalog(_read_csv(csv_path), signature, output_path or binary_path(csv_path))
+
+
+def _read_fresh(csv_path: PathLike, npz_path: Path) -> Union[Dict[str, np.ndarray], None]:
+    """
+    The columns of the binary catalog, or None if it is missing, unreadable
+    or was built from a different version of the CSV.
+    """
+    try:
+        with np.load(npz_path) as npz:
+            if not np.array_equal(npz["source_signature"], _source_signature(csv_path)):
+                logger.info(f"Binary catalog {npz_path} is stale")
+                return None
+            return {key: npz[key] for key in npz.files if key != "source_signature"}
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError, BadZipFile, EOFError) as e:
+        logger.warning(f"Unable to read binary catalog {npz_path}, rebuilding it: {e!r}")
+        return None
+
+
+@traced("catalog.load")
+def load_catalog(csv_path: PathLike) -> Dict[str, np.ndarray]:
+    """
+    Load the catalog columns, preferring the binary catalog next to the CSV.
+    If the binary catalog is missing, unreadable or was built from a different
+    version of the CSV, the CSV is parsed instead and the binary catalog is
+    rebuilt from what was parsed.
+    """
+    npz_path = binary_path(csv_path)
+    arrays = _read_fresh(csv_path, npz_path)
+    if arrays is not None:
+        return arrays
+
+    signature = _source_signature(csv_path)
+    arrays = _read_csv(csv_path)
+    try:
+        write_catalog(arrays, signature, npz_path)
+    except OSError as e:
+        logger.warning(f"Unable to write binary catalog {npz_path}: {e}")
+    return arrays
+
+
+def load_catalog_data(csv_path: PathLike, label: str = None) -> Data:
+    arrays = load_catalog(csv_path)
+    data = Data(label=label or Path(csv_path).stem)
+    for column in NUMERIC_COLUMNS:
+        data.add_component(Component(arrays[column]), column)
+    for column in CATEGORICAL_COLUMNS:
+        categories = arrays[f"{column}_categories"]
+        values = categories[arrays[f"{column}_codes"]]
+        data.add_component(CategoricalComponent(values, categories=categories), column)
+    return data
+
+
+def main(args=None):
+    parser = ArgumentParser(description="Build the binary power plant catalog from its CSV")
+    parser.add_argument("csv_path", help="Path to Power_Plants.csv")
+    parser.add_argument("-o", "--output", default=None, help="Output path (defaults to the CSV path with a .npz suffix)")
+    parsed = parser.parse_args(args)
+    build_catalog(parsed.csv_path, parsed.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+from ipyleaflet import GeoJSON
+from typing import List, Optional
+
+import numpy as np
+
+from tempods.datasets import COASTLINES_PATH, DATASETS, coastlines_geojson
+from tempods.spatial import Bounds, estimate_bounds, pad_bounds
+
+# Minimum zoom level at which each level of detail is used, and the
+# Douglas-Peucker tolerance (in degrees) used to simplify it. Each tolerance is
+# roughly half a screen pixel at the corresponding zoom level.
+DETAIL_LEVELS = ((0, 0.1), (5, 0.02), (7, 0.005), (9, 0.0))
+
+
+def simplify_line(coords: np.ndarray, tolerance: float) -> np.ndarray:
+    """
+    Simplify a line with the Douglas-Peucker algorithm, keeping its endpoints.
+    """
+    n = len(coords)
+    if tolerance <= 0 or n < 3:
+        return coords
+
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        segment = coords[end] - coords[start]
+        points = coords[start + 1:end] - coords[start]
+        length = np.hypot(segment[0], segment[1])
+        if length == 0:
+            distances = np.hypot(points[:, 0], points[:, 1])
+        else:
+            distances = np.abs(segment[0] * points[:, 1] - segment[1] * points[:, 0]) / length
+        index = np.argmax(distances)
+        if distances[index] > tolerance:
+            middle = start + 1 + index
+            keep[middle] = True
+            stack.append((start, middle))
+            stack.append((middle, end))
+    return coords[keep]
+
+
+def _lines(geometry: dict) -> List[np.ndarray]:
+    if geometry["type"] == "LineString":
+        return [np.asarray(geometry["coordinates"], dtype=float)]
+    return [np.asarray(line, dtype=float) for line in geometry["coordinates"]]
+
+
+class CoastlineLevel:
+    """
+    The coastline features simplified to a single tolerance, along with the
+    bounding box and minimum zoom level of each feature.
+    """
+
+    def __init__(self, geojson: dict, tolerance: float):
+        self.tolerance = tolerance
+        self.features = []
+        bboxes = []
+        min_zooms = []
+        for feature in geojson["features"]:
+            lines = [simplify_line(line, tolerance) for line in _lines(feature["geometry"])]
+            points = np.concatenate(lines)
+            bboxes.append((*points.min(axis=0), *points.max(axis=0)))
+            min_zooms.append(feature["properties"].get("min_zoom", 0))
+
+            coordinates = [np.round(line, 4).tolist() for line in lines]
+            if len(coordinates) == 1:
+                geometry = {"type": "LineString", "coordinates": coordinates[0]}
+            else:
+                geometry = {"type": "MultiLineString", "coordinates": coordinates}
+            self.features.append({"type": "Feature", "properties": {}, "geometry": geometry})
+
+        # Columns are west, south, east, north
+        self.bboxes = np.array(bboxes, dtype=float).reshape(-1, 4)
+        self.min_zooms = np.array(min_zooms, dtype=float)
+
+    def visible_indices(self, bounds: Optional[Bounds], zoom: float) -> np.ndarray:
+        mask = self.min_zooms <= zoom
+        if bounds is not None:
+            (south, west), (north, east) = bounds
+            mask &= (self.bboxes[:, 1] <= north) & (self.bboxes[:, 3] >= south)
+            # Skip longitude culling if the view wraps around the antimeridian
+            if -180 <= west and east <= 180:
+                mask &= (self.bboxes[:, 0] <= east) & (self.bboxes[:, 2] >= west)
+        return np.flatnonzero(mask)
+
+    def feature_collection(self, indices: np.ndarray) -> dict:
+        return {"type": "FeatureCollection", "features": [self.features[i] for i in indices]}
+
+
+def _build_levels(path: str) -> List[CoastlineLevel]:
+    geojson = coastlines_geojson(path)
+    return [CoastlineLevel(geojson, tolerance) for _, tolerance in DETAIL_LEVELS]
+
+
+def coastline_levels(path: str = COASTLINES_PATH) -> List[CoastlineLevel]:
+    """
+    Return the precomputed levels of detail, in the same order as
+    ``DETAIL_LEVELS``. These are computed once per process.
+    """
+    return DATASETS.get(f"coastline_levels:{path}", lambda: _build_levels(path))
+
+
+def level_for_zoom(zoom: float) -> int:
+    index = 0
+    for i, (min_zoom, _) in enumerate(DETAIL_LEVELS):
+        if zoom >= min_zoom:
+            index = i
+    return index
+
+
+class CoastlineOverlay:
+    """
+    A coastline layer that only sends the features intersecting the current
+    map view, simplified to a level of detail appropriate for the zoom level.
+    """
+
+    def __init__(self, path: str = COASTLINES_PATH, style: dict = None):
+        self.levels = coastline_levels(path)
+        self.layer = GeoJSON(data={"type": "FeatureCollection", "features": []}, style=style or {})
+        self._map = None
+        self._viewer_state = None
+        self._current = None
+
+    def connect(self, viewer):
+        """
+        Attach the overlay to a map viewer, keeping its features in sync with
+        the viewer's zoom level and the map bounds.
+        """
+        self._map = viewer.map
+        self._viewer_state = viewer.state
+        self._map.add(self.layer)
+        self._viewer_state.add_callback("zoom_level", self._on_view_changed)
+        self._map.observe(self._on_view_changed, names=["bounds"])
+        self.update()
+
+    def disconnect(self):
+        if self._map is None:
+            return
+        self._viewer_state.remove_callback("zoom_level", self._on_view_changed)
+        self._map.unobserve(self._on_view_changed, names=["bounds"])
+        self._map.remove(self.layer)
+        self._map = None
+        self._viewer_state = None
+        self._current = None
+
+    def _on_view_changed(self, *args):
+        self.update()
+
+    def _bounds(self, zoom: float) -> Bounds:
+        bounds = self._map.bounds
+        if not bounds:
+            bounds = estimate_bounds(self._viewer_state.center, zoom)
+        return pad_bounds(bounds)
+
+    def update(self):
+        zoom = self._viewer_state.zoom_level
+        level_index = level_for_zoom(zoom)
+        level = self.levels[level_index]
+        indices = level.visible_indices(self._bounds(zoom), zoom)
+
+        key = (level_index, indices.tobytes())
+        if key == self._current:
+            return
+        self._current = key
+        self.layer.data = level.feature_collection(indices)
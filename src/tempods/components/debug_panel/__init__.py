@@ -0,0 +1 @@
+from .debug_panel import DebugPanel
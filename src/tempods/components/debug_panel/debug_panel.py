@@ -0,0 +1,71 @@
+import ipyvuetify as v
+from threading import Event, Thread
+from traitlets import Bool, List, Unicode
+from typing import Callable, Optional
+
+import time
+
+from cosmicds.utils import load_template
+from tempods.tracing import TRACER, Tracer
+
+
+class DebugPanel(v.VuetifyTemplate):
+    """
+    A table of the tracer's timings for each phase and callback. While
+    ``live`` is set, the table is refreshed every ``interval`` seconds;
+    updates are applied with ``dispatch`` (e.g. the app's UI dispatcher).
+    """
+
+    template = load_template("debug_panel.vue", __file__, traitlet=True).tag(sync=True)
+    headers = List().tag(sync=True)
+    items = List().tag(sync=True)
+    live = Bool(False).tag(sync=True)
+    updated = Unicode().tag(sync=True)
+
+    def __init__(self, tracer: Tracer = TRACER, interval: float = 2,
+                 dispatch: Optional[Callable] = None):
+        super().__init__()
+        self.tracer = tracer
+        self.interval = interval
+        self.dispatch = dispatch or (lambda callback, *args: callback(*args))
+        self._stop = Event()
+        self._thread = None
+        self.headers = [
+            {"text": "Name", "value": "name"},
+            {"text": "Count", "value": "count"},
+            {"text": "Mean (ms)", "value": "mean_ms"},
+            {"text": "p50 (ms)", "value": "p50_ms"},
+            {"text": "p95 (ms)", "value": "p95_ms"},
+            {"text": "Max (ms)", "value": "max_ms"},
+            {"text": "Last (ms)", "value": "last_ms"},
+        ]
+        self.observe(self._on_live_changed, names=["live"])
+        self.refresh()
+
+    def refresh(self):
+        self.items = [
+            {"name": name, "count": stats["count"],
+             **{key: round(stats.get(key, 0), 2) for key in ("mean_ms", "p50_ms", "p95_ms", "max_ms", "last_ms")}}
+            for name, stats in self.tracer.snapshot().items()
+        ]
+        self.updated = time.strftime("%H:%M:%S")
+
+    def vue_refresh(self, *args):
+        self.refresh()
+
+    def vue_reset(self, *args):
+        self.tracer.reset()
+        self.refresh()
+
+    def _refresh_loop(self):
+        while not self._stop.wait(self.interval):
+            self.dispatch(self.refresh)
+
+    def _on_live_changed(self, change: dict):
+        if change["new"]:
+            self._stop.clear()
+            self._thread = Thread(target=self._refresh_loop, name="tempods-debug-panel", daemon=True)
+            self._thread.start()
+        else:
+            self._stop.set()
+            self._thread = None
@@ -0,0 +1 @@
+from .opacity_control import OpacityControl
@@ -0,0 +1,73 @@
+from glue_jupyter.view import Viewer
+from ipyleaflet import Layer
+import ipyvuetify as v
+from ipywidgets import widget_serialization
+from traitlets import Float, Instance, Int
+from typing import Optional
+
+from cosmicds.utils import load_template
+from tempods.tracing import traced
+
+
+def map_layer(layer_artist) -> Optional[Layer]:
+    """
+    The ipyleaflet layer drawn by a map viewer's layer artist, if it has one.
+    """
+    for value in vars(layer_artist).values():
+        if isinstance(value, Layer):
+            return value
+    return None
+
+
+class OpacityControl(v.VuetifyTemplate):
+    """
+    A vertical opacity slider for one of a map viewer's layers.
+
+    While the slider is dragged, the opacity of the map layer is changed in
+    the front end only. The value is written back to the glue layer state,
+    which is what the map viewer restores the opacity from (e.g. when the
+    timestep changes), when the drag ends and at most every ``throttle_ms``
+    during it. A drag therefore sends a few messages to the kernel rather
+    than one per tick.
+    """
+
+    template = load_template("opacity_control.vue", __file__, traitlet=True).tag(sync=True)
+    value = Float(1).tag(sync=True)
+    layer = Instance(Layer, allow_none=True).tag(sync=True, **widget_serialization)
+    throttle_ms = Int(250).tag(sync=True)
+
+    def __init__(self, viewer: Viewer, layer_index: int = 0, throttle_ms: int = 250):
+        super().__init__()
+        self.viewer = viewer
+        self.layer_index = layer_index
+        self.throttle_ms = throttle_ms
+        self.value = self._state.opacity
+        self._update_layer()
+        self.observe(self._on_value_changed, names=["value"])
+        self._state.add_callback("opacity", self._on_state_opacity_changed)
+        # The map viewer may replace its leaflet layers (e.g. when the data
+        # changes), so the front end is given the current one
+        self.viewer.map.observe(self._on_map_layers_changed, names=["layers"])
+
+    @property
+    def _state(self):
+        return self.viewer.layers[self.layer_index].state
+
+    def _update_layer(self):
+        self.layer = map_layer(self.viewer.layers[self.layer_index])
+
+    def disconnect(self):
+        self._state.remove_callback("opacity", self._on_state_opacity_changed)
+        self.viewer.map.unobserve(self._on_map_layers_changed, names=["layers"])
+
+    @traced("app.update_opacity")
+    def _on_value_changed(self, change: dict):
+        if self._state.opacity != change["new"]:
+            self._state.opacity = change["new"]
+
+    def _on_state_opacity_changed(self, opacity: float):
+        if self.value != opacity:
+            self.value = opacity
+
+    def _on_map_layers_changed(self, change: dict):
+        self._update_layer()
@@ -0,0 +1 @@
+from .plant_no2_table import PlantNO2Table
@@ -0,0 +1,95 @@
+from glue.core import Data
+import ipyvuetify as v
+import numpy as np
+from traitlets import Bool, List, Unicode
+from typing import Optional
+
+from cosmicds.utils import load_template
+from tempods.plant_sampling import PlantSamples
+
+# Values are shown in the same units as the timeseries axis
+DISPLAY_UNIT = 1e14
+
+
+class PlantNO2Table(v.VuetifyTemplate):
+    """
+    A table of the NO2 sampled over each power plant during a day, which can
+    be filtered by plant type and size. Only the ``max_rows`` plants with the
+    highest NO2 are sent to the front end. It starts collapsed, since filling
+    it needs every frame of the day; the app only samples the plants while
+    it is ``open``.
+    """
+
+    template = load_template("plant_no2_table.vue", __file__, traitlet=True).tag(sync=True)
+    headers = List().tag(sync=True)
+    items = List().tag(sync=True)
+    items_loading = Bool(False).tag(sync=True)
+    open = Bool(False).tag(sync=True)
+    type_options = List().tag(sync=True)
+    type_selections = List().tag(sync=True)
+    size_options = List().tag(sync=True)
+    size_selections = List().tag(sync=True)
+    summary = Unicode().tag(sync=True)
+
+    def __init__(self, data: Data, max_rows: int = 100):
+        super().__init__()
+        self.glue_data = data
+        self.max_rows = max_rows
+        self.samples: Optional[PlantSamples] = None
+        self.headers = [
+            {"text": "Type", "value": "type"},
+            {"text": "Capacity (MW)", "value": "capacity"},
+            {"text": "Latitude", "value": "latitude"},
+            {"text": "Longitude", "value": "longitude"},
+            {"text": "Mean NO2", "value": "mean"},
+            {"text": "Max NO2", "value": "max"},
+        ]
+        self.type_options = [str(t) for t in np.unique(np.asarray(data["PrimSource"], dtype=str))]
+        self.size_options = [
+            {"text": "Small", "value": 1},
+            {"text": "Medium", "value": 4},
+            {"text": "Large", "value": 9},
+        ]
+        self.type_selections = list(self.type_options)
+        self.size_selections = [option["value"] for option in self.size_options]
+        self.observe(self._on_filters_changed, names=["type_selections", "size_selections"])
+
+    def update(self, samples: Optional[PlantSamples]):
+        self.samples = samples
+        self._refresh()
+
+    def filtered(self) -> Optional[PlantSamples]:
+        if self.samples is None:
+            return None
+        return self.samples.filter(self.glue_data, types=self.type_selections, sizes=self.size_selections)
+
+    def _refresh(self):
+        samples = self.filtered()
+        if samples is None:
+            self.items = []
+            self.summary = ""
+            return
+
+        means = samples.reduce(np.nanmean) / DISPLAY_UNIT
+        maxes = samples.reduce(np.nanmax) / DISPLAY_UNIT
+        order = np.argsort(np.where(np.isnan(maxes), -np.inf, maxes))[::-1][:self.max_rows]
+        rows = samples.plants[order]
+        types = np.asarray(self.glue_data["PrimSource"], dtype=str)[rows]
+        capacity = self.glue_data["Install_MW"][rows]
+        lat = self.glue_data["Latitude"][rows]
+        lon = self.glue_data["Longitude"][rows]
+
+        def number(value, digits):
+            return None if np.isnan(value) else round(float(value), digits)
+
+        self.items = [
+            {"index": int(row), "type": str(types[i]), "capacity": number(capacity[i], 1),
+             "latitude": number(lat[i], 3), "longitude": number(lon[i], 3),
+             "mean": number(means[order[i]], 1), "max": number(maxes[order[i]], 1)}
+            for i, row in enumerate(rows)
+        ]
+        self.summary = (f"{len(samples.plants)} plants over {samples.shape[1]} time steps "
+                        f"(NO2 in 10^14 molecules/cm^2)")
+
+    def _on_filters_changed(self, change: dict):
+        self._refresh()
@@ -0,0 +1 @@
+from .playback_control import PlaybackControl
@@ -0,0 +1,158 @@
+from ipywidgets import SelectionSlider
+import ipyvuetify as v
+from threading import Event, Thread
+from traitlets import Bool, Float, Int, List
+from typing import Callable, Optional, Sequence
+
+import time
+
+from cosmicds.utils import load_template
+from tempods.frames import FramePrefetcher
+
+
+class PlaybackControl(v.VuetifyTemplate):
+    """
+    Play/pause and speed controls that step a time slider through a day's
+    frames at the chosen speed. Each step is applied through ``dispatch``
+    (e.g. the app's ``UiDispatcher``), and the next one is only scheduled once
+    it has been.
+
+    The map's frames are drawn by the browser straight from the ImageServer,
+    so playback can't tell whether they have arrived. When a Python consumer
+    of the frames is active (see ``FramePrefetcher.add_consumer``), playback
+    also slows down as the buffer of frames loaded ahead of the playhead
+    drains, and waits rather than stepping onto a frame that isn't loaded.
+    """
+
+    template = load_template("playback_control.vue", __file__, traitlet=True).tag(sync=True)
+    playing = Bool(False).tag(sync=True)
+    speed = Float(2).tag(sync=True)
+    speed_options = List([1, 2, 4, 8]).tag(sync=True)
+    achieved_fps = Float(0).tag(sync=True)
+    buffered = Int(0).tag(sync=True)
+
+    def __init__(self, slider: SelectionSlider, prefetcher: FramePrefetcher,
+                 buffer_target: int = 4, loop: bool = True,
+                 dispatch: Optional[Callable[..., None]] = None):
+        super().__init__()
+        self.slider = slider
+        self.prefetcher = prefetcher
+        self.buffer_target = buffer_target
+        self.loop = loop
+        self._dispatch = dispatch or (lambda callback, *args: callback(*args))
+        # Each run of the playback loop gets its own stop event, so that a new
+        # run never has to wait for the previous one to notice it was stopped
+        self._stop = Event()
+        self._stop.set()
+        self._thread = None
+        self._idle_radius = prefetcher.radius
+        self._last_step_time = None
+
+        self.observe(self._on_playing_changed, names=["playing"])
+
+    def _steps(self) -> Sequence[int]:
+        return [option[1] for option in self.slider.options]
+
+    def _next_index(self, index: int, count: int) -> int:
+        if index + 1 < count:
+            return index + 1
+        return 0 if self.loop else -1
+
+    def _buffered_ahead(self, steps: Sequence[int], index: int) -> int:
+        # Without a Python-side consumer nothing is prefetched, so there's no
+        # buffer to wait for
+        if not self.prefetcher.active:
+            return self.buffer_target
+        ahead = 0
+        for _ in range(self.buffer_target):
+            index = self._next_index(index, len(steps))
+            if index < 0 or steps[index] not in self.prefetcher.cache:
+                break
+            ahead += 1
+        return ahead
+
+    def _interval(self, ahead: int) -> float:
+        # Play at the requested speed while the buffer is full, and slow down
+        # proportionally as it drains
+        fill = max(ahead / self.buffer_target, 0.25)
+        return 1 / (self.speed * min(fill, 1))
+
+    def _step(self, timestep: int, applied: Event, stop: Event):
+        try:
+            if stop.is_set():
+                return
+            self.slider.value = timestep
+            now = time.monotonic()
+            if self._last_step_time is not None:
+                fps = 1 / (now - self._last_step_time)
+                self.achieved_fps = fps if self.achieved_fps == 0 else 0.8 * self.achieved_fps + 0.2 * fps
+            self._last_step_time = now
+        finally:
+            applied.set()
+
+    def _set_buffered(self, ahead: int):
+        if ahead != self.buffered:
+            self._dispatch(setattr, self, "buffered", ahead)
+
+    def _run(self, stop: Event):
+        while not stop.is_set():
+            steps = self._steps()
+            if not steps:
+                break
+            index = steps.index(self.slider.value) if self.slider.value in steps else 0
+            next_index = self._next_index(index, len(steps))
+            if next_index < 0:
+                break
+
+            ahead = self._buffered_ahead(steps, index)
+            self._set_buffered(ahead)
+            if ahead == 0:
+                # The prefetch window doesn't wrap around, so make sure that the
+                # frame we're waiting for is actually being loaded
+                self.prefetcher.loader.request(steps[next_index])
+                stop.wait(0.05)
+                continue
+
+            if stop.wait(self._interval(ahead)):
+                break
+            applied = Event()
+            self._dispatch(self._step, steps[next_index], applied, stop)
+            while not applied.wait(0.05):
+                if stop.is_set():
+                    return
+
+        # Reached the end of the day without looping
+        if not stop.is_set():
+            self._dispatch(setattr, self, "playing", False)
+
+    def play(self):
+        self.playing = True
+
+    def pause(self):
+        self.playing = False
+
+    def stop(self, timeout: Optional[float] = 1):
+        """
+        Pause, and wait (up to ``timeout`` seconds) for the playback thread to
+        finish.
+        """
+        self.pause()
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _on_playing_changed(self, change: dict):
+        if change["new"]:
+            # A previous run may still be finishing, but it has its own stop
+            # event (already set), so it's left to exit by itself
+            self._stop.set()
+            self._stop = Event()
+            self.achieved_fps = 0
+            self._last_step_time = None
+            self.prefetcher.radius = max(self._idle_radius, 2 * self.buffer_target)
+            self._thread = Thread(target=self._run, args=(self._stop,), daemon=True, name="tempods-playback")
+            self._thread.start()
+        else:
+            self._stop.set()
+            self.prefetcher.radius = self._idle_radius
@@ -1,12 +1,20 @@
+from contextlib import ExitStack
+from echo import delay_callback
 from glue.core import ComponentID, Data
-from glue.core.subset import AndState, CategorySubsetState, RangeSubsetState
+from glue.core.subset import AndState, CategorySubsetState, MaskSubsetState, RangeSubsetState
 from glue_jupyter.view import Viewer
 import ipyvuetify as v
 from itertools import product
+from matplotlib.colors import ListedColormap
+import numpy as np
 from numpy import unique
 from traitlets import List, observe
+from typing import Dict, Optional, Sequence
 
 from cosmicds.utils import load_template
+from tempods.plant_clusters import PlantClusterLayer
+from tempods.spatial import Bounds, GridIndex, cluster_cell_size, cluster_points, estimate_bounds, pad_bounds
+from tempods.tracing import traced
 
 
 class SubsetControlWidget(v.VuetifyTemplate):
@@ -17,21 +25,54 @@ class SubsetControlWidget(v.VuetifyTemplate):
     type_selections = List().tag(sync=True)
     type_colors = List().tag(sync=True)
 
-    def __init__(self, data: Data, viewer: Viewer):
+    # With "subsets", each (type, size) pair is its own subset and map layer.
+    # With "single", plants are drawn colored by type and sized by size bin in
+    # a layer per tile of the view, and the selections only change which
+    # points are included.
+    RENDER_MODES = ("subsets", "single")
+
+    # In "single" mode, plants are drawn as clusters below this zoom level
+    CLUSTER_BELOW_ZOOM = 6
+    # and otherwise in tiles of this many map tiles across, so that moving the
+    # view only resends the plants of the tiles that come into (or leave) it
+    TILE_SPAN = 2
+
+    def __init__(self, data: Data, viewer: Viewer, render_mode: str = "subsets",
+                 index: Optional[GridIndex] = None):
         super().__init__()
+        if render_mode not in self.RENDER_MODES:
+            raise ValueError(f"render_mode should be one of {self.RENDER_MODES}")
         self.glue_data = data
         self.viewer = viewer
+        self.render_mode = render_mode
         self.type_att: ComponentID = data.id["PrimSource"]
         self.size_att: ComponentID = data.id["Size_binned"]
-        
+
         self.type_options = list(unique(self.glue_data[self.type_att]))
         self.size_options = ["Small", "Medium", "Large"]
         self.indices = list(product(range(len(self.type_options)), range(len(self.size_options))))
 
         self.type_colors = ["#1b9e77", "#d95f02", "#7570b3", "#e7298a"]
         self._layer_indices = {}
+        self._visibilities = {}
+        self._batching = False
+        if render_mode == "single":
+            self._create_single_layer()
+            self._connect_viewport(index)
+        else:
+            self._create_subset_layers()
+
+        self.type_selections = []
+        self.size_selections = []
+        self._update_visibilities(self.type_selections, self.size_selections)
+
+        self.observe(self._on_type_selections_changed, names=["type_selections"])
+        self.observe(self._on_size_selections_changed, names=["size_selections"])
+
+    @traced("subsets.create_layers")
+    def _create_subset_layers(self):
         for (idx_t, idx_s) in self.indices:
-            subset = data.new_subset(color=self.type_colors[idx_t], alpha=1)
+            subset = self.glue_data.new_subset(color=self.type_colors[idx_t], alpha=1)
             subset.style.markersize = (idx_s + 1) ** 2
             state = self._subset_state(idx_t, idx_s)
             subset.subset_state = state
@@ -39,16 +80,186 @@ class SubsetControlWidget(v.VuetifyTemplate):
             index = len(self.viewer.layers) - 1
             self._layer_indices[(idx_t, idx_s)] = index
 
-        self.type_selections = []
-        self.size_selections = []
-        self._update_visibilities(self.type_selections, self.size_selections)
+    @traced("subsets.create_layers")
+    def _create_single_layer(self):
+        # The type and size bin of each plant are computed once, so that changing
+        # the selections is a single vectorized mask over the catalog. Type codes
+        # follow the (sorted) order of type_options.
+        self._type_codes = self.glue_data.get_component(self.type_att).codes.astype(int)
+        size_values = self.glue_data[self.size_att]
+        self._size_codes = np.rint(np.sqrt(size_values)).astype(int) - 1
 
-        self.observe(self._on_type_selections_changed, names=["type_selections"])
-        self.observe(self._on_size_selections_changed, names=["size_selections"])
+        # Color mapping needs a numerical attribute rather than a categorical one
+        code_label = f"{self.type_att.label}_code"
+        if code_label not in [cid.label for cid in self.glue_data.main_components]:
+            self.glue_data.add_component(self._type_codes, code_label)
+        self.type_code_att: ComponentID = self.glue_data.id[code_label]
+
+        self._mask_cids = self.glue_data.pixel_component_ids
+        # The plants are drawn by tile (see _plan_points), each shown tile in
+        # one of a pool of layers that are reused as tiles come and go
+        self._tile_ids = np.zeros(self.glue_data.size, dtype=int)
+        self._tile_zoom = None
+        # The subset and current mask of each layer
+        self._slots = []
+        self._slot_tiles: Dict[tuple, int] = {}
+        self.layers = []
+
+    def _add_slot(self):
+        subset = self.glue_data.new_subset(label="Power plants", color=self.type_colors[0], alpha=1)
+        mask = np.zeros(self.glue_data.size, dtype=bool)
+        subset.subset_state = MaskSubsetState(mask, self._mask_cids)
+        self.viewer.add_subset(subset)
+        layer = self.viewer.layers[-1]
+        self._style_layer(layer)
+        self._slots.append((subset, mask))
+        self.layers.append(layer)
+
+    def _style_layer(self, layer):
+        # Colored by type and sized by size bin
+        n_types = len(self.type_options)
+        n_sizes = len(self.size_options)
+        # The properties of glue_map's MapPointsLayerState
+        state = layer.state
+        with delay_callback(state, "color_mode", "cmap_att", "cmap", "cmap_vmin", "cmap_vmax",
+                            "size_mode", "size_att", "size_vmin", "size_vmax"):
+            state.color_mode = "Linear"
+            state.cmap_att = self.type_code_att
+            state.cmap = ListedColormap(self.type_colors[:n_types])
+            state.cmap_vmin = -0.5
+            state.cmap_vmax = n_types - 0.5
+            state.size_mode = "Linear"
+            state.size_att = self.size_att
+            state.size_vmin = 0
+            state.size_vmax = n_sizes ** 2
+
+    def _set_tiles(self, zoom: float):
+        zoom = int(zoom)
+        if zoom == self._tile_zoom:
+            return
+        size = self.TILE_SPAN * 360 / 2 ** zoom
+        columns = np.floor((self.index.lon + 180) / size).astype(int)
+        rows = np.floor((self.index.lat + 90) / size).astype(int)
+        self._tile_ids = rows * (int(360 / size) + 1) + columns
+        self._tile_zoom = zoom
+
+    def _tile_masks(self, points: np.ndarray) -> Dict[tuple, np.ndarray]:
+        indices = np.flatnonzero(points)
+        tiles = self._tile_ids[indices]
+        masks = {}
+        for tile in np.unique(tiles).tolist():
+            mask = np.zeros(self.glue_data.size, dtype=bool)
+            mask[indices[tiles == tile]] = True
+            masks[(self._tile_zoom, tile)] = mask
+        return masks
+
+    def _plan_points(self, points: np.ndarray) -> Dict[int, np.ndarray]:
+        """
+        Assign a layer to each tile with plants to show, reusing the layers of
+        tiles that stay shown, then those of tiles that are no longer shown,
+        and only then adding layers. Returns the new mask of each layer.
+        """
+        masks = self._tile_masks(points)
+        slot_tiles = {tile: slot for tile, slot in self._slot_tiles.items() if tile in masks}
+        free = sorted(set(range(len(self._slots))) - set(slot_tiles.values()), reverse=True)
+        for tile in masks:
+            if tile not in slot_tiles:
+                if not free:
+                    self._add_slot()
+                    free.append(len(self._slots) - 1)
+                slot_tiles[tile] = free.pop()
+        self._slot_tiles = slot_tiles
+        slot_masks = {slot: masks[tile] for tile, slot in slot_tiles.items()}
+        empty = np.zeros(self.glue_data.size, dtype=bool)
+        return {slot: slot_masks.get(slot, empty) for slot in range(len(self._slots))}
+
+    def _update_points(self, slot_masks: Dict[int, np.ndarray]):
+        # Only the layers whose plants changed are sent again
+        for slot, mask in slot_masks.items():
+            subset, current = self._slots[slot]
+            if not np.array_equal(mask, current):
+                self._slots[slot] = (subset, mask)
+                subset.subset_state = MaskSubsetState(mask, self._mask_cids)
+
+    def _connect_viewport(self, index: Optional[GridIndex]):
+        # Only the plants near the current view are included in the layer, and
+        # at low zoom they are replaced by clusters. The index can be shared
+        # between sessions since the plant positions never change.
+        self.index = index or GridIndex(self.glue_data["Longitude"], self.glue_data["Latitude"])
+        self.clusters = PlantClusterLayer(self.type_options, self.type_colors, self.size_options)
+        self._region: Optional[Bounds] = None
+        self._region_zoom = None
+        self._in_region = np.ones(self.glue_data.size, dtype=bool)
+        self.viewer.map.add(self.clusters.layer)
+        self.viewer.state.add_callback("zoom_level", self._on_view_changed)
+        self.viewer.map.observe(self._on_view_changed, names=["bounds"])
+        self._update_region()
+
+    def disconnect(self):
+        """
+        Stop following the viewer's view (e.g. when the session ends).
+        """
+        if self.render_mode != "single":
+            return
+        self.viewer.state.remove_callback("zoom_level", self._on_view_changed)
+        self.viewer.map.unobserve(self._on_view_changed, names=["bounds"])
+        self.clusters.clear()
+
+    def _view_bounds(self, zoom: float) -> Bounds:
+        bounds = self.viewer.map.bounds
+        if not bounds:
+            bounds = estimate_bounds(self.viewer.state.center, zoom)
+        return bounds
+
+    @staticmethod
+    def _contains(outer: Bounds, inner: Bounds) -> bool:
+        (outer_south, outer_west), (outer_north, outer_east) = outer
+        (south, west), (north, east) = inner
+        return outer_south <= south and outer_west <= west and north <= outer_north and east <= outer_east
+
+    def _update_region(self) -> bool:
+        """
+        Update the (padded) region whose plants are sent to the map. The region
+        is only moved once the view leaves it or the zoom level changes, so
+        small pans don't change anything.
+        """
+        zoom = self.viewer.state.zoom_level
+        bounds = self._view_bounds(zoom)
+        if zoom == self._region_zoom and self._region is not None and self._contains(self._region, bounds):
+            return False
+        self._region = pad_bounds(bounds)
+        self._region_zoom = zoom
+        # Whole tiles are shown, so that a tile's plants only change with the
+        # selections
+        self._set_tiles(zoom)
+        in_region = self._tile_ids[self.index.mask_in_bounds(self._region)]
+        self._in_region = np.isin(self._tile_ids, in_region)
+        return True
+
+    def _on_view_changed(self, *args):
+        if self._update_region():
+            self._update_visibilities(self.type_selections, self.size_selections)
+
+    def clustering(self) -> bool:
+        return self.render_mode == "single" and self.viewer.state.zoom_level < self.CLUSTER_BELOW_ZOOM
+
+    def _update_clusters(self, mask: np.ndarray):
+        if not self.clustering():
+            self.clusters.clear()
+            return
+        zoom = int(self.viewer.state.zoom_level)
+        indices = np.flatnonzero(mask)
+        groups = {
+            "type": (self._type_codes[indices], len(self.type_options)),
+            "size": (self._size_codes[indices], len(self.size_options)),
+        }
+        clusters = cluster_points(self.index.lon[indices], self.index.lat[indices],
+                                  cluster_cell_size(zoom), groups)
+        self.clusters.update(clusters, zoom)
 
     def _type_state(self, type_index: int) -> CategorySubsetState:
         return CategorySubsetState(self.type_att, [type_index])
-    
+
     def _size_state(self, size_index: int) -> RangeSubsetState:
         value = (size_index + 1) ** 2
         return RangeSubsetState(value, value, self.size_att)
@@ -59,12 +270,70 @@ class SubsetControlWidget(v.VuetifyTemplate):
     def _layer_index(self, type_index: int, size_index: int) -> int:
         return self._layer_indices[(type_index, size_index)]
 
-    def _update_visibilities(self, type_indices: list[int], size_indices: list[int]):
-        for t, s in self.indices:
-            self.viewer.layers[self._layer_index(t, s)].state.visible = (t in type_indices) and (s in size_indices) 
+    def visible_mask(self, type_indices: Sequence[int], size_indices: Sequence[int]) -> np.ndarray:
+        return np.isin(self._type_codes, type_indices) & np.isin(self._size_codes, size_indices)
+
+    def target_visibilities(self, type_indices: Sequence[int], size_indices: Sequence[int]) -> dict:
+        return {(t, s): (t in type_indices) and (s in size_indices) for t, s in self.indices}
+
+    def _held_sync(self, layers) -> ExitStack:
+        """
+        Hold front-end syncs for the map and its layers, and delay glue
+        callbacks on the states of the given layer artists and the messages
+        of the data's hub, so that all of the changes are sent together when
+        the returned context exits.
+        """
+        stack = ExitStack()
+        stack.enter_context(self.viewer.map.hold_sync())
+        for map_layer in self.viewer.map.layers:
+            stack.enter_context(map_layer.hold_sync())
+        for layer in layers:
+            stack.enter_context(delay_callback(layer.state, "visible"))
+        # Entered last so that the delayed subset messages are handled (and the
+        # layers updated) before the syncs are released
+        if self.glue_data.hub is not None:
+            stack.enter_context(self.glue_data.hub.delay_callbacks())
+        return stack
+
+    @traced("subsets.update_visibilities")
+    def _update_visibilities(self, type_indices: Sequence[int], size_indices: Sequence[int]):
+        if self.render_mode == "single":
+            mask = self.visible_mask(type_indices, size_indices) & self._in_region
+            points = np.zeros_like(mask) if self.clustering() else mask
+            # Any layers needed are added before holding the syncs
+            slot_masks = self._plan_points(points)
+            with self._held_sync(self.layers):
+                self._update_clusters(mask)
+                self._update_points(slot_masks)
+            return
+
+        # Only touch the layers whose visibility actually changes
+        targets = self.target_visibilities(type_indices, size_indices)
+        changes = {key: visible for key, visible in targets.items() if self._visibilities.get(key) != visible}
+        if not changes:
+            return
+        layers = {key: self.viewer.layers[self._layer_index(*key)] for key in changes}
+        with self._held_sync(layers.values()):
+            for key, visible in changes.items():
+                layers[key].state.visible = visible
+        self._visibilities.update(changes)
+
+    def set_selections(self, type_indices: Sequence[int], size_indices: Sequence[int]):
+        """
+        Change both the type and size selections with a single update.
+        """
+        self._batching = True
+        try:
+            self.type_selections = list(type_indices)
+            self.size_selections = list(size_indices)
+        finally:
+            self._batching = False
+        self._update_visibilities(self.type_selections, self.size_selections)
 
     def _on_type_selections_changed(self, change: dict):
-        self._update_visibilities(change["new"], self.size_selections)
-        
+        if not self._batching:
+            self._update_visibilities(change["new"], self.size_selections)
+
     def _on_size_selections_changed(self, change: dict):
-        self._update_visibilities(self.type_selections, change["new"])
+        if not self._batching:
+            self._update_visibilities(self.type_selections, change["new"])
@@ -0,0 +1,171 @@
+from glue.core import Data
+from glue.core.component import CategoricalComponent, Component
+from threading import Lock
+from typing import Any, Callable, Dict
+
+import json
+
+from tempods.catalog import load_catalog_data
+from tempods.spatial import GridIndex
+from tempods.tracing import traced
+from cosmicds.logger import setup_logger
+
+logger = setup_logger("DATASETS")
+
+POWER_PLANTS_PATH = "Power_Plants.csv"
+COASTLINES_PATH = "coastlines.geojson"
+
+
+class DatasetRegistry:
+    """
+    A process-wide registry of read-only datasets.
+
+    Each dataset is loaded (and any derived values computed) at most once per
+    process, the first time that it is requested. Sessions share the loaded
+    value, so loaders must return objects that are never modified in place.
+    """
+
+    def __init__(self):
+        self._loaders: Dict[str, Callable[[], Any]] = {}
+        self._values: Dict[str, Any] = {}
+        self._locks: Dict[str, Lock] = {}
+        self._lock = Lock()
+
+    def register(self, key: str, loader: Callable[[], Any]):
+        with self._lock:
+            self._loaders[key] = loader
+            self._locks.setdefault(key, Lock())
+            self._values.pop(key, None)
+
+    def get(self, key: str, loader: Callable[[], Any] = None) -> Any:
+        """
+        Return the dataset registered under ``key``, loading it if needed. If
+        ``loader`` is given, it is registered for ``key`` unless a loader has
+        already been registered.
+        """
+        try:
+            return self._values[key]
+        except KeyError:
+            pass
+
+        with self._lock:
+            if loader is not None:
+                self._loaders.setdefault(key, loader)
+                self._locks.setdefault(key, Lock())
+            loader = self._loaders[key]
+            lock = self._locks[key]
+
+        # Hold a per-key lock while loading so that concurrent sessions wait for
+        # the first load rather than repeating it, without blocking other keys
+        with lock:
+            if key not in self._values:
+                logger.info(f"Loading shared dataset {key}")
+                self._values[key] = loader()
+            return self._values[key]
+
+    def is_loaded(self, key: str) -> bool:
+        return key in self._values
+
+    def loaded(self) -> Dict[str, Any]:
+        return dict(self._values)
+
+    def clear(self, key: str = None):
+        with self._lock:
+            keys = list(self._locks) if key is None else [key]
+            locks = [(key, self._locks[key]) for key in keys if key in self._locks]
+        # A dataset that is being loaded is only dropped once it has loaded,
+        # so that the load can't put it back afterwards
+        for key, lock in locks:
+            with lock:
+                self._values.pop(key, None)
+
+
+DATASETS = DatasetRegistry()
+
+
+def _add_size_bins(data: Data):
+    big = (data['Install_MW'] > 100)
+    med = (data['Install_MW'] > 10) & (data['Install_MW'] <= 100)
+    small = (data['Install_MW'] <= 10)
+    data.add_component(big*9 + med*4 + small*1, label='Size_binned')
+
+
+def _freeze(data: Data):
+    """
+    Make the arrays of a shared dataset read-only, including the categories
+    and codes of its categorical components (which are encoded here, once).
+    """
+    for cid in data.main_components:
+        component = data.get_component(cid)
+        component.data.setflags(write=False)
+        if component.categorical:
+            component.categories.setflags(write=False)
+            component.codes.setflags(write=False)
+
+
+@traced("datasets.power_plants")
+def _load_power_plants(path: str) -> Data:
+    # Only the columns used by the app are loaded, from the binary catalog
+    # when it is up to date with the CSV
+    data = load_catalog_data(path)
+    _add_size_bins(data)
+    _freeze(data)
+    return data
+
+
+@traced("datasets.parse_geojson")
+def _load_geojson(path: str) -> dict:
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def session_view(data: Data, label: str = None) -> Data:
+    """
+    Create a lightweight copy of ``data`` for use by a single session.
+
+    The returned dataset has its own components and component IDs, so it can
+    be added to a session's data collection, linked and given subsets without
+    affecting other sessions, but the underlying (read-only) arrays are shared.
+    Components added later only exist on the session's copy.
+    """
+    view = Data(label=label or data.label)
+    for cid in data.main_components:
+        component = data.get_component(cid)
+        if component.categorical:
+            new_component = CategoricalComponent(component.data, categories=component.categories,
+                                                 units=component.units)
+            # Share the codes as well, rather than encoding the values again
+            # for every session
+            new_component.data._codes = component.data.codes
+        else:
+            new_component = Component(component.data, units=component.units)
+        view.add_component(new_component, cid.label)
+    return view
+
+
+def power_plants_data(path: str = POWER_PLANTS_PATH) -> Data:
+    """
+    Return a session-specific view of the power plant catalog, including the
+    derived ``Size_binned`` component.
+    """
+    shared = DATASETS.get(f"power_plants:{path}", lambda: _load_power_plants(path))
+    return session_view(shared)
+
+
+def power_plants_index(path: str = POWER_PLANTS_PATH) -> GridIndex:
+    """
+    Return the spatial index of the power plant positions, shared between
+    sessions. Point indices match the rows of ``power_plants_data``.
+    """
+    def build():
+        shared = DATASETS.get(f"power_plants:{path}", lambda: _load_power_plants(path))
+        return GridIndex(shared["Longitude"], shared["Latitude"])
+    return DATASETS.get(f"power_plants_index:{path}", build)
+
+
+def coastlines_geojson(path: str = COASTLINES_PATH) -> dict:
+    """
+    Return the parsed coastline GeoJSON. This is shared between sessions and
+    must be treated as read-only.
+    """
+    return DATASETS.get(f"coastlines:{path}", lambda: _load_geojson(path))
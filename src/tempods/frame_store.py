@@ -0,0 +1,305 @@
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from os import getenv, replace
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Iterator, List, Tuple, Union
+
+import json
+
+import numpy as np
+
+from tempods.datasets import DATASETS
+from tempods.frames import DEFAULT_EXTENT, DEFAULT_SHAPE, FrameLoader, ImageServerFrameSource
+from tempods.local_imageserver import LocalImageServer
+from tempods.pyramid import DEFAULT_LEVELS, downsample, level_for_resolution, level_shape
+from tempods.spatial import grid_lonlat, pixel_degrees
+from tempods.timesteps import DateLike, ImageServerTimeSteps, TimeStepCatalog, date_key
+from cosmicds.logger import setup_logger
+
+logger = setup_logger("FRAME_STORE")
+
+INDEX_NAME = "index.json"
+STORE_VERSION = 1
+
+Extent = Tuple[float, float, float, float]
+
+
+def timestep_date(timestep: int) -> str:
+    return datetime.fromtimestamp(timestep / 1000, timezone.utc).date().isoformat()
+
+
+class FrameStore:
+    """
+    A directory of NO2 frames on disk. Each day's frames are kept in a single
+    raw float32 file of shape (time steps, rows, columns) that is memory-mapped
+    when read, with a file for each level of its resolution pyramid, and
+    ``index.json`` records the time steps and files of each day along with
+    the extent and shape shared by every frame.
+    """
+
+    def __init__(self, path: Union[str, Path], extent: Extent = DEFAULT_EXTENT,
+                 shape: Tuple[int, int] = DEFAULT_SHAPE):
+        self.path = Path(path)
+        self._lock = Lock()
+        self._build_lock = Lock()
+        self._arrays: Dict[Tuple[str, int], np.memmap] = {}
+        index_path = self.path / INDEX_NAME
+        if index_path.exists():
+            with open(index_path, "r") as f:
+                self._index = json.load(f)
+        else:
+            self._index = {"version": STORE_VERSION, "extent": list(extent), "shape": list(shape), "days": {}}
+
+    @property
+    def extent(self) -> Extent:
+        return tuple(self._index["extent"])
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return tuple(self._index["shape"])
+
+    def dates(self) -> List[str]:
+        return sorted(self._index["days"])
+
+    def __contains__(self, value: DateLike) -> bool:
+        return date_key(value) in self._index["days"]
+
+    def time_steps(self, value: DateLike) -> List[int]:
+        """
+        The stored time steps of a day, or an empty list if it isn't stored.
+        """
+        entry = self._index["days"].get(date_key(value))
+        return list(entry["timesteps"]) if entry else []
+
+    def day_frames(self, value: DateLike, level: int = 0) -> np.memmap:
+        """
+        All of the frames of a day at a level of the resolution pyramid (see
+        ``tempods.pyramid``), as a read-only memory-mapped array. Levels that
+        haven't been built yet are built and saved first.
+        """
+        key = date_key(value)
+        if level > len(self._index["days"][key].get("levels", [])):
+            self.build_levels(key, level)
+        with self._lock:
+            array = self._arrays.get((key, level))
+            if array is None:
+                entry = self._index["days"][key]
+                filename = entry["file"] if level == 0 else entry["levels"][level - 1]
+                shape = (len(entry["timesteps"]),) + level_shape(self.shape, level)
+                array = np.memmap(self.path / filename, dtype="<f4", mode="r", shape=shape)
+                self._arrays[(key, level)] = array
+        return array
+
+    def build_levels(self, value: DateLike, levels: int = DEFAULT_LEVELS):
+        """
+        Build and save the pyramid levels of a day, up to ``levels``, each from
+        the level above it.
+        """
+        key = date_key(value)
+        with self._build_lock:
+            built = self._index["days"][key].get("levels", [])
+            filenames = list(built)
+            for level in range(len(built) + 1, levels + 1):
+                coarser = downsample(self.day_frames(key, level - 1))
+                filename = f"{key}.L{level}.f32"
+                self._write(filename, coarser)
+                filenames.append(filename)
+                with self._lock:
+                    self._index["days"][key]["levels"] = list(filenames)
+            with self._lock:
+                self._save_index()
+
+    def _write(self, filename: str, frames: np.ndarray):
+        tmp_path = self.path / (filename + ".tmp")
+        array = np.memmap(tmp_path, dtype="<f4", mode="w+", shape=frames.shape)
+        array[:] = frames
+        array.flush()
+        del array
+        replace(tmp_path, self.path / filename)
+
+    def frame(self, timestep: int, level: int = 0) -> np.ndarray:
+        """
+        A single frame, as a view of the memory-mapped day (so no data is read
+        until it is used). Raises ``KeyError`` if the frame isn't stored.
+        """
+        key = timestep_date(timestep)
+        steps = self.time_steps(key)
+        index = int(np.searchsorted(steps, timestep))
+        if index == len(steps) or steps[index] != timestep:
+            raise KeyError(f"Time step {timestep} is not in the frame store")
+        return self.day_frames(key, level)[index]
+
+    def level_for(self, extent: Extent, shape: Tuple[int, int], wkid: int = 4326) -> int:
+        """
+        The pyramid level whose resolution is nearest to that of an image of
+        ``shape`` pixels over ``extent`` (in the coordinates of ``wkid``, see
+        ``grid_lonlat``).
+        """
+        west, south, east, north = self.extent
+        rows, cols = self.shape
+        base = min((east - west) / cols, (north - south) / rows)
+        return level_for_resolution(base, pixel_degrees(extent, shape, wkid), DEFAULT_LEVELS)
+
+    def sample(self, timestep: int, extent: Extent, shape: Tuple[int, int], wkid: int = 4326) -> np.ndarray:
+        """
+        A stored frame resampled (nearest neighbour) onto an image of ``shape``
+        pixels over ``extent``, in either lon/lat or Web Mercator coordinates
+        (given by ``wkid``), with NaN outside of the stored extent. The frame
+        is read from the pyramid level that matches the requested
+        resolution, so zoomed-out views read a fraction of the data.
+        """
+        level = self.level_for(extent, shape, wkid)
+        lon, lat = grid_lonlat(extent, shape, wkid)
+        frame = self.frame(timestep, level)
+        west, south, east, north = self.extent
+        base_rows, base_cols = self.shape
+        rows, cols = frame.shape
+        # Coarser levels keep the north-west origin, with pixels 2 ** level times
+        # as large (so the last row and column may extend past the extent)
+        dlon = (east - west) / base_cols * 2 ** level
+        dlat = (north - south) / base_rows * 2 ** level
+        col = np.floor((lon - west) / dlon).astype(int)
+        row = np.floor((north - lat) / dlat).astype(int)
+        valid_col = (lon >= west) & (lon < east)
+        valid_row = (lat > south) & (lat <= north)
+        result = frame[np.clip(row, 0, rows - 1)[:, None], np.clip(col, 0, cols - 1)[None, :]]
+        return np.where(valid_row[:, None] & valid_col[None, :], result, np.nan).astype(np.float32)
+
+    def _save_index(self):
+        tmp_path = self.path / (INDEX_NAME + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self._index, f)
+        replace(tmp_path, self.path / INDEX_NAME)
+
+    def add_day(self, value: DateLike, timesteps: List[int], frames: Iterator[Tuple[int, np.ndarray]],
+                levels: int = DEFAULT_LEVELS):
+        """
+        Write a day's frames, given as (position, frame) pairs in any order, and
+        add it to the index along with ``levels`` pyramid levels. Any existing
+        frames for the day are replaced.
+        """
+        if list(timesteps) != sorted(timesteps):
+            raise ValueError("Time steps must be in ascending order")
+        key = date_key(value)
+        self.path.mkdir(parents=True, exist_ok=True)
+        filename = f"{key}.f32"
+        tmp_path = self.path / (filename + ".tmp")
+        shape = (len(timesteps),) + self.shape
+        array = np.memmap(tmp_path, dtype="<f4", mode="w+", shape=shape)
+        array[:] = np.nan
+        for position, frame in frames:
+            array[position] = frame
+        array.flush()
+        del array
+
+        with self._lock:
+            for cached in [k for k in self._arrays if k[0] == key]:
+                del self._arrays[cached]
+            replace(tmp_path, self.path / filename)
+            self._index["days"][key] = {"file": filename, "timesteps": sorted(int(t) for t in timesteps)}
+            self._save_index()
+        if levels:
+            self.build_levels(key, levels)
+
+
+def frame_store(path: Union[str, Path]) -> FrameStore:
+    """
+    Return the process-wide frame store at ``path``, along with (through
+    ``store_frame_loader`` etc.) everything the app needs to run from it.
+    """
+    return DATASETS.get(f"frame_store:{path}", lambda: FrameStore(path))
+
+
+def store_frame_loader(path: Union[str, Path]) -> FrameLoader:
+    return DATASETS.get(f"frame_store_loader:{path}", lambda: FrameLoader(frame_store(path).frame))
+
+
+def store_time_step_catalog(path: Union[str, Path]) -> TimeStepCatalog:
+    return DATASETS.get(f"frame_store_timesteps:{path}", lambda: TimeStepCatalog(frame_store(path).time_steps))
+
+
+def store_image_server(path: Union[str, Path]) -> LocalImageServer:
+    """
+    Return a local ImageServer, started once per process, that serves the
+    stored frames to the map viewer in place of the remote service.
+
+    Browsers fetch the map images from it directly, so it has to be reachable
+    from wherever they run. By default it listens on 127.0.0.1, which only
+    works for a browser on the same host as the app. For other machines (e.g.
+    a classroom of laptops connecting to one server), set
+    ``TEMPODS_FRAME_SERVER_HOST`` to the address to listen on (e.g. 0.0.0.0),
+    ``TEMPODS_FRAME_SERVER_PORT`` to a fixed port that is open to them, and
+    ``TEMPODS_FRAME_SERVER_URL`` to the URL they reach it at (e.g.
+    http://tempo-server.local:8765).
+    """
+    def start() -> LocalImageServer:
+        server = LocalImageServer(host=getenv("TEMPODS_FRAME_SERVER_HOST", "127.0.0.1"),
+                                  port=int(getenv("TEMPODS_FRAME_SERVER_PORT", 0)),
+                                  store=frame_store(path),
+                                  public_url=getenv("TEMPODS_FRAME_SERVER_URL"))
+        logger.info(f"Serving the frames in {path} at {server.url}")
+        return server.start()
+
+    return DATASETS.get(f"frame_store_server:{path}", start)
+
+
+def _days(start: date, end: date) -> Iterator[date]:
+    day = start
+    while day <= end:
+        yield day
+        day += timedelta(days=1)
+
+
+def ingest(url: str, start: DateLike, end: DateLike, store: FrameStore,
+           overwrite: bool = False, max_workers: int = 4, levels: int = DEFAULT_LEVELS) -> List[str]:
+    """
+    Download the frames of each day from ``start`` to ``end`` (inclusive)
+    from an ArcGIS ImageServer into ``store``, building ``levels`` pyramid
+    levels for each. Returns the dates that were added.
+    """
+    steps_source = ImageServerTimeSteps(url)
+    frame_source = ImageServerFrameSource(url, extent=store.extent, shape=store.shape)
+    added = []
+    first, last = date.fromisoformat(date_key(start)), date.fromisoformat(date_key(end))
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tempods-ingest") as executor:
+        for day in _days(first, last):
+            key = day.isoformat()
+            if key in store and not overwrite:
+                logger.info(f"Skipping {key}, which is already stored")
+                continue
+            steps = steps_source(key)
+            if not steps:
+                logger.info(f"No time steps for {key}")
+                continue
+            frames = executor.map(frame_source, steps)
+            store.add_day(key, steps, enumerate(frames), levels=levels)
+            logger.info(f"Stored {len(steps)} frames for {key}")
+            added.append(key)
+    return added
+
+
+def main(args=None):
+    parser = ArgumentParser(description="Download TEMPO NO2 frames into a local frame store for offline use")
+    parser.add_argument("store", help="Directory of the frame store")
+    parser.add_argument("start", help="First date to download (YYYY-MM-DD)")
+    parser.add_argument("end", nargs="?", default=None, help="Last date to download (defaults to start)")
+    parser.add_argument("--url", default=getenv("TEMPODS_IMAGESERVER_URL"),
+                        help="ImageServer URL (defaults to $TEMPODS_IMAGESERVER_URL)")
+    parser.add_argument("--overwrite", action="store_true", help="Download days that are already stored")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--levels", type=int, default=DEFAULT_LEVELS,
+                        help="Number of reduced-resolution levels to build for each day")
+    parsed = parser.parse_args(args)
+
+    if parsed.url is None:
+        parser.error("an ImageServer URL is required")
+    store = FrameStore(parsed.store)
+    added = ingest(parsed.url, parsed.start, parsed.end or parsed.start, store,
+                   overwrite=parsed.overwrite, max_workers=parsed.workers, levels=parsed.levels)
+    print(f"Added {len(added)} days to {store.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+from collections import OrderedDict
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from threading import Lock, RLock
+from typing import Callable, Dict, Hashable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from tempods.datasets import DATASETS
+from tempods.transport import TransportError, get_transport
+from cosmicds.logger import setup_logger
+
+logger = setup_logger("FRAMES")
+
+# The TEMPO field of regard (west, south, east, north), and the shape
+# (rows, columns) of the frames requested over it, which is roughly 0.1 degrees
+# per pixel.
+DEFAULT_EXTENT = (-168.0, 14.0, -13.0, 73.0)
+DEFAULT_SHAPE = (590, 1550)
+
+DEFAULT_BYTE_BUDGET = 256 * 1024 ** 2
+
+
+class ImageServerFrameSource:
+    """
+    Fetches NO2 frames from an ArcGIS ImageServer as raw float32 arrays.
+    """
+
+    def __init__(self, url: str,
+                 extent: Tuple[float, float, float, float] = DEFAULT_EXTENT,
+                 shape: Tuple[int, int] = DEFAULT_SHAPE,
+                 timeout: float = 30):
+        self.url = url.rstrip("/") + "/ImageServer/exportImage"
+        self.extent = extent
+        self.shape = shape
+        self.timeout = timeout
+
+    def params(self, timestep: int) -> dict:
+        return {
+            "bbox": ",".join(str(v) for v in self.extent),
+            "bboxSR": 4326,
+            "imageSR": 4326,
+            "size": f"{self.shape[1]},{self.shape[0]}",
+            "time": int(timestep),
+            "format": "bsq",
+            "pixelType": "F32",
+            "noData": "NaN",
+            "interpolation": "RSP_NearestNeighbor",
+            "f": "image",
+        }
+
+    def decode(self, content: bytes) -> np.ndarray:
+        # The service answers some failures (e.g. an unknown time) with a
+        # JSON error body and a 200 status, so check the size before decoding
+        expected = self.shape[0] * self.shape[1] * 4
+        if len(content) != expected:
+            raise TransportError(f"Expected {expected} bytes of float32 pixels for a {self.shape} frame, "
+                                 f"got {len(content)}: {content[:200]!r}")
+        return np.frombuffer(content, dtype="<f4").reshape(self.shape)
+
+    def __call__(self, timestep: int) -> np.ndarray:
+        response = get_transport().get(self.url, params=self.params(timestep), timeout=self.timeout)
+        response.raise_for_status()
+        return self.decode(response.content)
+
+
+class FrameCache:
+    """
+    A thread-safe LRU cache of frames, bounded by the total number of bytes
+    held rather than by the number of frames.
+    """
+
+    def __init__(self, byte_budget: int = DEFAULT_BYTE_BUDGET):
+        self.byte_budget = byte_budget
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._frames: "OrderedDict[Hashable, np.ndarray]" = OrderedDict()
+        self._lock = Lock()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._frames
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def get(self, key: Hashable) -> Optional[np.ndarray]:
+        with self._lock:
+            frame = self._frames.get(key)
+            if frame is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._frames.move_to_end(key)
+            return frame
+
+    def peek(self, key: Hashable) -> Optional[np.ndarray]:
+        """
+        Return a frame and mark it as recently used, without counting a hit
+        or miss.
+        """
+        with self._lock:
+            frame = self._frames.get(key)
+            if frame is not None:
+                self._frames.move_to_end(key)
+            return frame
+
+    def touch(self, key: Hashable) -> bool:
+        """
+        Mark a frame as recently used, without counting a hit or miss.
+        """
+        return self.peek(key) is not None
+
+    def put(self, key: Hashable, frame: np.ndarray):
+        frame.setflags(write=False)
+        with self._lock:
+            previous = self._frames.pop(key, None)
+            if previous is not None:
+                self.nbytes -= previous.nbytes
+            if frame.nbytes > self.byte_budget:
+                return
+            self._frames[key] = frame
+            self.nbytes += frame.nbytes
+            while self.nbytes > self.byte_budget:
+                _, evicted = self._frames.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+            self.nbytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "frames": len(self._frames),
+            "nbytes": self.nbytes,
+        }
+
+
+class FrameLoader:
+    """
+    Loads frames through a bounded thread pool into a shared cache, making sure
+    that each frame is only fetched once at a time.
+
+    The loader is shared between sessions, so each call to ``request`` gets
+    its own future. Cancelling it only withdraws that caller's interest: the
+    fetch itself is cancelled once no caller is waiting for it any more (and
+    only if it hasn't started).
+    """
+
+    def __init__(self, fetch: Callable[[int], np.ndarray],
+                 cache: Optional[FrameCache] = None,
+                 max_workers: int = 4):
+        self._fetch = fetch
+        self.cache = cache if cache is not None else FrameCache()
+        self._pending: Dict[int, Future] = {}
+        self._waiters: Dict[int, Set[Future]] = {}
+        # Reentrant, since cancelling a fetch under the lock resolves it
+        self._lock = RLock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tempods-frames")
+
+    def _load(self, timestep: int) -> np.ndarray:
+        frame = self._fetch(timestep)
+        self.cache.put(timestep, frame)
+        return frame
+
+    def request(self, timestep: int) -> Future:
+        """
+        Start loading a frame if it isn't cached or already loading, and return
+        a future for it. Only ``get`` counts cache hits and misses, so that
+        prefetches don't.
+        """
+        waiter = Future()
+        with self._lock:
+            frame = self.cache.peek(timestep) if timestep not in self._pending else None
+            if frame is not None:
+                waiter.set_result(frame)
+                return waiter
+            self._waiters.setdefault(timestep, set()).add(waiter)
+            fetch = self._pending.get(timestep)
+            if fetch is None:
+                fetch = self._pending[timestep] = self._executor.submit(self._load, timestep)
+                new_fetch = True
+            else:
+                new_fetch = False
+        # Callbacks are added outside the lock, since they run immediately if
+        # the future is already done
+        waiter.add_done_callback(lambda future: self._release(timestep, future))
+        if new_fetch:
+            fetch.add_done_callback(lambda future: self._resolve(timestep, future))
+        return waiter
+
+    def _resolve(self, timestep: int, fetch: Future):
+        with self._lock:
+            if self._pending.get(timestep) is fetch:
+                del self._pending[timestep]
+            waiters = self._waiters.pop(timestep, set())
+        for waiter in waiters:
+            # Waiters cancelled in the meantime are skipped
+            if not waiter.set_running_or_notify_cancel():
+                continue
+            if fetch.cancelled():
+                waiter.set_exception(CancelledError())
+            elif fetch.exception() is not None:
+                waiter.set_exception(fetch.exception())
+            else:
+                waiter.set_result(fetch.result())
+
+    def _release(self, timestep: int, waiter: Future):
+        if not waiter.cancelled():
+            return
+        with self._lock:
+            waiters = self._waiters.get(timestep)
+            if waiters is None:
+                return
+            waiters.discard(waiter)
+            if waiters:
+                return
+            # Cancelling runs _resolve straight away, which clears the entries
+            fetch = self._pending.get(timestep)
+            if fetch is not None:
+                fetch.cancel()
+
+    def waiters(self, timestep: int) -> int:
+        with self._lock:
+            return len(self._waiters.get(timestep, ()))
+
+    def is_pending(self, timestep: int) -> bool:
+        return timestep in self._pending
+
+    def get(self, timestep: int) -> np.ndarray:
+        """
+        Return a frame, from the cache if possible and otherwise by waiting for
+        it to be loaded.
+        """
+        frame = self.cache.get(timestep)
+        if frame is None:
+            frame = self.request(timestep).result()
+        return frame
+
+
+class FramePrefetcher:
+    """
+    Keeps the frames around the current timestep loaded while a user scrubs
+    through a day's time steps. The frames ahead of the playhead, in the
+    direction of travel, are requested first.
+
+    The map itself is drawn by the browser straight from the ImageServer, so
+    frames are only needed by Python-side consumers (such as hotspot
+    detection). Nothing is fetched unless at least one consumer is active.
+    """
+
+    def __init__(self, loader: FrameLoader, radius: int = 3):
+        self.loader = loader
+        self.radius = radius
+        self.direction = 1
+        self._index = None
+        self._steps: List[int] = []
+        self._futures: Dict[int, Future] = {}
+        self._consumers: Set[str] = set()
+
+    @property
+    def cache(self) -> FrameCache:
+        return self.loader.cache
+
+    @property
+    def active(self) -> bool:
+        return bool(self._consumers)
+
+    def add_consumer(self, name: str):
+        """
+        Start prefetching on behalf of ``name``, if nothing else was.
+        """
+        self._consumers.add(name)
+        if self._index is not None:
+            self.update(self._steps[self._index])
+
+    def remove_consumer(self, name: str):
+        self._consumers.discard(name)
+        if not self._consumers:
+            self.stop()
+
+    def _window(self, index: int) -> List[int]:
+        order = []
+        for offset in range(1, self.radius + 1):
+            order.append(index + offset * self.direction)
+        for offset in range(1, self.radius + 1):
+            order.append(index - offset * self.direction)
+        return [self._steps[i] for i in order if 0 <= i < len(self._steps)]
+
+    def update(self, timestep: int, steps: Sequence[int] = None):
+        """
+        Move the playhead to ``timestep``, optionally replacing the day's
+        time steps, and prefetch the frames around it.
+        """
+        if steps is not None and list(steps) != self._steps:
+            self._steps = list(steps)
+            self._index = None
+        try:
+            index = self._steps.index(timestep)
+        except ValueError:
+            return
+        if self._index is not None and index != self._index:
+            self.direction = 1 if index > self._index else -1
+        self._index = index
+        if not self.active:
+            return
+
+        wanted = [timestep] + self._window(index)
+        for t in list(self._futures):
+            if t not in wanted or self._futures[t].done():
+                self._futures.pop(t).cancel()
+        for t in wanted:
+            if t not in self.cache and t not in self._futures:
+                self._futures[t] = self.loader.request(t)
+        # Keep the frames in the window from being evicted, with the current
+        # frame marked as the most recently used
+        for t in reversed(wanted):
+            self.cache.touch(t)
+
+    def get(self, timestep: int) -> np.ndarray:
+        return self.loader.get(timestep)
+
+    def stop(self):
+        """
+        Cancel this prefetcher's queued fetches (e.g. when the session ends).
+        Fetches that other callers are waiting for carry on, and frames
+        already loaded stay in the shared cache.
+        """
+        for future in self._futures.values():
+            future.cancel()
+        self._futures = {}
+
+    def stats(self) -> Dict[str, int]:
+        return self.cache.stats()
+
+
+def _build_loader(url: str) -> FrameLoader:
+    return FrameLoader(ImageServerFrameSource(url))
+
+
+def frame_loader(url: str) -> FrameLoader:
+    """
+    Return the process-wide frame loader for an ArcGIS ImageServer. Frames are
+    the same for every session, so the cache and thread pool are shared.
+    """
+    return DATASETS.get(f"frames:{url}", lambda: _build_loader(url))
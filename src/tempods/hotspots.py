@@ -0,0 +1,159 @@
+from ipyleaflet import Circle, CircleMarker, LayerGroup
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+from scipy import ndimage
+
+from tempods.frames import DEFAULT_EXTENT
+from tempods.sessions import close_widgets
+from tempods.spatial import GridIndex
+
+Extent = Tuple[float, float, float, float]
+
+METHODS = ("components", "maxima")
+
+# Hotspots are pixels above this percentile of the frame, unless an explicit
+# threshold is given
+DEFAULT_PERCENTILE = 98
+DEFAULT_RADIUS_KM = 50
+DEFAULT_MAX_HOTSPOTS = 20
+
+
+class Hotspots:
+    """
+    NO2 hotspots in a frame, strongest first. Each hotspot is located at its
+    peak pixel, and ``pixels`` is the number of pixels in its region (1 for
+    local maxima).
+    """
+
+    def __init__(self, lon: np.ndarray, lat: np.ndarray, peak: np.ndarray, mean: np.ndarray,
+                 pixels: np.ndarray, threshold: float):
+        self.lon = lon
+        self.lat = lat
+        self.peak = peak
+        self.mean = mean
+        self.pixels = pixels
+        self.threshold = threshold
+        self.plants: Sequence[np.ndarray] = [np.array([], dtype=int) for _ in range(len(lon))]
+        self.distances: Sequence[np.ndarray] = [np.array([], dtype=float) for _ in range(len(lon))]
+
+    def __len__(self) -> int:
+        return len(self.lon)
+
+    def join_plants(self, index: GridIndex, radius_km: float = DEFAULT_RADIUS_KM) -> "Hotspots":
+        """
+        Find the plants (as rows of the indexed catalog) within ``radius_km``
+        of each hotspot's peak.
+        """
+        matches = [index.query_radius(lon, lat, radius_km) for lon, lat in zip(self.lon, self.lat)]
+        self.plants = [plants for plants, _ in matches]
+        self.distances = [distances for _, distances in matches]
+        return self
+
+    def linked_plants(self) -> np.ndarray:
+        if not self.plants:
+            return np.array([], dtype=int)
+        return np.unique(np.concatenate(self.plants))
+
+
+def _pixel_positions(rows: np.ndarray, cols: np.ndarray, extent: Extent,
+                     shape: Tuple[int, int]) -> Tuple[np.ndarray, np.ndarray]:
+    west, south, east, north = extent
+    n_rows, n_cols = shape
+    lon = west + (cols + 0.5) * (east - west) / n_cols
+    lat = north - (rows + 0.5) * (north - south) / n_rows
+    return lon, lat
+
+
+def detect_hotspots(frame: np.ndarray, extent: Extent = DEFAULT_EXTENT,
+                    threshold: Optional[float] = None, method: str = "components",
+                    min_pixels: int = 4, max_hotspots: int = DEFAULT_MAX_HOTSPOTS) -> Hotspots:
+    """
+    Find hotspots in a frame, either as connected regions of pixels above
+    ``threshold`` ('components') or as local maxima above it ('maxima').
+    """
+    if method not in METHODS:
+        raise ValueError(f"method should be one of {METHODS}")
+    frame = np.asarray(frame)
+    finite = np.isfinite(frame)
+    if threshold is None:
+        threshold = float(np.percentile(frame[finite], DEFAULT_PERCENTILE)) if finite.any() else np.inf
+    above = finite & (frame > threshold)
+
+    if method == "components":
+        labels, count = ndimage.label(above)
+        if count == 0:
+            return _empty(threshold)
+        # Only the labelled pixels are needed from here on
+        labelled = np.flatnonzero(labels.ravel())
+        pixel_labels = labels.ravel()[labelled]
+        pixel_values = frame.ravel()[labelled]
+        pixels = np.bincount(pixel_labels, minlength=count + 1)[1:]
+        sums = np.bincount(pixel_labels, weights=pixel_values, minlength=count + 1)[1:]
+        # The peak of each region: sort the labelled pixels by label and then
+        # value, and take the last pixel of each label
+        order = labelled[np.lexsort((pixel_values, pixel_labels))]
+        peaks = order[np.cumsum(pixels) - 1]
+        keep = pixels >= min_pixels
+        peaks, pixels, means = peaks[keep], pixels[keep], sums[keep] / pixels[keep]
+    else:
+        values = np.where(finite, frame, -np.inf)
+        maxima = above & (values == ndimage.maximum_filter(values, size=3, mode="nearest"))
+        peaks = np.flatnonzero(maxima)
+        pixels = np.ones(len(peaks), dtype=np.int64)
+        means = frame.ravel()[peaks]
+
+    peak_values = frame.ravel()[peaks]
+    strongest = np.argsort(peak_values)[::-1][:max_hotspots]
+    rows, cols = np.divmod(peaks[strongest], frame.shape[1])
+    lon, lat = _pixel_positions(rows, cols, extent, frame.shape)
+    return Hotspots(lon, lat, peak_values[strongest], means[strongest], pixels[strongest], threshold)
+
+
+def _empty(threshold: float) -> Hotspots:
+    empty = np.array([], dtype=float)
+    return Hotspots(empty, empty, empty, empty, np.array([], dtype=np.int64), threshold)
+
+
+class HotspotOverlay:
+    """
+    Map layers highlighting hotspots (as circles of the join radius) and the
+    power plants linked to them.
+    """
+
+    def __init__(self, hotspot_color: str = "#ff1744", plant_color: str = "#ffea00"):
+        self.hotspot_color = hotspot_color
+        self.plant_color = plant_color
+        self.layer = LayerGroup(name="NO2 hotspots")
+        self._key = None
+
+    def update(self, hotspots: Optional[Hotspots], plant_lon: np.ndarray, plant_lat: np.ndarray,
+               radius_km: float = DEFAULT_RADIUS_KM):
+        if hotspots is None or len(hotspots) == 0:
+            self.clear()
+            return
+        plants = hotspots.linked_plants()
+        key = (np.round(hotspots.lon, 4).tobytes(), np.round(hotspots.lat, 4).tobytes(), plants.tobytes(), radius_km)
+        if key == self._key:
+            return
+        self._key = key
+        layers = [
+            Circle(location=(float(lat), float(lon)), radius=int(radius_km * 1000), color=self.hotspot_color,
+                   fill_color=self.hotspot_color, fill_opacity=0.15, weight=2)
+            for lon, lat in zip(hotspots.lon, hotspots.lat)
+        ]
+        layers.extend(
+            CircleMarker(location=(float(plant_lat[i]), float(plant_lon[i])), radius=4, color=self.plant_color,
+                         fill_color=self.plant_color, fill_opacity=0.9, weight=1)
+            for i in plants
+        )
+        removed = self.layer.layers
+        self.layer.layers = tuple(layers)
+        close_widgets(removed)
+
+    def clear(self):
+        if self._key is not None:
+            self._key = None
+            removed = self.layer.layers
+            self.layer.layers = ()
+            close_widgets(removed)
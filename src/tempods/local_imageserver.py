@@ -0,0 +1,328 @@
+from argparse import ArgumentParser
+from datetime import date, datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from typing import TYPE_CHECKING, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import json
+import struct
+import zlib
+
+import numpy as np
+
+from tempods.frames import DEFAULT_EXTENT, DEFAULT_SHAPE
+from tempods.spatial import grid_lonlat, reproject_extent
+
+if TYPE_CHECKING:
+    from tempods.frame_store import FrameStore
+
+# Hours (UTC) of the synthetic time steps for each day, roughly matching the
+# daytime TEMPO scans over North America
+STANDIN_HOURS = range(11, 24)
+
+# Synthetic NO2 sources as (longitude, latitude, peak column density)
+SOURCES = (
+    (-74.0, 40.7, 8e15),
+    (-87.6, 41.9, 6e15),
+    (-118.2, 34.1, 9e15),
+    (-95.4, 29.8, 7e15),
+    (-84.4, 33.7, 5e15),
+    (-122.4, 37.8, 4e15),
+    (-112.1, 33.4, 4e15),
+    (-79.4, 43.7, 5e15),
+)
+BACKGROUND = 1e15
+HOUR_MS = 60 * 60 * 1000
+DAY_MS = 24 * HOUR_MS
+
+Extent = Tuple[float, float, float, float]
+
+
+def standin_time_steps(day: date) -> List[int]:
+    start = int(datetime.combine(day, datetime.min.time(), tzinfo=timezone.utc).timestamp() * 1000)
+    return [start + hour * HOUR_MS for hour in STANDIN_HOURS]
+
+
+def synthetic_frame(timestep: int, extent: Extent = DEFAULT_EXTENT, shape: Tuple[int, int] = DEFAULT_SHAPE,
+                    wkid: int = 4326) -> np.ndarray:
+    """
+    A deterministic synthetic NO2 field: a background plus plumes around a few
+    cities that strengthen through the day and drift eastward. The image
+    covers ``extent`` in the coordinates of ``wkid`` (see ``grid_lonlat``).
+    """
+    lon, lat = grid_lonlat(extent, shape, wkid)
+    hour = (timestep % DAY_MS) / HOUR_MS
+    strength = 0.6 + 0.4 * np.sin(np.pi * (hour - 8) / 16)
+    drift = 0.15 * (hour - 12)
+
+    frame = np.full(shape, BACKGROUND, dtype=np.float32)
+    for source_lon, source_lat, peak in SOURCES:
+        dlon = np.exp(-((lon - source_lon - drift) / 1.5) ** 2)
+        dlat = np.exp(-((lat - source_lat) / 1.0) ** 2)
+        frame += (peak * strength * np.outer(dlat, dlon)).astype(np.float32)
+    return frame
+
+
+def _png(pixels: np.ndarray) -> bytes:
+    """
+    Encode an (rows, cols, 4) uint8 array as a PNG.
+    """
+    rows, cols = pixels.shape[:2]
+    raw = b"".join(b"\x00" + pixels[i].tobytes() for i in range(rows))
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff)
+
+    header = struct.pack(">IIBBBBB", cols, rows, 8, 6, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(raw)) + chunk(b"IEND", b"")
+
+
+def render_png(frame: np.ndarray, vmax: float = 1e16) -> bytes:
+    scaled = np.clip(np.nan_to_num(frame) / vmax, 0, 1)
+    pixels = np.zeros(frame.shape + (4,), dtype=np.uint8)
+    pixels[..., 0] = (255 * scaled).astype(np.uint8)
+    pixels[..., 1] = (128 * scaled).astype(np.uint8)
+    pixels[..., 3] = np.where(np.isnan(frame), 0, 200).astype(np.uint8)
+    return _png(pixels)
+
+
+BLANK_TILE = _png(np.zeros((256, 256, 4), dtype=np.uint8))
+
+
+def _time_range(value: Optional[str]) -> Tuple[int, int]:
+    if not value:
+        return 0, 2 ** 62
+    parts = [int(float(p)) if p not in ("", "null") else None for p in value.split(",")]
+    start = parts[0] if parts[0] is not None else 0
+    end = parts[-1] if parts[-1] is not None else 2 ** 62
+    return start, end
+
+
+def _wkid(value: Optional[str], default: int = 4326) -> int:
+    # Spatial references are given either as a bare wkid or as JSON
+    if not value:
+        return default
+    if value.lstrip().startswith("{"):
+        value = json.loads(value)
+        return int(value.get("latestWkid", value.get("wkid", default)))
+    return int(value)
+
+
+def _steps_between(start: int, end: int) -> List[int]:
+    first = datetime.fromtimestamp(max(start, 0) / 1000, timezone.utc).date()
+    last = datetime.fromtimestamp(min(end, 4102444800000) / 1000, timezone.utc).date()
+    steps = []
+    for ordinal in range(first.toordinal() - 1, last.toordinal() + 2):
+        steps.extend(t for t in standin_time_steps(date.fromordinal(ordinal)) if start <= t <= end)
+    return sorted(set(steps))
+
+
+class ImageServerHandler(BaseHTTPRequestHandler):
+    """
+    Serves the subset of the ArcGIS ImageServer REST API used by the app, plus
+    blank basemap tiles, from synthetic data or from a ``FrameStore``.
+    """
+
+    store: Optional["FrameStore"] = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, body: bytes, content_type: str, status: int = 200):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, value, status: int = 200):
+        self._send(json.dumps(value).encode(), "application/json", status)
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        params = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+        path = parsed.path.rstrip("/")
+
+        if path.startswith("/tiles/"):
+            self._send(BLANK_TILE, "image/png")
+        elif path.endswith("/ImageServer"):
+            self._service_info()
+        elif path.endswith("/ImageServer/query"):
+            self._query(params)
+        elif path.endswith("/ImageServer/exportImage"):
+            self._export_image(params)
+        elif path.endswith("/ImageServer/computeStatisticsHistograms"):
+            self._statistics(params)
+        else:
+            self._send_json({"error": {"code": 404, "message": f"Unknown endpoint {path}"}}, 404)
+
+    def _service_info(self):
+        west, south, east, north = DEFAULT_EXTENT
+        today = datetime.now(timezone.utc).date()
+        self._send_json({
+            "name": "TEMPO",
+            "serviceDataType": "esriImageServiceDataTypeScientific",
+            "pixelType": "F32",
+            "bandCount": 1,
+            "hasMultidimensions": True,
+            "extent": {"xmin": west, "ymin": south, "xmax": east, "ymax": north,
+                       "spatialReference": {"wkid": 4326}},
+            "timeInfo": {"timeExtent": [standin_time_steps(date(2023, 8, 1))[0], standin_time_steps(today)[-1]]},
+        })
+
+    def _steps_between(self, start: int, end: int) -> List[int]:
+        if self.store is None:
+            return _steps_between(start, end)
+        steps = (t for day in self.store.dates() for t in self.store.time_steps(day))
+        return [t for t in steps if start <= t <= end]
+
+    def _query(self, params: dict):
+        start, end = _time_range(params.get("time"))
+        features = [{"attributes": {"StdTime": t}} for t in self._steps_between(start, end)]
+        self._send_json({"features": features})
+
+    def _frame(self, params: dict) -> np.ndarray:
+        # The map's ImageService layer asks for Web Mercator images, with the
+        # bounding box in metres
+        bbox_wkid = _wkid(params.get("bboxSR"))
+        image_wkid = _wkid(params.get("imageSR"), bbox_wkid)
+        bbox = params.get("bbox")
+        if bbox:
+            extent = reproject_extent(tuple(float(v) for v in bbox.split(",")), bbox_wkid, image_wkid)
+        else:
+            extent = reproject_extent(DEFAULT_EXTENT, 4326, image_wkid)
+        cols, rows = (int(v) for v in params.get("size", "400,400").split(","))
+        timestep = _time_range(params.get("time"))[0]
+        return self._sample(timestep, extent, (rows, cols), image_wkid)
+
+    def _sample(self, timestep: int, extent: Extent, shape: Tuple[int, int], wkid: int = 4326) -> np.ndarray:
+        if self.store is None:
+            return synthetic_frame(timestep, extent, shape, wkid)
+        try:
+            return self.store.sample(timestep, extent, shape, wkid)
+        except KeyError:
+            return np.full(shape, np.nan, dtype=np.float32)
+
+    def _export_image(self, params: dict):
+        frame = self._frame(params)
+        image_format = params.get("format", "jpgpng")
+        if params.get("f", "image") == "json":
+            self._send_json({"href": self.path.replace("f=json", "f=image"),
+                             "width": frame.shape[1], "height": frame.shape[0]})
+        elif image_format in ("bsq", "bip"):
+            self._send(frame.astype("<f4").tobytes(), "application/octet-stream")
+        else:
+            self._send(render_png(frame), "image/png")
+
+    def _statistics(self, params: dict):
+        geometry = json.loads(params.get("geometry", "{}") or "{}")
+        if "xmin" in geometry:
+            extent = (geometry["xmin"], geometry["ymin"], geometry["xmax"], geometry["ymax"])
+            wkid = _wkid(json.dumps(geometry.get("spatialReference", {})))
+        else:
+            extent, wkid = DEFAULT_EXTENT, 4326
+        timestep = _time_range(params.get("time"))[0]
+        frame = self._sample(timestep, extent, (100, 100), wkid)
+        self._send_json({"statistics": [{
+            "min": float(np.nanmin(frame)),
+            "max": float(np.nanmax(frame)),
+            "mean": float(np.nanmean(frame)),
+            "standardDeviation": float(np.nanstd(frame)),
+            "count": int(np.isfinite(frame).sum()),
+        }]})
+
+
+class LocalImageServer:
+    """
+    A local stand-in for the TEMPO ArcGIS ImageServer and basemap tile servers,
+    serving synthetic data so that the app can run and be benchmarked without
+    network access. Given a ``FrameStore``, it serves the stored frames instead,
+    which lets the map run offline. Images can be requested in lon/lat
+    (EPSG:4326) or Web Mercator (EPSG:3857, which is what the map asks for).
+
+    Its URL is given to the browser, which fetches the map images from it
+    directly. By default it only listens on 127.0.0.1, so this only works when
+    the browser runs on the same host as the app (e.g. a local Jupyter or
+    Solara server). To serve other machines, listen on an address they can
+    reach with ``host``, and give the URL they reach it at (e.g. through a
+    hostname or proxy) as ``public_url``.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, store: Optional["FrameStore"] = None,
+                 public_url: Optional[str] = None):
+        handler = type("StoreImageServerHandler", (ImageServerHandler,), {"store": store}) if store else ImageServerHandler
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        self._thread = None
+        self.public_url = public_url.rstrip("/") if public_url else None
+
+    @property
+    def host(self) -> str:
+        return self._server.server_address[0]
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    @property
+    def base_url(self) -> str:
+        return self.public_url or f"http://{self.host}:{self.port}"
+
+    @property
+    def url(self) -> str:
+        return f"{self.base_url}/services/TEMPO/"
+
+    @property
+    def tile_server(self) -> str:
+        return f"{self.base_url}/tiles"
+
+    def start(self) -> "LocalImageServer":
+        self._thread = Thread(target=self._server.serve_forever, daemon=True, name="tempods-imageserver")
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        """
+        Serve on the calling thread until interrupted.
+        """
+        try:
+            self._server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._server.server_close()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "LocalImageServer":
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+def main(args=None):
+    parser = ArgumentParser(description="Serve synthetic TEMPO data and basemap tiles locally")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--store", default=None, help="Serve frames from this frame store rather than synthetic data")
+    parser.add_argument("--public-url", default=None,
+                        help="The URL that browsers reach this server at, if not http://HOST:PORT")
+    parsed = parser.parse_args(args)
+    store = None
+    if parsed.store is not None:
+        from tempods.frame_store import FrameStore
+        store = FrameStore(parsed.store)
+    server = LocalImageServer(parsed.host, parsed.port, store=store, public_url=parsed.public_url)
+    print(f"Set TEMPODS_IMAGESERVER_URL={server.url} and TEMPODS_TILE_SERVER={server.tile_server}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
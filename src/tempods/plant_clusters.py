@@ -0,0 +1,72 @@
+from ipyleaflet import CircleMarker, LayerGroup
+from ipywidgets import HTML
+from typing import Dict, Hashable, List, Sequence
+
+import numpy as np
+
+from tempods.sessions import close_widgets
+from tempods.spatial import Clusters
+
+
+class PlantClusterLayer:
+    """
+    A map layer with one circle marker per cluster of power plants, sized by
+    the number of plants and colored by the most common type.
+
+    Updates are incremental: markers for clusters that are unchanged are kept,
+    so only the added and removed markers are sent to the front end. Removed
+    markers are closed, so that they don't accumulate over a session.
+    """
+
+    def __init__(self, type_options: Sequence[str], type_colors: Sequence[str], size_options: Sequence[str]):
+        self.type_options = list(type_options)
+        self.type_colors = list(type_colors)
+        self.size_options = list(size_options)
+        self.layer = LayerGroup(name="Power plant clusters")
+        self._markers: Dict[Hashable, CircleMarker] = {}
+
+    def __len__(self) -> int:
+        return len(self._markers)
+
+    @staticmethod
+    def radius(count: int) -> float:
+        return 6 + 3 * np.log2(count)
+
+    def _summary(self, count: int, types: np.ndarray, sizes: np.ndarray) -> str:
+        type_parts = [f"{self.type_options[i]}: {n}" for i, n in enumerate(types) if n]
+        size_parts = [f"{self.size_options[i]}: {n}" for i, n in enumerate(sizes) if n]
+        return f"<b>{count} plants</b><br>{', '.join(type_parts)}<br>{', '.join(size_parts)}"
+
+    def _marker(self, lat: float, lon: float, count: int, types: np.ndarray, sizes: np.ndarray) -> CircleMarker:
+        color = self.type_colors[int(np.argmax(types))]
+        return CircleMarker(location=(lat, lon), radius=int(self.radius(count)), color=color, fill_color=color,
+                            fill_opacity=0.6, weight=1, popup=HTML(self._summary(count, types, sizes)))
+
+    def update(self, clusters: Clusters, zoom: int):
+        types = clusters.breakdowns["type"]
+        sizes = clusters.breakdowns["size"]
+        markers = {}
+        for i, key in enumerate(clusters.keys.tolist()):
+            marker_key = (zoom, key, types[i].tobytes(), sizes[i].tobytes())
+            marker = self._markers.get(marker_key)
+            if marker is None:
+                marker = self._marker(clusters.lat[i], clusters.lon[i], int(clusters.counts[i]), types[i], sizes[i])
+            markers[marker_key] = marker
+
+        if markers.keys() == self._markers.keys():
+            return
+        removed = [marker for key, marker in self._markers.items() if key not in markers]
+        self._markers = markers
+        self.layer.layers = tuple(markers.values())
+        close_widgets(removed)
+
+    def clear(self):
+        if self._markers:
+            removed = list(self._markers.values())
+            self._markers = {}
+            self.layer.layers = ()
+            close_widgets(removed)
+
+    @property
+    def markers(self) -> List[CircleMarker]:
+        return list(self._markers.values())
@@ -0,0 +1,119 @@
+from typing import Callable, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+from glue.core import Data
+
+from tempods.frames import DEFAULT_EXTENT, DEFAULT_SHAPE
+
+Extent = Tuple[float, float, float, float]
+
+
+def pixel_indices(lon: np.ndarray, lat: np.ndarray, extent: Extent = DEFAULT_EXTENT,
+                  shape: Tuple[int, int] = DEFAULT_SHAPE) -> np.ndarray:
+    """
+    The flat index of the pixel containing each point, in a grid covering
+    ``extent`` with the first row at the north edge, or -1 for points outside.
+    """
+    west, south, east, north = extent
+    rows, cols = shape
+    col = np.floor((np.asarray(lon) - west) / (east - west) * cols).astype(np.int64)
+    row = np.floor((north - np.asarray(lat)) / (north - south) * rows).astype(np.int64)
+    inside = (col >= 0) & (col < cols) & (row >= 0) & (row < rows)
+    return np.where(inside, row * cols + col, -1)
+
+
+class PlantSamples:
+    """
+    NO2 values at a set of plants (rows) for a set of time steps (columns).
+    ``plants`` holds the row of each plant in the power plant data.
+    """
+
+    def __init__(self, values: np.ndarray, timesteps: np.ndarray, plants: np.ndarray):
+        self.values = values
+        self.timesteps = timesteps
+        self.plants = plants
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.values.shape
+
+    def select(self, mask: np.ndarray) -> "PlantSamples":
+        """
+        The samples of the plants for which ``mask`` (over all of the plants in
+        the data) is true.
+        """
+        keep = np.asarray(mask)[self.plants]
+        return PlantSamples(self.values[keep], self.timesteps, self.plants[keep])
+
+    def filter(self, data: Data, types: Optional[Sequence[str]] = None,
+               sizes: Optional[Sequence[int]] = None) -> "PlantSamples":
+        """
+        Keep only the plants with one of the given ``PrimSource`` types and
+        ``Size_binned`` values.
+        """
+        mask = np.ones(data.size, dtype=bool)
+        if types is not None:
+            mask &= np.isin(np.asarray(data["PrimSource"], dtype=str), list(types))
+        if sizes is not None:
+            mask &= np.isin(data["Size_binned"], list(sizes))
+        return self.select(mask)
+
+    def reduce(self, function: Callable = np.nanmean) -> np.ndarray:
+        """
+        Reduce each plant's values over time, e.g. to its daily mean.
+        """
+        if self.values.shape[1] == 0:
+            return np.full(len(self.plants), np.nan, dtype=np.float32)
+        with np.errstate(all="ignore"):
+            all_nan = np.isnan(self.values).all(axis=1)
+            result = np.full(len(self.plants), np.nan, dtype=np.float32)
+            result[~all_nan] = function(self.values[~all_nan], axis=1)
+        return result
+
+
+class PlantSampler:
+    """
+    Samples NO2 frames at every plant position at once. The pixel of each
+    plant is computed once, so sampling a frame is a single gather, and any
+    number of time steps (across days) can be sampled together.
+    """
+
+    def __init__(self, lon: np.ndarray, lat: np.ndarray, extent: Extent = DEFAULT_EXTENT,
+                 shape: Tuple[int, int] = DEFAULT_SHAPE):
+        self.extent = extent
+        self.shape = shape
+        indices = pixel_indices(lon, lat, extent, shape)
+        self.plants = np.flatnonzero(indices >= 0)
+        self.indices = indices[self.plants]
+
+    @classmethod
+    def for_data(cls, data: Data, extent: Extent = DEFAULT_EXTENT,
+                 shape: Tuple[int, int] = DEFAULT_SHAPE) -> "PlantSampler":
+        return cls(data["Longitude"], data["Latitude"], extent, shape)
+
+    def sample_frame(self, frame: np.ndarray) -> np.ndarray:
+        return np.asarray(frame).reshape(-1)[self.indices]
+
+    def sample(self, frames: Iterable[Optional[np.ndarray]], timesteps: Sequence[int]) -> PlantSamples:
+        """
+        Sample the given frames (one per time step, with None for missing
+        frames) into a plants x time steps float32 array.
+        """
+        values = np.full((len(self.plants), len(timesteps)), np.nan, dtype=np.float32)
+        for column, frame in enumerate(frames):
+            if frame is not None:
+                values[:, column] = self.sample_frame(frame)
+        return PlantSamples(values, np.asarray(timesteps, dtype=np.int64), self.plants)
+
+    def sample_stack(self, frames: np.ndarray, timesteps: Sequence[int]) -> PlantSamples:
+        """
+        Sample a (time steps, rows, columns) array, such as a memory-mapped
+        day from a ``FrameStore``, in one gather.
+        """
+        flat = np.asarray(frames).reshape(len(frames), -1)
+        values = np.ascontiguousarray(flat[:, self.indices].T, dtype=np.float32)
+        return PlantSamples(values, np.asarray(timesteps, dtype=np.int64), self.plants)
+
+    def sample_timesteps(self, get_frame: Callable[[int], Optional[np.ndarray]],
+                         timesteps: Sequence[int]) -> PlantSamples:
+        return self.sample((get_frame(t) for t in timesteps), timesteps)
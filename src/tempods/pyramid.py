@@ -0,0 +1,58 @@
+from typing import List, Tuple
+
+import warnings
+
+import numpy as np
+
+# Number of levels below full resolution, each half the resolution of the
+# previous one. Web map zoom levels also halve the pixel size at each step, so
+# each level serves one zoom level. With the default frames (~0.1 degrees per
+# pixel), around the app's default center (40N, where a map pixel is ~0.07
+# degrees of latitude at the default zoom of 4), level 0 serves zooms 3 and
+# closer, and levels 1 to 3 serve zooms 2, 1 and 0.
+DEFAULT_LEVELS = 3
+
+
+def level_shape(shape: Tuple[int, int], level: int) -> Tuple[int, int]:
+    factor = 2 ** level
+    return (-(-shape[0] // factor), -(-shape[1] // factor))
+
+
+def downsample(frame: np.ndarray) -> np.ndarray:
+    """
+    Halve the resolution of a frame (or a stack of frames, along the last two
+    axes) by averaging 2x2 blocks, ignoring NaNs. Odd edges are padded.
+    """
+    frame = np.asarray(frame, dtype=np.float32)
+    rows, cols = frame.shape[-2:]
+    pad = [(0, 0)] * (frame.ndim - 2) + [(0, rows % 2), (0, cols % 2)]
+    if rows % 2 or cols % 2:
+        frame = np.pad(frame, pad, constant_values=np.nan)
+    blocks = frame.reshape(frame.shape[:-2] + (frame.shape[-2] // 2, 2, frame.shape[-1] // 2, 2))
+    with warnings.catch_warnings():
+        # All-NaN blocks stay NaN
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        return np.nanmean(blocks, axis=(-3, -1)).astype(np.float32)
+
+
+def build_pyramid(frame: np.ndarray, levels: int = DEFAULT_LEVELS) -> List[np.ndarray]:
+    """
+    The frame followed by ``levels`` successively downsampled copies.
+    """
+    pyramid = [np.asarray(frame, dtype=np.float32)]
+    for _ in range(levels):
+        pyramid.append(downsample(pyramid[-1]))
+    return pyramid
+
+
+def level_for_resolution(base_resolution: float, resolution: float, max_level: int) -> int:
+    """
+    The level whose pixel size is nearest to ``resolution`` (e.g. the size of
+    a screen pixel in degrees) on a logarithmic scale, given the size of a
+    full resolution pixel. The pixels read are at most ~1.4 times the size of
+    the requested ones, so each web map zoom level is served by one level.
+    """
+    if resolution <= base_resolution:
+        return 0
+    level = int(np.round(np.log2(resolution / base_resolution)))
+    return int(min(max(level, 0), max_level))
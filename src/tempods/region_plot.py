@@ -0,0 +1,102 @@
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from bqplot import Axis, DateScale, Figure, Lines, LinearScale
+from glue.core.hub import HubListener
+from glue.core.message import SubsetCreateMessage, SubsetDeleteMessage, SubsetUpdateMessage
+from glue.core.roi import PolygonalROI, RectangularROI
+from glue.core.subset import RoiSubsetState
+
+from tempods.region_stats import Region
+
+# Values are shown in the same units as the timeseries viewer
+DISPLAY_UNIT = 1e14
+
+
+def subset_region(subset_state) -> Optional[Region]:
+    """
+    The region (in longitude and latitude) selected by a subset drawn on the
+    map, or None for subsets that aren't a rectangle or polygon.
+    """
+    if not isinstance(subset_state, RoiSubsetState):
+        return None
+    roi = subset_state.roi
+    if isinstance(roi, RectangularROI):
+        return (roi.xmin, roi.ymin, roi.xmax, roi.ymax)
+    if isinstance(roi, PolygonalROI) and len(roi.vx) >= 3:
+        return list(zip(roi.vx, roi.vy))
+    return None
+
+
+class RegionSubsets(HubListener):
+    """
+    Calls ``callback`` whenever a subset of ``data`` is created, changed or
+    deleted.
+    """
+
+    def __init__(self, data, callback: Callable[[], None]):
+        self.data = data
+        self.callback = callback
+        self.hub = data.hub
+        for message in (SubsetCreateMessage, SubsetUpdateMessage, SubsetDeleteMessage):
+            self.hub.subscribe(self, message, handler=self._on_subset_message,
+                               filter=lambda msg: msg.subset.data is self.data)
+
+    def regions(self) -> List[Tuple[str, str, Region]]:
+        """
+        The label, color and region of each subset of the data that has one.
+        """
+        regions = []
+        for subset in self.data.subsets:
+            region = subset_region(subset.subset_state)
+            if region is not None:
+                regions.append((subset.label, subset.style.color, region))
+        return regions
+
+    def _on_subset_message(self, message):
+        self.callback()
+
+    def disconnect(self):
+        self.hub.unsubscribe_all(self)
+
+
+class RegionStatsPlot:
+    """
+    A plot of the mean NO2 within each region through a day, with the 10th
+    to 90th percentile range shaded, computed locally by
+    ``RegionalStatistics``.
+    """
+
+    def __init__(self, height: str = "300px"):
+        self.x_scale = DateScale()
+        self.y_scale = LinearScale(min=0)
+        axes = [
+            Axis(scale=self.x_scale, label="Time (UTC)", tick_format="%H:%M", color="white"),
+            Axis(scale=self.y_scale, side="left", label="NO2 in region (10^14 molecules/cm^2)",
+                 label_offset="-50", color="white"),
+        ]
+        self.figure = Figure(axes=axes, marks=[], title="NO2 within regions (local)",
+                             layout={"width": "750px", "height": height},
+                             title_style={"fill": "white"}, background_style={"fill": "none"})
+
+    def update(self, series: Sequence[Tuple[str, str, Dict[str, np.ndarray]]]):
+        """
+        Show the timeseries (as returned by ``RegionalStatistics.timeseries``)
+        of each (label, color, timeseries).
+        """
+        marks = []
+        for label, color, stats in series:
+            times = np.array([datetime.fromtimestamp(t / 1000, timezone.utc).replace(tzinfo=None)
+                              for t in stats["timesteps"]], dtype="datetime64[ms]")
+            band = np.vstack([stats["p10"], stats["p90"]]) / DISPLAY_UNIT
+            marks.append(Lines(x=times, y=band, scales={"x": self.x_scale, "y": self.y_scale},
+                               fill="between", fill_colors=[color], fill_opacities=[0.2],
+                               colors=[color], opacities=[0, 0]))
+            marks.append(Lines(x=times, y=stats["mean"] / DISPLAY_UNIT, scales={"x": self.x_scale, "y": self.y_scale},
+                               colors=[color], labels=[label], display_legend=True, marker="circle",
+                               marker_size=16))
+        self.figure.marks = marks
+
+    def clear(self):
+        self.figure.marks = []
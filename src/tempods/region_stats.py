@@ -0,0 +1,164 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import Callable, Dict, Hashable, Optional, Sequence, Tuple, Union
+
+import warnings
+
+import numpy as np
+from matplotlib.path import Path
+
+from tempods.frames import DEFAULT_EXTENT, DEFAULT_SHAPE
+
+Extent = Tuple[float, float, float, float]
+
+# A region is either a (west, south, east, north) box or a polygon given as a
+# sequence of (longitude, latitude) vertices
+Region = Union[Extent, Sequence[Tuple[float, float]]]
+
+DEFAULT_PERCENTILES = (10, 50, 90)
+MAX_CACHED_MASKS = 32
+
+
+def region_key(region: Region) -> Hashable:
+    if len(region) == 4 and all(np.isscalar(v) for v in region):
+        return ("box",) + tuple(float(v) for v in region)
+    return ("polygon",) + tuple((float(lon), float(lat)) for lon, lat in region)
+
+
+def rasterize_region(region: Region, extent: Extent = DEFAULT_EXTENT,
+                     shape: Tuple[int, int] = DEFAULT_SHAPE) -> np.ndarray:
+    """
+    The flat indices of the pixels (of a grid covering ``extent``, with the
+    first row at the north edge) whose centers are inside ``region``.
+    """
+    west, south, east, north = extent
+    rows, cols = shape
+    lon = west + (np.arange(cols) + 0.5) * (east - west) / cols
+    lat = north - (np.arange(rows) + 0.5) * (north - south) / rows
+
+    key = region_key(region)
+    if key[0] == "box":
+        _, r_west, r_south, r_east, r_north = key
+        col_mask = (lon >= r_west) & (lon <= r_east)
+        row_mask = (lat >= r_south) & (lat <= r_north)
+        return np.flatnonzero(np.outer(row_mask, col_mask))
+
+    # Only test the pixels within the polygon's bounding box
+    vertices = np.array(key[1:])
+    (p_west, p_south), (p_east, p_north) = vertices.min(axis=0), vertices.max(axis=0)
+    col_range = np.flatnonzero((lon >= p_west) & (lon <= p_east))
+    row_range = np.flatnonzero((lat >= p_south) & (lat <= p_north))
+    if len(col_range) == 0 or len(row_range) == 0:
+        return np.array([], dtype=np.int64)
+    grid_rows, grid_cols = np.meshgrid(row_range, col_range, indexing="ij")
+    points = np.column_stack([lon[grid_cols.ravel()], lat[grid_rows.ravel()]])
+    inside = Path(vertices).contains_points(points)
+    return np.sort(grid_rows.ravel()[inside] * cols + grid_cols.ravel()[inside])
+
+
+def summarize(values: np.ndarray, percentiles: Sequence[float] = DEFAULT_PERCENTILES) -> Dict[str, np.ndarray]:
+    """
+    Statistics of each row of a (time steps, pixels) array, ignoring NaNs.
+    """
+    with warnings.catch_warnings():
+        # Rows with no valid pixels give NaN statistics
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        result = {
+            "count": np.sum(np.isfinite(values), axis=1),
+            "mean": np.nanmean(values, axis=1),
+            "max": np.nanmax(values, axis=1) if values.shape[1] else np.full(len(values), np.nan),
+        }
+        if values.shape[1]:
+            levels = np.nanpercentile(values, percentiles, axis=1)
+        else:
+            levels = np.full((len(percentiles), len(values)), np.nan)
+    for p, level in zip(percentiles, levels):
+        result[f"p{p:g}"] = level
+    return result
+
+
+class RegionalStatistics:
+    """
+    Computes NO2 statistics within a region for all of a day's time steps at
+    once, from locally available frames.
+
+    The rasterized mask of each region is cached, as are the statistics of
+    each (region, time step), so that only the time steps without results
+    are computed when the day's frames change.
+    """
+
+    def __init__(self, get_frame: Callable[[int], Optional[np.ndarray]],
+                 extent: Extent = DEFAULT_EXTENT,
+                 shape: Tuple[int, int] = DEFAULT_SHAPE,
+                 percentiles: Sequence[float] = DEFAULT_PERCENTILES):
+        self._get_frame = get_frame
+        self.extent = extent
+        self.shape = shape
+        self.percentiles = tuple(percentiles)
+        self._masks: "OrderedDict[Hashable, np.ndarray]" = OrderedDict()
+        self._results: Dict[Hashable, Dict[int, Tuple[float, ...]]] = {}
+        self._lock = Lock()
+
+    @property
+    def fields(self) -> Tuple[str, ...]:
+        return ("count", "mean", "max") + tuple(f"p{p:g}" for p in self.percentiles)
+
+    def mask(self, region: Region) -> np.ndarray:
+        key = region_key(region)
+        with self._lock:
+            indices = self._masks.get(key)
+            if indices is not None:
+                self._masks.move_to_end(key)
+                return indices
+        indices = rasterize_region(region, self.extent, self.shape)
+        with self._lock:
+            self._masks[key] = indices
+            while len(self._masks) > MAX_CACHED_MASKS:
+                old_key, _ = self._masks.popitem(last=False)
+                self._results.pop(old_key, None)
+        return indices
+
+    def timeseries(self, region: Region, timesteps: Sequence[int]) -> Dict[str, np.ndarray]:
+        """
+        The statistics within ``region`` for each of ``timesteps``, as arrays
+        keyed by statistic name (plus 'timesteps'). Time steps whose frame
+        isn't available have NaN statistics and are retried on the next call.
+        """
+        key = region_key(region)
+        indices = self.mask(region)
+        with self._lock:
+            cached = self._results.setdefault(key, {})
+            missing = [t for t in timesteps if t not in cached]
+
+        frames = [(t, self._get_frame(t)) for t in missing]
+        frames = [(t, frame) for t, frame in frames if frame is not None]
+        if frames:
+            # Gather only the region's pixels from each frame, then reduce them
+            # all in one pass
+            values = np.stack([np.asarray(frame).ravel()[indices] for _, frame in frames]).astype(np.float64)
+            stats = summarize(values, self.percentiles)
+            rows = zip(*(stats[field] for field in self.fields))
+            with self._lock:
+                for (t, _), row in zip(frames, rows):
+                    cached[t] = tuple(float(v) for v in row)
+
+        empty = (0.0,) + (np.nan,) * (len(self.fields) - 1)
+        table = np.array([cached.get(t, empty) for t in timesteps], dtype=np.float64).reshape(-1, len(self.fields))
+        result = {"timesteps": np.asarray(timesteps, dtype=np.int64)}
+        for i, field in enumerate(self.fields):
+            result[field] = table[:, i]
+        result["count"] = result["count"].astype(np.int64)
+        return result
+
+    def invalidate(self, timesteps: Optional[Sequence[int]] = None):
+        """
+        Forget the statistics of the given time steps (or of all time steps),
+        e.g. when their frames have been updated.
+        """
+        with self._lock:
+            for cached in self._results.values():
+                if timesteps is None:
+                    cached.clear()
+                else:
+                    for t in timesteps:
+                        cached.pop(t, None)
@@ -0,0 +1,199 @@
+from concurrent.futures import Executor, Future
+from threading import Event, Lock, Timer
+from typing import Any, Callable, Optional, Tuple
+
+import time
+
+from cosmicds.logger import setup_logger
+
+logger = setup_logger("SCHEDULER")
+
+
+class LatestValueScheduler:
+    """
+    Coalesces bursts of requests (such as the values emitted while dragging a
+    slider) so that only the latest value is applied.
+
+    Each submitted value supersedes any earlier one. Values are applied once no
+    new value has arrived for ``delay`` seconds, or at least every
+    ``max_wait`` seconds during a long burst. An optional ``prepare`` function
+    (e.g. a remote call) is run first, off the calling thread, and its result
+    is only applied if no newer value was submitted in the meantime.
+
+    If an ``executor`` is given, ``prepare`` runs on it rather than on the
+    timer thread, and ``dispatch`` (e.g. a ``UiDispatcher``) is used to apply
+    the result on the UI thread. ``on_busy`` is called with True when a value
+    starts being prepared, and with False once the latest value has been
+    applied (or failed, or been cancelled).
+    """
+
+    def __init__(self, apply: Callable[[Any], None],
+                 prepare: Optional[Callable[[Any], Any]] = None,
+                 delay: float = 0.1,
+                 max_wait: float = 0.5,
+                 executor: Optional[Executor] = None,
+                 dispatch: Optional[Callable[..., None]] = None,
+                 on_busy: Optional[Callable[[bool], None]] = None):
+        self._apply = apply
+        self._prepare = prepare
+        self.delay = delay
+        self.max_wait = max_wait
+        self._executor = executor
+        self._dispatch = dispatch
+        self._on_busy = on_busy
+        self._inflight: Optional[Tuple[int, Future]] = None
+        self.generation = 0
+        self.submitted = 0
+        self.applied = 0
+        self._value = None
+        self._burst_start = None
+        self._timer: Optional[Timer] = None
+        self._lock = Lock()
+        self._idle = Event()
+        self._idle.set()
+
+    def submit(self, value: Any):
+        with self._lock:
+            self.generation += 1
+            self.submitted += 1
+            self._value = value
+            self._idle.clear()
+            now = time.monotonic()
+            if self._burst_start is None:
+                self._burst_start = now
+            if self._timer is not None:
+                self._timer.cancel()
+            wait = min(self.delay, max(0, self._burst_start + self.max_wait - now))
+            self._timer = Timer(wait, self._run, args=(self.generation,))
+            self._timer.daemon = True
+            self._timer.start()
+
+    def is_current(self, generation: int) -> bool:
+        return generation == self.generation
+
+    def _take(self, generation: int):
+        with self._lock:
+            if not self.is_current(generation) or self._burst_start is None:
+                return False, None
+            self._burst_start = None
+            self._timer = None
+            return True, self._value
+
+    def _set_busy(self, busy: bool):
+        if self._on_busy is not None:
+            self._on_busy(busy)
+
+    def _done(self, generation: int):
+        with self._lock:
+            if self.is_current(generation):
+                self._idle.set()
+
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until the latest submitted value has been applied (on whichever
+        thread ``dispatch`` runs it), or dropped because it failed.
+        """
+        return self._idle.wait(timeout)
+
+    def _apply_current(self, generation: int, value: Any):
+        # Drop the result if a newer value arrived while it was prepared
+        with self._lock:
+            if not self.is_current(generation):
+                return
+            self._inflight = None
+        try:
+            self._apply(value)
+            self.applied += 1
+        except Exception:
+            logger.exception(f"Error applying scheduled value {value!r}")
+        finally:
+            self._set_busy(False)
+            self._done(generation)
+
+    def _deliver(self, generation: int, value: Any):
+        if self._dispatch is not None:
+            self._dispatch(self._apply_current, generation, value)
+        else:
+            self._apply_current(generation, value)
+
+    def _run(self, generation: int, inline: bool = False):
+        pending, value = self._take(generation)
+        if not pending:
+            return
+        if self._prepare is not None and self._executor is not None and not inline:
+            self._set_busy(True)
+            future = self._executor.submit(self._prepare, value)
+            with self._lock:
+                self._inflight = (generation, future)
+            future.add_done_callback(lambda f: self._prepared(generation, f))
+            return
+        try:
+            if self._prepare is not None:
+                value = self._prepare(value)
+        except Exception:
+            logger.exception(f"Error preparing scheduled value {value!r}")
+            self._done(generation)
+            return
+        if inline:
+            self._apply_current(generation, value)
+        else:
+            self._deliver(generation, value)
+
+    def _prepared(self, generation: int, future: Future):
+        if future.cancelled() or not self.is_current(generation):
+            return
+        exception = future.exception()
+        if exception is not None:
+            logger.error(f"Error preparing scheduled value: {exception!r}")
+            self._set_busy(False)
+            self._done(generation)
+            return
+        self._deliver(generation, future.result())
+
+    def flush(self):
+        """
+        Apply the pending value (if any) immediately, on the calling thread.
+        A value already being prepared on the executor is waited for, and
+        applied on the calling thread if it is still the latest.
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            generation = self.generation
+            pending = self._burst_start is not None
+            inflight = self._inflight
+        if pending:
+            self._run(generation, inline=True)
+            return
+        if inflight is None:
+            return
+        inflight_generation, future = inflight
+        try:
+            value = future.result()
+        except Exception:
+            return
+        # Take over the value, so that the dispatched apply (if it hasn't
+        # already happened) becomes a no-op
+        with self._lock:
+            if self._inflight is not inflight or not self.is_current(inflight_generation):
+                return
+            self.generation += 1
+            generation = self.generation
+        self._apply_current(generation, value)
+
+    def cancel(self):
+        """
+        Drop the pending value, and ignore the result of any value currently
+        being prepared.
+        """
+        with self._lock:
+            self.generation += 1
+            self._burst_start = None
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._inflight is not None:
+                self._inflight[1].cancel()
+                self._inflight = None
+            self._idle.set()
+        self._set_busy(False)
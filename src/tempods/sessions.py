@@ -0,0 +1,183 @@
+from collections.abc import Mapping
+from ipywidgets import Widget
+from itertools import count
+from threading import RLock
+from time import monotonic
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+import weakref
+
+import numpy as np
+
+# How deep estimate_nbytes follows attributes and containers
+MAX_DEPTH = 6
+
+
+def estimate_nbytes(obj: Any, seen: Optional[Set[int]] = None, depth: int = MAX_DEPTH) -> int:
+    """
+    Roughly estimate the memory held by the arrays reachable from ``obj``,
+    following containers and instance attributes. Arrays already in ``seen``
+    (by id, or by the id of their base array) aren't counted, so passing the
+    ids of shared arrays gives the memory owned by ``obj`` alone. Memory-mapped
+    arrays aren't counted, since they are backed by files.
+    """
+    seen = set() if seen is None else seen
+    if depth < 0 or id(obj) in seen or obj is None or isinstance(obj, (str, bytes, int, float, bool)):
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, np.ndarray):
+        if isinstance(obj, np.memmap) or (obj.base is not None and id(obj.base) in seen):
+            return 0
+        return obj.nbytes
+    if isinstance(obj, Widget):
+        # Widgets aren't followed, since through their comms they reach the
+        # kernel and so every other session
+        return 0
+    if isinstance(obj, Mapping):
+        values = list(obj.values())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        values = list(obj)
+    elif hasattr(obj, "__dict__"):
+        values = list(vars(obj).values())
+    else:
+        return 0
+    return sum(estimate_nbytes(value, seen, depth - 1) for value in values)
+
+
+def array_ids(obj: Any, depth: int = MAX_DEPTH) -> Set[int]:
+    """
+    The ids of the objects (including arrays) reachable from ``obj``, to be
+    excluded by ``estimate_nbytes``.
+    """
+    seen: Set[int] = set()
+    estimate_nbytes(obj, seen, depth)
+    return seen
+
+
+def widget_tree(root: Widget) -> List[Widget]:
+    """
+    All widgets reachable from ``root`` through its traits, including ``root``.
+    """
+    found: Dict[int, Widget] = {}
+    stack = [root]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, Widget):
+            if id(value) in found:
+                continue
+            found[id(value)] = value
+            stack.extend(value.trait_values().values())
+        elif isinstance(value, Mapping):
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            stack.extend(value)
+    return list(found.values())
+
+
+def close_widgets(widgets: Iterable[Widget]) -> int:
+    """
+    Close the given widgets, and every widget reachable from them, releasing
+    their comms. Returns the number of widgets closed.
+    """
+    closed = 0
+    for root in widgets:
+        for widget in widget_tree(root):
+            if widget.comm is not None:
+                widget.close()
+                closed += 1
+    return closed
+
+
+def close_with_kernel(session: Any, kernel_context: Any) -> bool:
+    """
+    Call ``session.close()`` when the given Solara virtual kernel context
+    (i.e. the browser session) is closed. The session is held weakly, so
+    registering doesn't keep it alive. Returns whether there was a context
+    to register with.
+    """
+    if kernel_context is None:
+        return False
+    ref = weakref.ref(session)
+
+    def close():
+        session = ref()
+        if session is not None:
+            session.close()
+
+    kernel_context.on_close(close)
+    return True
+
+
+class SessionRegistry:
+    """
+    The sessions (app instances) alive in this process. Sessions are held
+    weakly, so a session that is dropped without being closed still
+    disappears from the registry once it is garbage collected.
+
+    A session may define ``memory_estimate()``, returning a dict of byte
+    counts that includes ``"total"``.
+    """
+
+    def __init__(self):
+        self._sessions: Dict[int, weakref.ref] = {}
+        self._created: Dict[int, float] = {}
+        self._ids = count(1)
+        # Reentrant, since a session can be collected (and so unregistered)
+        # while the lock is held
+        self._lock = RLock()
+
+    def register(self, session: Any) -> int:
+        with self._lock:
+            session_id = next(self._ids)
+            self._sessions[session_id] = weakref.ref(session, lambda _, key=session_id: self.unregister(key))
+            self._created[session_id] = monotonic()
+        return session_id
+
+    def unregister(self, session_id: int):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            self._created.pop(session_id, None)
+
+    def live(self) -> Dict[int, Any]:
+        with self._lock:
+            refs = list(self._sessions.items())
+        sessions = {session_id: ref() for session_id, ref in refs}
+        return {session_id: session for session_id, session in sessions.items() if session is not None}
+
+    def __len__(self) -> int:
+        return len(self.live())
+
+    def report(self) -> dict:
+        """
+        The live sessions, their age and approximate memory, and the totals.
+        """
+        now = monotonic()
+        sessions = []
+        for session_id, session in sorted(self.live().items()):
+            estimate = getattr(session, "memory_estimate", None)
+            memory = estimate() if estimate is not None else {}
+            sessions.append({
+                "id": session_id,
+                "age_s": now - self._created.get(session_id, now),
+                "memory": memory,
+            })
+        return {
+            "count": len(sessions),
+            "memory_bytes": sum(session["memory"].get("total", 0) for session in sessions),
+            "sessions": sessions,
+        }
+
+
+SESSIONS = SessionRegistry()
+
+
+def live_sessions() -> dict:
+    """
+    The report of ``SESSIONS``, with the approximate memory held by the
+    datasets shared between sessions.
+    """
+    from tempods.datasets import DATASETS
+
+    report = SESSIONS.report()
+    report["shared_bytes"] = estimate_nbytes(DATASETS.loaded())
+    return report
@@ -0,0 +1,235 @@
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+# Fraction of the viewport size added on each side when selecting features,
+# so that small pans don't require new features to be sent
+BOUNDS_PADDING = 0.5
+
+# Assumed viewport size (in pixels) used to estimate bounds before the
+# front end has reported the real ones
+DEFAULT_VIEWPORT = (1024, 768)
+
+Bounds = Tuple[Tuple[float, float], Tuple[float, float]]
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = np.pi * EARTH_RADIUS_KM / 180
+
+
+# Web Mercator, as used by the map (ArcGIS services also know it by its older ids)
+WEB_MERCATOR_WKIDS = (3857, 102100, 102113, 900913)
+WEB_MERCATOR_RADIUS_M = 6378137.0
+
+Extent = Tuple[float, float, float, float]
+
+
+def lonlat_to_mercator(lon, lat) -> Tuple[np.ndarray, np.ndarray]:
+    lat = np.clip(lat, -85.06, 85.06)
+    x = WEB_MERCATOR_RADIUS_M * np.radians(lon)
+    y = WEB_MERCATOR_RADIUS_M * np.log(np.tan(np.pi / 4 + np.radians(lat) / 2))
+    return x, y
+
+
+def mercator_to_lonlat(x, y) -> Tuple[np.ndarray, np.ndarray]:
+    lon = np.degrees(np.asarray(x, dtype=float) / WEB_MERCATOR_RADIUS_M)
+    lat = np.degrees(2 * np.arctan(np.exp(np.asarray(y, dtype=float) / WEB_MERCATOR_RADIUS_M)) - np.pi / 2)
+    return lon, lat
+
+
+def is_web_mercator(wkid: int) -> bool:
+    return int(wkid) in WEB_MERCATOR_WKIDS
+
+
+def reproject_extent(extent: Extent, from_wkid: int, to_wkid: int) -> Extent:
+    """
+    Convert the corners of an extent between lon/lat (EPSG:4326) and Web
+    Mercator coordinates.
+    """
+    if is_web_mercator(from_wkid) == is_web_mercator(to_wkid):
+        return extent
+    west, south, east, north = extent
+    convert = lonlat_to_mercator if is_web_mercator(to_wkid) else mercator_to_lonlat
+    (west, east), (south, north) = convert(np.array([west, east]), np.array([south, north]))
+    return float(west), float(south), float(east), float(north)
+
+
+def grid_lonlat(extent: Extent, shape: Tuple[int, int], wkid: int = 4326) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    The longitudes of the columns and latitudes of the rows of an image of
+    ``shape`` (rows, columns) covering ``extent``, with the first row at the
+    north edge. The image's pixels are evenly spaced in the coordinates of
+    ``wkid``, which is either lon/lat or Web Mercator (in metres).
+    """
+    west, south, east, north = extent
+    rows, cols = shape
+    x = west + (np.arange(cols) + 0.5) * (east - west) / cols
+    y = north - (np.arange(rows) + 0.5) * (north - south) / rows
+    if is_web_mercator(wkid):
+        return mercator_to_lonlat(x, y)
+    return x, y
+
+
+def pixel_degrees(extent: Extent, shape: Tuple[int, int], wkid: int = 4326) -> float:
+    """
+    The size (in degrees) of the pixels of an image of ``shape`` (rows,
+    columns) covering ``extent``, taken as the smaller of their width and
+    height. Web Mercator pixels shrink in latitude away from the equator, so
+    their height is taken at the middle of the image.
+    """
+    west, south, east, north = extent
+    rows, cols = shape
+    width, height = (east - west) / cols, (north - south) / rows
+    if not is_web_mercator(wkid):
+        return min(width, height)
+    _, lat = mercator_to_lonlat(0, (south + north) / 2)
+    width, height = (np.degrees(v / WEB_MERCATOR_RADIUS_M) for v in (width, height))
+    return float(min(width, height * np.cos(np.radians(lat))))
+
+
+def degrees_per_pixel(zoom: float) -> float:
+    return 360 / (256 * 2 ** zoom)
+
+
+def estimate_bounds(center: Tuple[float, float], zoom: float,
+                    viewport: Tuple[int, int] = DEFAULT_VIEWPORT) -> Bounds:
+    half_width = viewport[0] * degrees_per_pixel(zoom) / 2
+    half_height = viewport[1] * degrees_per_pixel(zoom) / 2
+    lat, lon = center
+    return ((lat - half_height, lon - half_width), (lat + half_height, lon + half_width))
+
+
+def pad_bounds(bounds: Bounds, padding: float = BOUNDS_PADDING) -> Bounds:
+    (south, west), (north, east) = bounds
+    dlat = (north - south) * padding
+    dlon = (east - west) * padding
+    # Only clamp longitudes for views that don't already wrap the antimeridian
+    padded_west = max(west - dlon, -180) if west >= -180 else west - dlon
+    padded_east = min(east + dlon, 180) if east <= 180 else east + dlon
+    return ((max(south - dlat, -90), padded_west), (min(north + dlat, 90), padded_east))
+
+
+def haversine_km(lon1, lat1, lon2, lat2) -> np.ndarray:
+    lon1, lat1, lon2, lat2 = (np.radians(v) for v in (lon1, lat1, lon2, lat2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def wraps_antimeridian(bounds: Bounds) -> bool:
+    (_, west), (_, east) = bounds
+    return west < -180 or east > 180 or west > east
+
+
+class GridIndex:
+    """
+    A uniform grid index over a fixed set of points, built once, for finding
+    the points within a bounding box.
+    """
+
+    def __init__(self, lon: np.ndarray, lat: np.ndarray, cell_size: float = 1.0):
+        self.lon = np.asarray(lon, dtype=float)
+        self.lat = np.asarray(lat, dtype=float)
+        self.cell_size = cell_size
+        self._ncols = int(np.ceil(360 / cell_size))
+        self._nrows = int(np.ceil(180 / cell_size))
+        cells = self._cell_ids(self.lon, self.lat)
+        self._order = np.argsort(cells, kind="stable")
+        self._sorted_cells = cells[self._order]
+
+    def __len__(self) -> int:
+        return len(self.lon)
+
+    def _columns(self, lon) -> np.ndarray:
+        return np.clip(np.floor((np.asarray(lon) + 180) / self.cell_size).astype(int), 0, self._ncols - 1)
+
+    def _rows(self, lat) -> np.ndarray:
+        return np.clip(np.floor((np.asarray(lat) + 90) / self.cell_size).astype(int), 0, self._nrows - 1)
+
+    def _cell_ids(self, lon, lat) -> np.ndarray:
+        return self._rows(lat) * self._ncols + self._columns(lon)
+
+    def query_bounds(self, bounds: Bounds) -> np.ndarray:
+        """
+        The (sorted) indices of the points within ``bounds``.
+        """
+        (south, west), (north, east) = bounds
+        if wraps_antimeridian(bounds):
+            west, east = -180, 180
+        row_start, row_end = self._rows(south), self._rows(north)
+        col_start, col_end = self._columns(west), self._columns(east)
+
+        rows = np.arange(row_start, row_end + 1)
+        starts = np.searchsorted(self._sorted_cells, rows * self._ncols + col_start, side="left")
+        ends = np.searchsorted(self._sorted_cells, rows * self._ncols + col_end, side="right")
+        if len(rows) == 0:
+            return np.array([], dtype=int)
+        candidates = np.concatenate([self._order[s:e] for s, e in zip(starts, ends)])
+
+        lon = self.lon[candidates]
+        lat = self.lat[candidates]
+        inside = (lat >= south) & (lat <= north) & (lon >= west) & (lon <= east)
+        return np.sort(candidates[inside])
+
+    def query_radius(self, lon: float, lat: float, radius_km: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        The (sorted) indices of the points within ``radius_km`` of a position,
+        and their distances in kilometers.
+        """
+        dlat = radius_km / KM_PER_DEGREE
+        dlon = dlat / max(np.cos(np.radians(min(abs(lat) + dlat, 89.9))), 1e-6)
+        candidates = self.query_bounds(((lat - dlat, lon - dlon), (lat + dlat, lon + dlon)))
+        distances = haversine_km(lon, lat, self.lon[candidates], self.lat[candidates])
+        inside = distances <= radius_km
+        return candidates[inside], distances[inside]
+
+    def mask_in_bounds(self, bounds: Bounds) -> np.ndarray:
+        mask = np.zeros(len(self), dtype=bool)
+        mask[self.query_bounds(bounds)] = True
+        return mask
+
+
+class Clusters:
+    """
+    Points aggregated into grid cells, with the number of points in each
+    cell broken down by one or more categorical codes.
+    """
+
+    def __init__(self, keys: np.ndarray, counts: np.ndarray, lon: np.ndarray, lat: np.ndarray,
+                 breakdowns: Dict[str, np.ndarray]):
+        self.keys = keys
+        self.counts = counts
+        self.lon = lon
+        self.lat = lat
+        self.breakdowns = breakdowns
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+
+def cluster_points(lon: np.ndarray, lat: np.ndarray, cell_size: float,
+                   groups: Optional[Dict[str, Tuple[np.ndarray, int]]] = None) -> Clusters:
+    """
+    Aggregate points into square cells of ``cell_size`` degrees. Each cluster
+    is placed at the mean position of its points. ``groups`` maps a name to
+    (codes, number of codes), giving a per-cluster count for each code.
+    """
+    ix = np.floor(np.asarray(lon) / cell_size).astype(np.int64)
+    iy = np.floor(np.asarray(lat) / cell_size).astype(np.int64)
+    keys = iy * 2 ** 32 + ix
+    unique_keys, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    n = len(unique_keys)
+    mean_lon = np.bincount(inverse, weights=lon, minlength=n) / np.maximum(counts, 1)
+    mean_lat = np.bincount(inverse, weights=lat, minlength=n) / np.maximum(counts, 1)
+
+    breakdowns = {}
+    for name, (codes, n_codes) in (groups or {}).items():
+        flat = np.bincount(inverse * n_codes + codes, minlength=n * n_codes)
+        breakdowns[name] = flat.reshape(n, n_codes)
+    return Clusters(unique_keys, counts, mean_lon, mean_lat, breakdowns)
+
+
+def cluster_cell_size(zoom: float, pixels: int = 60) -> float:
+    """
+    The cluster cell size (in degrees) that is ``pixels`` screen pixels wide
+    at the given zoom level.
+    """
+    return pixels * degrees_per_pixel(zoom)
@@ -0,0 +1,145 @@
+from asyncio import AbstractEventLoop, get_running_loop
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from contextvars import Context, copy_context
+from queue import Empty, SimpleQueue
+from threading import Lock
+from typing import Callable, Optional, Tuple
+
+import sys
+import threading
+
+from cosmicds.logger import setup_logger
+
+logger = setup_logger("TASKS")
+
+# Remote calls from all sessions share these workers, so that a slow response
+# only ever occupies a worker rather than a session's kernel thread
+REMOTE_WORKERS = 8
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = Lock()
+
+
+def remote_executor() -> ThreadPoolExecutor:
+    """
+    Return the process-wide executor used for remote calls.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=REMOTE_WORKERS, thread_name_prefix="tempods-remote")
+        return _executor
+
+
+def _running_loop() -> Optional[AbstractEventLoop]:
+    try:
+        return get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def current_kernel_context():
+    """
+    The Solara virtual kernel context of the calling thread, if any.
+    """
+    # Only a Solara server has kernel contexts, and it will have imported this
+    kernel_context = sys.modules.get("solara.server.kernel_context")
+    if kernel_context is None:
+        return None
+    try:
+        return kernel_context.get_current_context() if kernel_context.has_current_context() else None
+    except RuntimeError:
+        return None
+
+
+class UiDispatcher:
+    """
+    Runs callbacks on the UI thread, i.e. the thread that created the
+    dispatcher, within the Solara kernel context (if any) that it was created
+    in. That thread is the one that handles the session's widget messages, so
+    callbacks never run at the same time as the app's widget observers.
+
+    If an event loop was running when the dispatcher was created (as in a
+    Jupyter kernel, or in the thread that a Solara server gives each
+    connection), callbacks are scheduled on that loop. Otherwise (e.g. when the
+    app is created from a script) they are queued until the creating thread
+    calls ``run_pending``.
+    """
+
+    def __init__(self, loop: Optional[AbstractEventLoop] = None):
+        self.loop = loop or _running_loop()
+        self._thread = threading.current_thread()
+        self.kernel_context = current_kernel_context()
+        self._pending: "SimpleQueue[Tuple[Context, Callable, tuple]]" = SimpleQueue()
+        self.closed = False
+
+    def is_ui_thread(self) -> bool:
+        return threading.current_thread() is self._thread
+
+    def _entered(self):
+        return self.kernel_context if self.kernel_context is not None else nullcontext()
+
+    def _locked(self):
+        # Solara handles the messages of each kernel holding its lock
+        lock = getattr(self.kernel_context, "lock", None)
+        return lock if lock is not None else nullcontext()
+
+    def _run(self, callback: Callable, *args):
+        if self.closed:
+            return
+        try:
+            with self._locked(), self._entered():
+                callback(*args)
+        except Exception:
+            logger.exception(f"Error in UI callback {callback!r}")
+
+    def __call__(self, callback: Callable, *args):
+        if self.is_ui_thread():
+            # Keep the order of callbacks queued from other threads
+            self.run_pending()
+            callback(*args)
+        else:
+            self.defer(callback, *args)
+
+    def defer(self, callback: Callable, *args):
+        """
+        Run ``callback`` on the UI thread after whatever it's doing now, even
+        when called from the UI thread itself.
+        """
+        if self.closed:
+            return
+        if self.loop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._run, callback, *args, context=copy_context())
+        else:
+            self._pending.put((copy_context(), callback, args))
+
+    def run_pending(self, timeout: Optional[float] = None) -> int:
+        """
+        Run the queued callbacks (which are only queued when there's no event
+        loop), on the thread that created the dispatcher.
+        With a ``timeout``, wait up to that long for a callback if none are
+        queued. Returns the number of callbacks run.
+        """
+        if not self.is_ui_thread():
+            raise RuntimeError("Queued UI callbacks can only be run by the thread that created the dispatcher")
+        count = 0
+        while True:
+            try:
+                context, callback, args = self._pending.get(block=count == 0 and timeout is not None,
+                                                            timeout=timeout)
+            except Empty:
+                return count
+            context.run(self._run, callback, *args)
+            count += 1
+
+    def close(self):
+        """
+        Drop any queued callbacks, and those dispatched later.
+        """
+        self.closed = True
+        while True:
+            try:
+                self._pending.get_nowait()
+            except Empty:
+                return
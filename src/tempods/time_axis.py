@@ -0,0 +1,94 @@
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+
+class TimeAxis:
+    """
+    The time steps available for a day, held as a sorted ``datetime64[ms]``
+    array (UTC). Steps are passed in and handed out as milliseconds since the
+    epoch, which is what the ImageServer and the time slider use.
+
+    This is the single source of truth for the time slider options, the
+    timeseries timemark and mapping clicks on the timeseries to a time step.
+    """
+
+    def __init__(self, steps: Sequence[int] = ()):
+        self.values = np.unique(np.asarray(steps, dtype=np.int64)).astype("datetime64[ms]")
+
+    @property
+    def milliseconds(self) -> np.ndarray:
+        """
+        The steps as milliseconds since the epoch (a view, not a copy).
+        """
+        return self.values.view(np.int64)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __contains__(self, value: int) -> bool:
+        return self.index(value) >= 0
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, TimeAxis) and np.array_equal(self.values, other.values)
+
+    def tolist(self) -> List[int]:
+        return self.milliseconds.tolist()
+
+    def labels(self) -> List[str]:
+        """
+        The UTC time of day ('HH:MM') of each step.
+        """
+        return [label[11:] for label in np.datetime_as_string(self.values, unit="m").tolist()]
+
+    def options(self) -> List[Tuple[str, int]]:
+        """
+        (label, value) pairs for a selection slider.
+        """
+        return list(zip(self.labels(), self.tolist()))
+
+    def index(self, value: int) -> int:
+        """
+        The index of ``value``, or -1 if it isn't one of the steps.
+        """
+        steps = self.milliseconds
+        index = int(np.searchsorted(steps, value))
+        if index < len(steps) and steps[index] == value:
+            return index
+        return -1
+
+    def nearest_index(self, value: float) -> int:
+        """
+        The index of the step closest to ``value`` (in milliseconds since the
+        epoch). Ties go to the earlier step.
+        """
+        steps = self.milliseconds
+        if len(steps) == 0:
+            raise ValueError("Time axis has no steps")
+        index = int(np.searchsorted(steps, value))
+        if index == 0:
+            return 0
+        if index == len(steps):
+            return index - 1
+        before, after = steps[index - 1], steps[index]
+        return index - 1 if value - before <= after - value else index
+
+    def nearest(self, value: float) -> int:
+        return int(self.milliseconds[self.nearest_index(value)])
+
+    def nearest_fraction(self, fraction: float) -> int:
+        """
+        The step closest to the given fraction of the way from the first to the
+        last step, as reported for clicks on the timeseries viewer.
+        """
+        steps = self.milliseconds
+        if len(steps) == 0:
+            raise ValueError("Time axis has no steps")
+        start, end = steps[0], steps[-1]
+        return self.nearest(start + fraction * (end - start))
+
+    def timemark(self, value: int) -> np.ndarray:
+        """
+        The x values of a vertical timemark at ``value``.
+        """
+        return np.full(2, value, dtype=np.int64).astype("datetime64[ms]")
@@ -0,0 +1,236 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from hashlib import sha256
+from os import getenv, replace
+from pathlib import Path
+from threading import Lock
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import json
+import time
+
+from tempods.datasets import DATASETS
+from tempods.tracing import traced
+from tempods.transport import TransportError, get_transport
+from cosmicds.logger import setup_logger
+
+logger = setup_logger("TIMESTEPS")
+
+DateLike = Union[date, datetime, str]
+
+# Time steps for recent dates can still change as new granules are processed,
+# so they are only cached for a limited time. Older dates are treated as final.
+DEFAULT_TTL = timedelta(hours=1)
+DEFAULT_SETTLED_AFTER = timedelta(days=3)
+
+
+def default_cache_dir() -> Path:
+    return Path(getenv("TEMPODS_CACHE_DIR", Path.home() / ".cache" / "tempods"))
+
+
+def date_key(value: DateLike) -> str:
+    if isinstance(value, datetime):
+        value = value.date()
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)[:10]
+
+
+class ImageServerTimeSteps:
+    """
+    Queries an ArcGIS ImageServer for the distinct time steps in a day.
+    If the query fails or finds no time steps, and a ``fallback`` is given,
+    the day's time steps come from that instead.
+    """
+
+    def __init__(self, url: str, timeout: float = 30,
+                 fallback: Optional[Callable[[str], List[int]]] = None):
+        self.url = url.rstrip("/") + "/ImageServer/query"
+        self.timeout = timeout
+        self.fallback = fallback
+
+    def params(self, key: str) -> dict:
+        start = datetime.combine(date.fromisoformat(key), datetime.min.time(), tzinfo=timezone.utc)
+        start_ms = int(start.timestamp() * 1000)
+        end_ms = start_ms + 24 * 60 * 60 * 1000 - 1
+        return {
+            "where": "1=1",
+            "time": f"{start_ms},{end_ms}",
+            "outFields": "StdTime",
+            "orderByFields": "StdTime",
+            "returnGeometry": "false",
+            "f": "json",
+        }
+
+    def query(self, key: str) -> List[int]:
+        response = get_transport().get(self.url, params=self.params(key), timeout=self.timeout)
+        response.raise_for_status()
+        result = response.json()
+        if "error" in result:
+            raise TransportError(f"Time step query failed: {result['error']}")
+        return sorted({int(feature["attributes"]["StdTime"]) for feature in result.get("features", [])})
+
+    def __call__(self, key: str) -> List[int]:
+        if self.fallback is None:
+            return self.query(key)
+        try:
+            steps = self.query(key)
+        except (TransportError, KeyError, TypeError, ValueError) as error:
+            logger.warning(f"Time step query for {key} failed ({error}), using the fallback")
+            return self.fallback(key)
+        return steps or self.fallback(key)
+
+
+def glue_map_time_steps(url: str) -> Callable[[str], List[int]]:
+    """
+    Look up time steps with glue_map's own ImageServer client, which is only
+    created the first time it's needed.
+    """
+    data = None
+    lock = Lock()
+
+    def time_steps(key: str) -> List[int]:
+        nonlocal data
+        with lock:
+            if data is None:
+                from glue_map.data import RemoteGeoData_ArcGISImageServer
+                data = RemoteGeoData_ArcGISImageServer(url, name="TEMPO")
+        return sorted(int(step) for step in data.get_time_steps(key))
+
+    return time_steps
+
+
+class TimeStepCatalog:
+    """
+    A cache of the available time steps for each date, in front of a remote
+    service. Results are kept in memory, persisted to disk between restarts,
+    and the dates either side of each requested date are fetched in the
+    background so that stepping through dates is usually a memory lookup.
+    """
+
+    def __init__(self, fetch: Callable[[str], List[int]],
+                 cache_path: Optional[Path] = None,
+                 ttl: timedelta = DEFAULT_TTL,
+                 settled_after: timedelta = DEFAULT_SETTLED_AFTER,
+                 prefetch_days: int = 1,
+                 max_workers: int = 2):
+        self._fetch = fetch
+        self.cache_path = Path(cache_path) if cache_path is not None else None
+        self.ttl = ttl
+        self.settled_after = settled_after
+        self.prefetch_days = prefetch_days
+        self._entries: Dict[str, Tuple[float, List[int]]] = {}
+        self._pending: Dict[str, Future] = {}
+        self._lock = Lock()
+        self._save_lock = Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tempods-timesteps")
+        self._load()
+
+    def _is_fresh(self, key: str, fetched: float) -> bool:
+        if time.time() - fetched < self.ttl.total_seconds():
+            return True
+        try:
+            day = date.fromisoformat(key)
+        except ValueError:
+            return False
+        fetched_day = datetime.fromtimestamp(fetched, timezone.utc).date()
+        return fetched_day - day >= self.settled_after
+
+    def _cached(self, key: str) -> Optional[List[int]]:
+        entry = self._entries.get(key)
+        if entry is not None and self._is_fresh(key, entry[0]):
+            return entry[1]
+        return None
+
+    def _load(self):
+        if self.cache_path is None or not self.cache_path.exists():
+            return
+        try:
+            with open(self.cache_path, "r") as f:
+                stored = json.load(f)
+            self._entries = {key: (entry["fetched"], entry["steps"]) for key, entry in stored.items()}
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Ignoring unreadable time step cache {self.cache_path}: {e}")
+
+    def _save(self):
+        if self.cache_path is None:
+            return
+        with self._lock:
+            stored = {key: {"fetched": fetched, "steps": steps} for key, (fetched, steps) in self._entries.items()}
+        try:
+            with self._save_lock:
+                self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = self.cache_path.with_suffix(".tmp")
+                with open(tmp_path, "w") as f:
+                    json.dump(stored, f)
+                replace(tmp_path, self.cache_path)
+        except OSError as e:
+            logger.warning(f"Unable to write time step cache {self.cache_path}: {e}")
+
+    def _fetch_and_store(self, key: str) -> List[int]:
+        try:
+            steps = [int(t) for t in self._fetch(key)]
+            with self._lock:
+                self._entries[key] = (time.time(), steps)
+            self._save()
+            return steps
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def _request(self, key: str) -> Future:
+        with self._lock:
+            future = self._pending.get(key)
+            if future is None:
+                future = self._executor.submit(self._fetch_and_store, key)
+                self._pending[key] = future
+            return future
+
+    def prefetch(self, value: DateLike):
+        """
+        Start fetching the time steps for the given date in the background,
+        unless they are already cached or being fetched.
+        """
+        key = date_key(value)
+        if self._cached(key) is None:
+            self._request(key)
+
+    def _prefetch_neighbours(self, key: str):
+        try:
+            day = date.fromisoformat(key)
+        except ValueError:
+            return
+        for offset in range(1, self.prefetch_days + 1):
+            for neighbour in (day - timedelta(days=offset), day + timedelta(days=offset)):
+                self.prefetch(neighbour)
+
+    @traced("timesteps.get_time_steps")
+    def get_time_steps(self, value: DateLike) -> List[int]:
+        """
+        Return the time steps (in milliseconds since the epoch) for a date,
+        fetching them if they aren't cached.
+        """
+        key = date_key(value)
+        steps = self._cached(key)
+        if steps is None:
+            steps = self._request(key).result()
+        self._prefetch_neighbours(key)
+        return steps
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        self._save()
+
+
+def _build_catalog(url: str) -> TimeStepCatalog:
+    cache_name = sha256(url.encode()).hexdigest()[:16]
+    return TimeStepCatalog(ImageServerTimeSteps(url, fallback=glue_map_time_steps(url)),
+                           cache_path=default_cache_dir() / f"timesteps-{cache_name}.json")
+
+
+def time_step_catalog(url: str) -> TimeStepCatalog:
+    """
+    Return the process-wide time step catalog for an ArcGIS ImageServer.
+    """
+    return DATASETS.get(f"timesteps:{url}", lambda: _build_catalog(url))
@@ -0,0 +1,35 @@
+from time import perf_counter
+from typing import Dict, Optional
+
+from tempods.tracing import TRACER
+
+
+class PhaseTimer:
+    """
+    Records how long each consecutive phase of a process (such as app
+    construction) takes. Each call to ``mark`` ends the current phase.
+
+    With ``trace``, each phase is also recorded by the tracer, as
+    ``<trace>.<phase>``.
+    """
+
+    def __init__(self, trace: Optional[str] = None):
+        self.trace = trace
+        self.phases: Dict[str, float] = {}
+        self._start = self._last = perf_counter()
+
+    def mark(self, name: str) -> float:
+        now = perf_counter()
+        elapsed = now - self._last
+        self.phases[name] = self.phases.get(name, 0) + elapsed
+        self._last = now
+        if self.trace is not None:
+            TRACER.record(f"{self.trace}.{name}", elapsed)
+        return elapsed
+
+    @property
+    def total(self) -> float:
+        return self._last - self._start
+
+    def as_dict(self) -> Dict[str, float]:
+        return dict(self.phases, total=self.total)
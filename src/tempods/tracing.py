@@ -0,0 +1,156 @@
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from os import getenv
+from threading import Lock
+from time import perf_counter
+from typing import Callable, Dict, Iterator, Optional, Sequence
+
+import json
+import logging
+import math
+
+from cosmicds.logger import setup_logger
+
+logger = setup_logger("TRACE")
+
+# Upper bounds (in ms) of the histogram buckets: doubling from 50 us to ~50 s,
+# so that a histogram is a fixed, small list of counts however much it records
+BUCKET_BOUNDS_MS = tuple(0.05 * 2 ** i for i in range(21))
+
+
+class Histogram:
+    """
+    Durations recorded into logarithmic buckets. Percentiles are estimated
+    from the buckets (as the upper bound of the bucket they fall in), which
+    is within a factor of two of the exact value.
+    """
+
+    def __init__(self, bounds: Sequence[float] = BUCKET_BOUNDS_MS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+        self.last = 0.0
+
+    def add(self, ms: float):
+        self.counts[bisect_left(self.bounds, ms)] += 1
+        self.count += 1
+        self.total += ms
+        self.min = min(self.min, ms)
+        self.max = max(self.max, ms)
+        self.last = ms
+
+    def percentile(self, q: float) -> float:
+        if self.count == 0:
+            return 0.0
+        rank = q / 100 * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count > 0:
+                bound = self.bounds[i] if i < len(self.bounds) else self.max
+                return min(max(bound, self.min), self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        if self.count == 0:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "total_ms": self.total,
+            "mean_ms": self.total / self.count,
+            "min_ms": self.min,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+            "max_ms": self.max,
+            "last_ms": self.last,
+        }
+
+
+class Tracer:
+    """
+    Collects the durations of named phases and callbacks into histograms.
+
+    Recording a duration takes a lock and a few additions, so tracing can be
+    left on in production. With debug logging enabled for the TRACE logger,
+    each duration is also logged as it is recorded.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._histograms: Dict[str, Histogram] = {}
+        self._lock = Lock()
+
+    def record(self, name: str, seconds: float):
+        if not self.enabled:
+            return
+        ms = seconds * 1000
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.add(ms)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(json.dumps({"span": name, "ms": round(ms, 3)}))
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, perf_counter() - start)
+
+    def traced(self, name: str) -> Callable[[Callable], Callable]:
+        """
+        Decorate a function so that each call is recorded under ``name``.
+        """
+        def decorator(func: Callable) -> Callable:
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                start = perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.record(name, perf_counter() - start)
+            return wrapper
+        return decorator
+
+    def histogram(self, name: str) -> Optional[Histogram]:
+        return self._histograms.get(name)
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            return {name: histogram.summary() for name, histogram in sorted(self._histograms.items())}
+
+    def log_snapshot(self, level: int = logging.INFO):
+        """
+        Log the current snapshot as a single JSON record.
+        """
+        logger.log(level, json.dumps({"trace": self.snapshot()}))
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+
+# Set TEMPODS_TRACING=0 to turn tracing off
+TRACER = Tracer(enabled=getenv("TEMPODS_TRACING", "1") != "0")
+
+
+def span(name: str):
+    return TRACER.span(name)
+
+
+def traced(name: str) -> Callable[[Callable], Callable]:
+    return TRACER.traced(name)
+
+
+def trace_snapshot() -> Dict[str, dict]:
+    return TRACER.snapshot()
@@ -0,0 +1,325 @@
+from collections import deque
+from email.utils import parsedate_to_datetime
+from hashlib import sha256
+from os import getenv
+from pathlib import Path
+from threading import BoundedSemaphore, Lock
+from typing import Deque, Dict, Optional, Union
+from urllib.parse import urlparse
+
+import json
+import time
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+from cosmicds.logger import setup_logger
+
+logger = setup_logger("TRANSPORT")
+
+DEFAULT_TIMEOUT = 30
+
+# Limits for the process-wide HTTP client, which is shared by every session.
+# The per-host limit caps how many requests we make to a server at once,
+# however many sessions are open; further requests wait for a free slot.
+POOL_SIZE = 16
+MAX_PER_HOST = 8
+RETRIES = 3
+BACKOFF_FACTOR = 0.5
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# The longest we wait before a retry, whatever a Retry-After header asks for
+MAX_RETRY_AFTER = 30
+
+
+class TransportError(IOError):
+    pass
+
+
+class TransportResponse:
+    """
+    The parts of an HTTP response that the app uses, independent of how the
+    response was obtained.
+    """
+
+    def __init__(self, url: str, status_code: int, content: bytes, headers: Optional[Dict[str, str]] = None):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise TransportError(f"HTTP {self.status_code} for {self.url}")
+
+
+class Transport:
+    """
+    Base class for the ways that remote requests can be made.
+    """
+
+    def get(self, url: str, params: Optional[dict] = None, timeout: float = DEFAULT_TIMEOUT) -> TransportResponse:
+        raise NotImplementedError
+
+
+class HostMetrics:
+
+    def __init__(self, window: int):
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.durations: Deque[float] = deque(maxlen=window)
+        self.waits: Deque[float] = deque(maxlen=window)
+
+
+class RequestMetrics:
+    """
+    Request counts and timings for each host. Percentiles are computed over
+    the most recent ``window`` requests.
+    """
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self._hosts: Dict[str, HostMetrics] = {}
+        self._lock = Lock()
+
+    def _host(self, host: str) -> HostMetrics:
+        metrics = self._hosts.get(host)
+        if metrics is None:
+            metrics = self._hosts.setdefault(host, HostMetrics(self.window))
+        return metrics
+
+    def started(self, host: str, waited: float):
+        with self._lock:
+            metrics = self._host(host)
+            metrics.in_flight += 1
+            metrics.waits.append(waited)
+
+    def finished(self, host: str, seconds: float, error: bool = False):
+        with self._lock:
+            metrics = self._host(host)
+            metrics.in_flight -= 1
+            metrics.requests += 1
+            metrics.errors += int(error)
+            metrics.durations.append(seconds)
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            hosts = {host: (m.requests, m.errors, m.in_flight, list(m.durations), list(m.waits))
+                     for host, m in self._hosts.items()}
+        snapshot = {}
+        for host, (count, errors, in_flight, durations, waits) in hosts.items():
+            durations_ms = np.array(durations or [np.nan]) * 1000
+            snapshot[host] = {
+                "requests": count,
+                "errors": errors,
+                "in_flight": in_flight,
+                "mean_ms": float(np.mean(durations_ms)),
+                "p50_ms": float(np.percentile(durations_ms, 50)),
+                "p95_ms": float(np.percentile(durations_ms, 95)),
+                "max_ms": float(np.max(durations_ms)),
+                "mean_wait_ms": float(np.mean(waits) * 1000) if waits else 0.0,
+            }
+        return snapshot
+
+    def reset(self):
+        with self._lock:
+            self._hosts.clear()
+
+
+def retry_after(headers: Dict[str, str]) -> Optional[float]:
+    """
+    The delay (in seconds) asked for by a Retry-After header, given either as
+    a number of seconds or as an HTTP date.
+    """
+    value = next((v for k, v in headers.items() if k.lower() == "retry-after"), None)
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class LiveTransport(Transport):
+    """
+    Makes requests over a pooled, keep-alive HTTP session, retrying failed
+    requests with exponential backoff (or after the delay asked for by a
+    Retry-After header) and limiting the number of concurrent requests to
+    each host. A request only holds its host's slot while it is being made,
+    not while it waits to be retried.
+    """
+
+    def __init__(self, pool_size: int = POOL_SIZE, max_per_host: int = MAX_PER_HOST,
+                 retries: int = RETRIES, backoff_factor: float = BACKOFF_FACTOR,
+                 max_retry_after: float = MAX_RETRY_AFTER):
+        self.max_per_host = max_per_host
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.max_retry_after = max_retry_after
+        self.metrics = RequestMetrics()
+        self.session = requests.Session()
+        # Retries are made here rather than by urllib3, which would sleep
+        # between them while holding the host's slot
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._semaphores: Dict[str, BoundedSemaphore] = {}
+        self._lock = Lock()
+
+    def _semaphore(self, host: str) -> BoundedSemaphore:
+        with self._lock:
+            return self._semaphores.setdefault(host, BoundedSemaphore(self.max_per_host))
+
+    def _attempt(self, host: str, url: str, params: Optional[dict], timeout: float) -> requests.Response:
+        semaphore = self._semaphore(host)
+        requested = time.perf_counter()
+        with semaphore:
+            start = time.perf_counter()
+            self.metrics.started(host, start - requested)
+            error = True
+            try:
+                response = self.session.get(url, params=params, timeout=timeout)
+                error = response.status_code >= 400
+                return response
+            finally:
+                self.metrics.finished(host, time.perf_counter() - start, error=error)
+
+    def _backoff(self, attempt: int) -> float:
+        return self.backoff_factor * 2 ** attempt
+
+    def get(self, url: str, params: Optional[dict] = None, timeout: float = DEFAULT_TIMEOUT) -> TransportResponse:
+        host = urlparse(url).netloc
+        for attempt in range(self.retries + 1):
+            last = attempt == self.retries
+            try:
+                response = self._attempt(host, url, params, timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if last:
+                    raise TransportError(f"Request to {url} failed: {e}") from e
+                delay = self._backoff(attempt)
+            except requests.RequestException as e:
+                raise TransportError(f"Request to {url} failed: {e}") from e
+            else:
+                if response.status_code not in RETRY_STATUSES or last:
+                    break
+                delay = retry_after(response.headers)
+                if delay is None:
+                    delay = self._backoff(attempt)
+                delay = min(delay, self.max_retry_after)
+            logger.debug(f"Retrying {url} in {delay:.2f} s")
+            time.sleep(delay)
+        return TransportResponse(response.url, response.status_code, response.content, dict(response.headers))
+
+
+def request_key(url: str, params: Optional[dict] = None) -> str:
+    items = sorted((str(k), str(v)) for k, v in (params or {}).items())
+    return sha256(json.dumps([url, items]).encode()).hexdigest()[:32]
+
+
+class RecordingTransport(Transport):
+    """
+    Makes requests through another transport and saves each response to a
+    directory, from which a ``ReplayTransport`` can serve them later.
+    """
+
+    def __init__(self, store: Union[str, Path], transport: Optional[Transport] = None):
+        self.store = Path(store)
+        self.store.mkdir(parents=True, exist_ok=True)
+        self.transport = transport or LiveTransport()
+        self._lock = Lock()
+
+    def get(self, url: str, params: Optional[dict] = None, timeout: float = DEFAULT_TIMEOUT) -> TransportResponse:
+        response = self.transport.get(url, params=params, timeout=timeout)
+        key = request_key(url, params)
+        metadata = {
+            "url": url,
+            "params": {str(k): str(v) for k, v in (params or {}).items()},
+            "status_code": response.status_code,
+            "headers": {k: v for k, v in response.headers.items() if k.lower() == "content-type"},
+        }
+        with self._lock:
+            (self.store / f"{key}.bin").write_bytes(response.content)
+            with open(self.store / f"{key}.json", "w") as f:
+                json.dump(metadata, f)
+        return response
+
+
+class ReplayTransport(Transport):
+    """
+    Serves responses previously saved by a ``RecordingTransport``, without
+    making any network requests.
+    """
+
+    def __init__(self, store: Union[str, Path]):
+        self.store = Path(store)
+
+    def get(self, url: str, params: Optional[dict] = None, timeout: float = DEFAULT_TIMEOUT) -> TransportResponse:
+        key = request_key(url, params)
+        try:
+            with open(self.store / f"{key}.json", "r") as f:
+                metadata = json.load(f)
+            content = (self.store / f"{key}.bin").read_bytes()
+        except FileNotFoundError:
+            raise TransportError(f"No recorded response for {url} with {params}")
+        return TransportResponse(url, metadata["status_code"], content, metadata["headers"])
+
+
+_transport: Optional[Transport] = None
+_transport_lock = Lock()
+
+
+def _default_transport() -> Transport:
+    mode = getenv("TEMPODS_TRANSPORT", "live").lower()
+    store = getenv("TEMPODS_RECORDINGS", "recordings")
+    if mode == "replay":
+        logger.info(f"Replaying remote responses from {store}")
+        return ReplayTransport(store)
+    live = LiveTransport(max_per_host=int(getenv("TEMPODS_MAX_PER_HOST", MAX_PER_HOST)))
+    if mode == "record":
+        logger.info(f"Recording remote responses to {store}")
+        return RecordingTransport(store, live)
+    return live
+
+
+def get_transport() -> Transport:
+    """
+    Return the process-wide transport. This is chosen with the
+    ``TEMPODS_TRANSPORT`` environment variable ('live', 'record' or 'replay'),
+    with recordings kept in the ``TEMPODS_RECORDINGS`` directory. Live
+    requests share one connection pool, with at most ``TEMPODS_MAX_PER_HOST``
+    concurrent requests to each host.
+    """
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = _default_transport()
+        return _transport
+
+
+def request_metrics() -> Dict[str, dict]:
+    """
+    Per-host request counts and timings of the process-wide transport.
+    """
+    transport = get_transport()
+    while isinstance(transport, RecordingTransport):
+        transport = transport.transport
+    if isinstance(transport, LiveTransport):
+        return transport.metrics.snapshot()
+    return {}
+
+
+def set_transport(transport: Optional[Transport]):
+    """
+    Replace the process-wide transport. Passing ``None`` restores the default.
+    """
+    global _transport
+    with _transport_lock:
+        _transport = transport
@@ -0,0 +1,53 @@
+import pytest
+
+pytest.importorskip("cosmicds")
+
+from tempods import catalog  # noqa: E402
+
+CSV = """Longitude,Latitude,Install_MW,PrimSource,Name
+-100.5,40.1,250.0,natural gas,A
+-90.25,35.5,1200.0,coal,B
+-80.0,30.0,5.5,solar,C
+"""
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / "Power_Plants.csv"
+    path.write_text(CSV)
+    return path
+
+
+@pytest.fixture
+def reads(monkeypatch):
+    calls = []
+    read_csv = catalog._read_csv
+
+    def counted(path):
+        calls.append(path)
+        return read_csv(path)
+
+    monkeypatch.setattr(catalog, "_read_csv", counted)
+    return calls
+
+
+def test_csv_parsed_once_and_cached(csv_path, reads):
+    arrays = catalog.load_catalog(csv_path)
+    assert len(reads) == 1
+    assert catalog.binary_path(csv_path).exists()
+    assert list(arrays["PrimSource_categories"]) == ["coal", "natural gas", "solar"]
+
+    cached = catalog.load_catalog(csv_path)
+    assert len(reads) == 1
+    assert list(cached["Install_MW"]) == list(arrays["Install_MW"])
+    # Nothing is left behind from writing the catalog
+    assert sorted(p.name for p in csv_path.parent.iterdir()) == ["Power_Plants.csv", "Power_Plants.npz"]
+
+
+def test_unreadable_catalog_is_rebuilt(csv_path, reads):
+    catalog.binary_path(csv_path).write_bytes(b"PK\x03\x04 truncated")
+    arrays = catalog.load_catalog(csv_path)
+    assert len(reads) == 1
+    assert len(arrays["Longitude"]) == 3
+    catalog.load_catalog(csv_path)
+    assert len(reads) == 1
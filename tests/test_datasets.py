@@ -0,0 +1,50 @@
+from threading import Event, Thread
+
+import numpy as np
+import pytest
+
+pytest.importorskip("cosmicds")
+
+from glue.core import Data  # noqa: E402
+
+from tempods.datasets import DatasetRegistry, _freeze, session_view  # noqa: E402
+
+
+def test_session_views_share_frozen_arrays():
+    shared = Data(Type=np.array(["Coal", "Solar", "Coal"]), Install_MW=np.array([5.0, 50.0, 500.0]),
+                  label="Power Plants")
+    _freeze(shared)
+    first, second = session_view(shared), session_view(shared)
+    assert first.id["Type"] is not second.id["Type"]
+
+    types = shared.get_component("Type")
+    for view in (first, second):
+        component = view.get_component("Type")
+        assert component.categories is types.categories
+        assert component.codes is types.codes
+        assert np.shares_memory(view["Install_MW"], shared["Install_MW"])
+    for array in (types.data, types.categories, types.codes, shared["Install_MW"], first["Install_MW"]):
+        assert not array.flags.writeable
+
+
+def test_clear_waits_for_a_load_in_progress():
+    registry = DatasetRegistry()
+    loading, release = Event(), Event()
+
+    def load():
+        loading.set()
+        release.wait(5)
+        return "loaded"
+
+    loader = Thread(target=registry.get, args=("key", load))
+    loader.start()
+    assert loading.wait(5)
+    clearer = Thread(target=registry.clear, args=("key",))
+    clearer.start()
+    clearer.join(0.1)
+    # The load holds the key's lock, so clearing waits for it
+    assert clearer.is_alive()
+    release.set()
+    loader.join(5)
+    clearer.join(5)
+    assert not registry.is_loaded("key")
@@ -0,0 +1,107 @@
+from datetime import date
+
+import numpy as np
+import pytest
+
+pytest.importorskip("cosmicds")
+
+from tempods.frame_store import FrameStore, ingest
+from tempods.local_imageserver import LocalImageServer, standin_time_steps, synthetic_frame
+
+DAY = date(2024, 11, 13)
+EXTENT = (-130.0, 20.0, -60.0, 55.0)
+SHAPE = (35, 70)
+
+
+@pytest.fixture(scope="module")
+def store(tmp_path_factory):
+    path = tmp_path_factory.mktemp("frames")
+    with LocalImageServer() as server:
+        ingest(server.url, DAY, DAY, FrameStore(path, extent=EXTENT, shape=SHAPE))
+    return FrameStore(path)
+
+
+def test_ingest_stores_frames(store):
+    steps = standin_time_steps(DAY)
+    assert store.dates() == [DAY.isoformat()]
+    assert store.time_steps(DAY) == steps
+    np.testing.assert_allclose(store.frame(steps[2]), synthetic_frame(steps[2], EXTENT, SHAPE), rtol=1e-6)
+    with pytest.raises(KeyError):
+        store.frame(steps[0] + 1)
+
+
+def test_sample_resamples_to_requested_grid(store):
+    step = store.time_steps(DAY)[0]
+    sampled = store.sample(step, (-140.0, 20.0, -60.0, 55.0), (35, 80))
+    assert sampled.shape == (35, 80)
+    assert np.isnan(sampled[:, :10]).all()
+    np.testing.assert_array_equal(sampled[:, 10:], store.frame(step))
+
+
+def test_coarse_requests_read_pyramid_levels(store):
+    step = store.time_steps(DAY)[0]
+    # The grid of level 2 (4 degree pixels), which extends past the east edge
+    level_extent = (-130.0, 19.0, -58.0, 55.0)
+    assert store.level_for(level_extent, (9, 18)) == 2
+    coarse = store.sample(step, level_extent, (9, 18))
+    level = store.frame(step, level=2)
+    assert level.shape == (9, 18)
+    np.testing.assert_allclose(coarse[:, :17], level[:, :17])
+    assert np.isnan(coarse[:, 17]).all()
+
+
+def test_server_serves_web_mercator_requests(store):
+    from urllib.parse import urlencode
+    from urllib.request import urlopen
+
+    from tempods.local_imageserver import SOURCES
+    from tempods.spatial import grid_lonlat, lonlat_to_mercator
+
+    step = store.time_steps(DAY)[3]
+    # What the map's ImageService layer asks for: a bounding box in metres
+    (west, east), (south, north) = lonlat_to_mercator(np.array([-120.0, -70.0]), np.array([25.0, 50.0]))
+    params = {"bbox": f"{west},{south},{east},{north}", "bboxSR": 3857, "imageSR": 3857,
+              "size": "100,60", "time": f"{step},{step}", "format": "bsq", "pixelType": "F32", "f": "image"}
+    with LocalImageServer(store=store) as server:
+        with urlopen(f"{server.url}ImageServer/exportImage?{urlencode(params)}") as response:
+            image = np.frombuffer(response.read(), dtype="<f4").reshape(60, 100)
+
+    assert np.isfinite(image).all()
+    np.testing.assert_array_equal(image, store.sample(step, (west, south, east, north), (60, 100), wkid=3857))
+    # The brightest pixel is on one of the synthetic plumes
+    lon, lat = grid_lonlat((west, south, east, north), (60, 100), wkid=3857)
+    row, col = np.unravel_index(np.argmax(image), image.shape)
+    assert min(abs(lon[col] - source_lon) + abs(lat[row] - source_lat) for source_lon, source_lat, _ in SOURCES) < 3
+
+
+def test_level_for_app_zooms(tmp_path):
+    from tempods.spatial import WEB_MERCATOR_RADIUS_M, lonlat_to_mercator
+
+    # The map at the app's default center, as an 800x450 viewport
+    store = FrameStore(tmp_path)
+    x, y = lonlat_to_mercator(-100.0, 40.0)
+    levels = []
+    for zoom in (5, 4, 3, 2, 1):
+        metres = 2 * np.pi * WEB_MERCATOR_RADIUS_M / (256 * 2 ** zoom)
+        extent = (x - 400 * metres, y - 225 * metres, x + 400 * metres, y + 225 * metres)
+        levels.append(store.level_for(extent, (450, 800), wkid=3857))
+    # Full resolution at the default zoom of 4 (and at 3, where the map's
+    # pixels are still finer than 0.1 degrees in latitude), then a level per
+    # zoom out
+    assert levels == [0, 0, 0, 1, 2]
+
+
+def test_store_image_server_public_address(store, monkeypatch):
+    from tempods.datasets import DATASETS
+    from tempods.frame_store import store_image_server
+
+    monkeypatch.setenv("TEMPODS_FRAME_SERVER_HOST", "0.0.0.0")
+    monkeypatch.setenv("TEMPODS_FRAME_SERVER_URL", "http://tempo-server.local:8765/")
+    server = store_image_server(store.path)
+    try:
+        assert server.host == "0.0.0.0"
+        assert server.url == "http://tempo-server.local:8765/services/TEMPO/"
+        assert server.tile_server == "http://tempo-server.local:8765/tiles"
+    finally:
+        server.stop()
+        DATASETS.clear(f"frame_store_server:{store.path}")
@@ -0,0 +1,106 @@
+from threading import Event
+
+import numpy as np
+import pytest
+
+pytest.importorskip("cosmicds")
+
+from tempods.frames import FrameCache, FrameLoader, FramePrefetcher, ImageServerFrameSource
+from tempods.transport import TransportError
+
+
+def _frame(nbytes, value=0):
+    return np.full(nbytes // 4, value, dtype=np.float32)
+
+
+def test_cache_evicts_least_recently_used_within_budget():
+    cache = FrameCache(byte_budget=300)
+    for key in range(3):
+        cache.put(key, _frame(100, key))
+    assert cache.get(0) is not None
+    cache.put(3, _frame(100))
+    # 1 was the least recently used, since 0 was just read
+    assert 1 not in cache
+    assert cache.nbytes <= cache.byte_budget
+    assert cache.get(1) is None
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["evictions"] == 1
+    assert stats["frames"] == 3
+
+
+class BlockingFetch:
+    def __init__(self):
+        self.release = Event()
+        self.calls = []
+
+    def __call__(self, timestep):
+        self.calls.append(timestep)
+        self.release.wait(5)
+        return _frame(16, timestep)
+
+
+def test_cancelling_one_waiter_keeps_shared_fetch():
+    fetch = BlockingFetch()
+    loader = FrameLoader(fetch, max_workers=1)
+    # Keep the single worker busy so that the next fetches stay queued
+    busy = loader.request(0)
+    first, second = loader.request(1), loader.request(1)
+    assert loader.waiters(1) == 2
+
+    assert first.cancel()
+    assert loader.is_pending(1)
+    fetch.release.set()
+    assert second.result(timeout=5)[0] == 1
+    assert busy.result(timeout=5)[0] == 0
+    assert fetch.calls.count(1) == 1
+
+
+def test_fetch_is_cancelled_once_no_waiter_is_left():
+    fetch = BlockingFetch()
+    loader = FrameLoader(fetch, max_workers=1)
+    busy = loader.request(0)
+    waiters = [loader.request(1) for _ in range(2)]
+    for waiter in waiters:
+        waiter.cancel()
+    assert not loader.is_pending(1)
+    fetch.release.set()
+    busy.result(timeout=5)
+    assert 1 not in fetch.calls
+
+
+def test_prefetcher_only_fetches_for_consumers():
+    fetch = BlockingFetch()
+    fetch.release.set()
+    loader = FrameLoader(fetch)
+    prefetcher = FramePrefetcher(loader, radius=1)
+    prefetcher.update(20, [10, 20, 30])
+    assert fetch.calls == []
+
+    prefetcher.add_consumer("hotspots")
+    loader.get(20)
+    assert sorted(fetch.calls) == [10, 20, 30]
+    prefetcher.remove_consumer("hotspots")
+    assert not prefetcher.active
+
+
+def test_loader_counts_each_lookup_once():
+    fetch = BlockingFetch()
+    fetch.release.set()
+    loader = FrameLoader(fetch)
+    loader.request(1).result(timeout=5)
+    assert loader.get(1)[0] == 1
+    assert loader.get(2)[0] == 2
+    assert loader.request(2).result(timeout=5)[0] == 2
+    stats = loader.cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+    assert fetch.calls == [1, 2]
+
+
+def test_frame_payload_size_is_checked():
+    source = ImageServerFrameSource("https://example.com", shape=(2, 3))
+    frame = np.arange(6, dtype="<f4").reshape(2, 3)
+    np.testing.assert_array_equal(source.decode(frame.tobytes()), frame)
+    with pytest.raises(TransportError, match="Expected 24 bytes"):
+        source.decode(b'{"error": {"code": 400, "message": "Invalid time"}}')
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("cosmicds")
+
+from tempods.hotspots import detect_hotspots
+from tempods.local_imageserver import SOURCES, standin_time_steps, synthetic_frame
+from tempods.spatial import GridIndex
+
+EXTENT = (-130.0, 20.0, -60.0, 55.0)
+SHAPE = (350, 700)
+
+
+@pytest.fixture(scope="module")
+def frame():
+    from datetime import date
+    return synthetic_frame(standin_time_steps(date(2024, 11, 13))[1], EXTENT, SHAPE)
+
+
+@pytest.mark.parametrize("method", ["components", "maxima"])
+def test_hotspots_are_at_sources(frame, method):
+    hotspots = detect_hotspots(frame, EXTENT, threshold=3e15, method=method)
+    assert len(hotspots) > 0
+    sources = np.array([(lon, lat) for lon, lat, _ in SOURCES])
+    for lon, lat in zip(hotspots.lon, hotspots.lat):
+        distance = np.hypot(sources[:, 0] - lon, sources[:, 1] - lat).min()
+        assert distance < 2
+    assert np.all(np.diff(hotspots.peak) <= 0)
+
+
+def test_join_plants(frame):
+    hotspots = detect_hotspots(frame, EXTENT, threshold=3e15)
+    lon = np.array([hotspots.lon[0] + 0.1, hotspots.lon[0] + 5, -60.0])
+    lat = np.array([hotspots.lat[0], hotspots.lat[0], 30.0])
+    hotspots.join_plants(GridIndex(lon, lat), radius_km=50)
+    np.testing.assert_array_equal(hotspots.plants[0], [0])
+    np.testing.assert_array_equal(hotspots.linked_plants(), [0])
@@ -0,0 +1,23 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip("cosmicds")
+
+# These are only needed once an app is created
+HEAVY_MODULES = ["glue", "glue_jupyter", "glue_map", "ipyleaflet", "pandas", "matplotlib", "scipy"]
+
+SCRIPT = """
+import json, sys
+import tempods.app
+print(json.dumps([m for m in %r if m in sys.modules]))
+""" % (HEAVY_MODULES,)
+
+
+def test_import_defers_heavy_modules():
+    # Which modules get imported, rather than how long it takes, so that the
+    # test doesn't depend on how busy the machine is
+    output = subprocess.run([sys.executable, "-c", SCRIPT], capture_output=True, text=True, check=True).stdout
+    assert json.loads(output.strip().splitlines()[-1]) == []
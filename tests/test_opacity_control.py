@@ -0,0 +1,51 @@
+import pytest
+
+pytest.importorskip("cosmicds")
+
+from echo import CallbackProperty  # noqa: E402
+from glue.core.state_objects import State  # noqa: E402
+from ipyleaflet import Map, TileLayer  # noqa: E402
+
+from tempods.components.opacity_control import OpacityControl  # noqa: E402
+
+
+class LayerState(State):
+    opacity = CallbackProperty(1.0)
+
+
+class LayerArtist:
+    def __init__(self):
+        self.state = LayerState()
+        self.tile_layer = TileLayer(url="http://localhost/{z}/{x}/{y}.png")
+
+
+class MapViewer:
+    def __init__(self):
+        self.layers = [LayerArtist()]
+        self.map = Map()
+        self.map.add(self.layers[0].tile_layer)
+
+
+def test_value_written_to_layer_state():
+    viewer = MapViewer()
+    control = OpacityControl(viewer)
+    assert control.layer is viewer.layers[0].tile_layer
+    control.value = 0.4
+    assert viewer.layers[0].state.opacity == 0.4
+    # Changes to the state (e.g. from glue) are reflected in the slider
+    viewer.layers[0].state.opacity = 0.7
+    assert control.value == 0.7
+
+
+def test_follows_replaced_map_layer():
+    viewer = MapViewer()
+    control = OpacityControl(viewer)
+    artist = viewer.layers[0]
+    viewer.map.remove(artist.tile_layer)
+    artist.tile_layer = TileLayer(url="http://localhost/new/{z}/{x}/{y}.png")
+    viewer.map.add(artist.tile_layer)
+    assert control.layer is artist.tile_layer
+
+    control.disconnect()
+    artist.state.opacity = 0.2
+    assert control.value == 1.0
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("cosmicds")
+
+from glue.core import Data
+
+from tempods.plant_sampling import PlantSampler, pixel_indices
+
+EXTENT = (-10.0, -5.0, 10.0, 5.0)
+SHAPE = (10, 20)
+
+
+def _plants():
+    return Data(Longitude=[-9.5, 0.2, 9.9, 20.0], Latitude=[4.5, -0.2, -4.9, 0.0],
+                PrimSource=["coal", "gas", "coal", "gas"], Size_binned=[1, 9, 9, 4], label="Power_Plants")
+
+
+def test_pixel_indices():
+    data = _plants()
+    indices = pixel_indices(data["Longitude"], data["Latitude"], EXTENT, SHAPE)
+    np.testing.assert_array_equal(indices, [0, 5 * 20 + 10, 9 * 20 + 19, -1])
+
+
+def test_sample_and_filter():
+    data = _plants()
+    sampler = PlantSampler.for_data(data, EXTENT, SHAPE)
+    frames = np.arange(3 * 200, dtype=np.float32).reshape(3, *SHAPE)
+    samples = sampler.sample([frames[0], None, frames[2]], [10, 20, 30])
+    assert samples.shape == (3, 3)
+    np.testing.assert_array_equal(samples.values[:, 0], [0, 110, 199])
+    assert np.isnan(samples.values[:, 1]).all()
+
+    stacked = sampler.sample_stack(frames, [10, 20, 30])
+    np.testing.assert_array_equal(stacked.values[:, 1], [200, 310, 399])
+
+    large_coal = stacked.filter(data, types=["coal"], sizes=[9])
+    np.testing.assert_array_equal(large_coal.plants, [2])
+    np.testing.assert_array_equal(large_coal.reduce(np.nanmax), [599])
@@ -0,0 +1,59 @@
+from threading import current_thread
+
+import time
+
+import pytest
+
+pytest.importorskip("cosmicds")
+
+from ipywidgets import SelectionSlider  # noqa: E402
+
+from tempods.components.playback_control import PlaybackControl  # noqa: E402
+from tempods.frames import FrameLoader, FramePrefetcher  # noqa: E402
+from tempods.tasks import UiDispatcher  # noqa: E402
+
+
+def test_steps_are_applied_through_dispatch():
+    slider = SelectionSlider(options=[(str(t), t) for t in range(5)])
+    ui = UiDispatcher()
+    threads = set()
+    slider.observe(lambda change: threads.add(current_thread()), "value")
+    playback = PlaybackControl(slider, FramePrefetcher(FrameLoader(lambda t: None)), loop=False, dispatch=ui)
+    playback.speed = 50
+
+    playback.play()
+    deadline = time.monotonic() + 5
+    while playback.playing and time.monotonic() < deadline:
+        ui.run_pending(0.01)
+    playback.stop()
+    ui.close()
+
+    assert slider.value == 4
+    assert not playback.playing
+    assert playback._thread is None
+    # Every step was applied on the UI thread, not the playback thread
+    assert threads == {current_thread()}
+
+
+def test_restarting_playback_does_not_wait_for_previous_run():
+    slider = SelectionSlider(options=[(str(t), t) for t in range(5)])
+    ui = UiDispatcher()
+    playback = PlaybackControl(slider, FramePrefetcher(FrameLoader(lambda t: None)), dispatch=ui)
+    playback.speed = 50
+
+    # Nothing pumps the UI callbacks, so the first run waits for its step
+    playback.play()
+    first = playback._thread
+    time.sleep(0.1)
+    assert first.is_alive()
+    playback.pause()
+    start = time.monotonic()
+    playback.play()
+    assert time.monotonic() - start < 0.05
+    assert playback._thread is not first
+
+    playback.stop()
+    first.join(1)
+    ui.close()
+    assert not first.is_alive()
+    assert playback._thread is None
@@ -0,0 +1,24 @@
+import numpy as np
+
+from tempods.pyramid import build_pyramid, downsample, level_for_resolution, level_shape
+
+
+def test_downsample_averages_blocks_ignoring_nan():
+    frame = np.arange(15, dtype=np.float32).reshape(3, 5)
+    frame[0, 0] = np.nan
+    result = downsample(frame)
+    assert result.shape == level_shape(frame.shape, 1) == (2, 3)
+    assert result[0, 0] == np.mean([1, 5, 6])
+    assert result[1, 2] == 14
+    assert result[0, 2] == np.mean([4, 9])
+
+
+def test_build_pyramid_shapes():
+    pyramid = build_pyramid(np.zeros((590, 1550)), levels=3)
+    assert [level.shape for level in pyramid] == [level_shape((590, 1550), i) for i in range(4)]
+
+
+def test_level_for_resolution():
+    assert level_for_resolution(0.1, 0.05, 3) == 0
+    assert level_for_resolution(0.1, 0.25, 3) == 1
+    assert level_for_resolution(0.1, 10, 3) == 3
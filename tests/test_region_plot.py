@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("cosmicds")
+
+from glue.core import Data, DataCollection  # noqa: E402
+from glue.core.roi import PolygonalROI, RectangularROI  # noqa: E402
+from glue.core.subset import RoiSubsetState  # noqa: E402
+
+from tempods.region_plot import RegionStatsPlot, RegionSubsets, subset_region  # noqa: E402
+from tempods.region_stats import RegionalStatistics  # noqa: E402
+
+
+def test_subsets_are_turned_into_regions():
+    data = Data(x=[1, 2, 3], y=[4, 5, 6], label="TEMPO")
+    collection = DataCollection([data])
+    changes = []
+    watcher = RegionSubsets(data, lambda: changes.append(True))
+
+    box = RoiSubsetState(data.id["x"], data.id["y"], RectangularROI(-100, -90, 30, 40))
+    subset = collection.new_subset_group("Box", box)
+    assert changes
+    assert watcher.regions() == [("Box", subset.style.color, (-100, 30, -90, 40))]
+
+    triangle = PolygonalROI([-100, -90, -95], [30, 30, 40])
+    assert subset_region(RoiSubsetState(data.id["x"], data.id["y"], triangle)) == [(-100, 30), (-90, 30), (-95, 40)]
+
+    watcher.disconnect()
+    count = len(changes)
+    collection.remove_subset_group(subset)
+    assert len(changes) == count
+
+
+def test_plot_shows_local_statistics():
+    frame = np.full((10, 20), 2e15)
+    stats = RegionalStatistics(lambda t: frame if t < 30 else None, extent=(-130, 20, -60, 55), shape=(10, 20))
+    series = stats.timeseries((-110, 30, -90, 40), [10, 20, 30])
+    plot = RegionStatsPlot()
+    plot.update([("Box", "#ff0000", series)])
+    band, mean = plot.figure.marks
+    np.testing.assert_allclose(mean.y, [20, 20, np.nan])
+    plot.clear()
+    assert plot.figure.marks == []
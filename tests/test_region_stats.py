@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("cosmicds")
+
+from tempods.region_stats import RegionalStatistics, rasterize_region
+
+EXTENT = (-10.0, -5.0, 10.0, 5.0)
+SHAPE = (10, 20)
+
+
+def test_box_and_polygon_masks_agree():
+    box = rasterize_region((-3.0, -2.0, 4.0, 3.0), EXTENT, SHAPE)
+    polygon = rasterize_region([(-3, -2), (4, -2), (4, 3), (-3, 3)], EXTENT, SHAPE)
+    np.testing.assert_array_equal(box, polygon)
+    assert len(box) == 7 * 5
+
+
+def test_timeseries_matches_direct_computation_and_is_incremental():
+    rng = np.random.default_rng(1)
+    frames = {t: rng.random(SHAPE).astype(np.float32) for t in range(5)}
+    frames[3][2:8, 5:15] = np.nan
+    calls = []
+
+    def get_frame(t):
+        calls.append(t)
+        return frames.get(t)
+
+    stats = RegionalStatistics(get_frame, EXTENT, SHAPE)
+    region = (-5.0, -3.0, 5.0, 3.0)
+    result = stats.timeseries(region, [0, 1, 2, 3, 4, 5])
+    rows = slice(2, 8)
+    cols = slice(5, 15)
+    for t in range(5):
+        values = frames[t][rows, cols]
+        if t == 3:
+            assert result["count"][t] == 0 and np.isnan(result["mean"][t])
+        else:
+            assert result["mean"][t] == pytest.approx(values.mean())
+            assert result["max"][t] == pytest.approx(values.max())
+            assert result["p50"][t] == pytest.approx(np.median(values))
+    assert np.isnan(result["mean"][5])
+
+    calls.clear()
+    stats.timeseries(region, [0, 1, 2, 3, 4, 5])
+    assert calls == [5]
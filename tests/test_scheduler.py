@@ -0,0 +1,64 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event
+
+import time
+
+import pytest
+
+pytest.importorskip("cosmicds")
+
+from tempods.scheduler import LatestValueScheduler
+
+
+def test_only_latest_prepared_value_is_applied():
+    applied = []
+    busy = []
+    release = Event()
+
+    def prepare(value):
+        if value == 1:
+            release.wait(5)
+        return value * 10
+
+    with ThreadPoolExecutor(2) as executor:
+        scheduler = LatestValueScheduler(applied.append, prepare=prepare, delay=0.01,
+                                         executor=executor, on_busy=busy.append)
+        scheduler.submit(1)
+        time.sleep(0.1)
+        assert busy == [True]
+        scheduler.submit(2)
+        scheduler.flush()
+        release.set()
+        time.sleep(0.1)
+
+    assert applied == [20]
+    assert busy[-1] is False
+
+
+def test_flush_waits_for_inflight_value():
+    applied = []
+    dispatched = []
+    with ThreadPoolExecutor(1) as executor:
+        scheduler = LatestValueScheduler(applied.append, prepare=lambda v: (time.sleep(0.1), v)[1],
+                                         delay=0.01, executor=executor,
+                                         dispatch=lambda *args: dispatched.append(args))
+        scheduler.submit("a")
+        time.sleep(0.05)
+        scheduler.flush()
+        assert applied == ["a"]
+
+    # The dispatched apply is superseded by the flush
+    for callback, *args in dispatched:
+        callback(*args)
+    assert applied == ["a"]
+
+
+def test_wait_idle_until_latest_value_applied():
+    applied = []
+    scheduler = LatestValueScheduler(applied.append, delay=0.01)
+    assert scheduler.wait_idle(0)
+    scheduler.submit(1)
+    scheduler.submit(2)
+    assert not scheduler.wait_idle(0)
+    assert scheduler.wait_idle(5)
+    assert applied == [2]
@@ -0,0 +1,159 @@
+from ipywidgets import HTML, VBox, Widget
+from ipywidgets.widgets import widget as widget_module
+from pathlib import Path
+
+import gc
+import time
+import weakref
+
+import numpy as np
+import pytest
+
+from tempods.plant_clusters import PlantClusterLayer
+from tempods.sessions import SessionRegistry, close_widgets, estimate_nbytes, widget_tree
+from tempods.spatial import cluster_points
+
+NOTEBOOKS = Path(__file__).resolve().parents[1] / "notebooks"
+
+
+def _open_widgets() -> int:
+    instances = getattr(widget_module, "_instances", None)
+    return len(instances if instances is not None else Widget.widgets)
+
+
+class Session:
+    def __init__(self, nbytes):
+        self.values = np.zeros(nbytes, dtype=np.uint8)
+
+    def memory_estimate(self):
+        return {"total": estimate_nbytes(self.values)}
+
+
+def test_registry_report_and_weak_references():
+    registry = SessionRegistry()
+    first, second = Session(100), Session(50)
+    first_id = registry.register(first)
+    registry.register(second)
+    report = registry.report()
+    assert report["count"] == 2
+    assert report["memory_bytes"] == 150
+
+    registry.unregister(first_id)
+    del second
+    gc.collect()
+    assert len(registry) == 0
+
+
+def test_estimate_nbytes_excludes_shared_and_memmapped(tmp_path):
+    shared = np.zeros(1000)
+    mapped = np.memmap(tmp_path / "frames.dat", dtype=np.float32, mode="w+", shape=(100,))
+    owned = np.zeros(10)
+    session = {"shared": shared, "view": shared[:10], "mapped": mapped, "owned": [owned, owned]}
+    assert estimate_nbytes(session, seen={id(shared)}) == owned.nbytes
+
+
+def test_close_widgets_closes_tree():
+    before = _open_widgets()
+    box = VBox(children=[HTML("a"), VBox(children=[HTML("b")])])
+    assert len(widget_tree(box)) > 4
+    close_widgets([box])
+    assert all(widget.comm is None for widget in widget_tree(box))
+    assert _open_widgets() == before
+
+
+def test_cluster_layer_does_not_accumulate_widgets():
+    layer = PlantClusterLayer(["Coal", "Gas"], ["#000", "#fff"], ["Small", "Large"])
+    rng = np.random.default_rng(0)
+    before = _open_widgets()
+    for zoom in range(3, 6):
+        lon, lat = rng.uniform(-120, -70, 200), rng.uniform(25, 50, 200)
+        groups = {"type": (rng.integers(0, 2, 200), 2), "size": (rng.integers(0, 2, 200), 2)}
+        layer.update(cluster_points(lon, lat, 20.0 / zoom, groups), zoom)
+    open_after_updates = _open_widgets()
+    # Only the current markers (and their popups, layouts and styles) are open
+    assert open_after_updates - before == sum(len(widget_tree(marker)) for marker in layer.markers)
+    layer.clear()
+    assert _open_widgets() == before
+
+
+def test_app_create_close_cycles_do_not_leak(monkeypatch):
+    pytest.importorskip("cosmicds")
+    pytest.importorskip("glue_map")
+    from tempods.app import TempoApp
+    from tempods.local_imageserver import LocalImageServer
+    from tempods.sessions import SESSIONS
+
+    with LocalImageServer() as server:
+        monkeypatch.setenv("TEMPODS_IMAGESERVER_URL", server.url)
+        monkeypatch.setenv("TEMPODS_TILE_SERVER", server.tile_server)
+        monkeypatch.chdir(NOTEBOOKS)
+
+        open_widgets = []
+        for _ in range(3):
+            app = TempoApp(defer=False)
+            assert app.session_id in SESSIONS.live()
+            assert app.memory_estimate()["widgets"] > 0
+            app.close()
+            assert app.session_id not in SESSIONS.live()
+            ref = weakref.ref(app)
+            del app
+            # Background work started by the app (e.g. sampling the plants)
+            # holds it until it finishes
+            deadline = time.monotonic() + 10
+            while ref() is not None and time.monotonic() < deadline:
+                gc.collect()
+                time.sleep(0.05)
+            assert ref() is None
+            open_widgets.append(_open_widgets())
+
+    # The first cycle may create process-wide widgets; later ones add nothing
+    assert open_widgets[1] == open_widgets[2]
+
+
+def test_app_close_closes_its_own_widget(monkeypatch):
+    pytest.importorskip("cosmicds")
+    import ipyvuetify as v
+    from tempods.app import TempoApp
+
+    released = []
+    monkeypatch.setattr(TempoApp, "release", lambda self: released.append(True))
+    before = _open_widgets()
+    # Only the widget itself, without the glue parts (which need glue_map)
+    app = TempoApp.__new__(TempoApp)
+    v.VuetifyTemplate.__init__(app)
+    assert app.comm is not None
+    app.close()
+    assert released == [True]
+    assert app.comm is None
+    assert _open_widgets() == before
+    ref = weakref.ref(app)
+    del app
+    gc.collect()
+    assert ref() is None
+
+
+def test_session_closed_with_solara_kernel():
+    import solara.server.app  # noqa: F401
+    from solara.server import kernel, kernel_context
+
+    from tempods.sessions import close_with_kernel
+
+    class Closing:
+        closed = 0
+
+        def close(self):
+            self.closed += 1
+
+    context = kernel_context.VirtualKernelContext(id="close-test", session_id="close-test", kernel=kernel.Kernel())
+    session, dropped = Closing(), Closing()
+    assert close_with_kernel(session, context)
+    assert close_with_kernel(dropped, context)
+    assert not close_with_kernel(session, None)
+    # Registering doesn't keep a session alive
+    ref = weakref.ref(dropped)
+    del dropped
+    gc.collect()
+    assert ref() is None
+
+    context.close()
+    assert session.closed == 1
@@ -0,0 +1,49 @@
+import numpy as np
+
+from tempods.spatial import GridIndex, cluster_points, haversine_km, pad_bounds
+
+
+def _points(n=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(-170, -60, n), rng.uniform(15, 70, n)
+
+
+def test_query_bounds_matches_brute_force():
+    lon, lat = _points()
+    index = GridIndex(lon, lat, cell_size=2.0)
+    bounds = ((30.5, -110.3), (45.2, -85.7))
+    expected = np.flatnonzero((lat >= 30.5) & (lat <= 45.2) & (lon >= -110.3) & (lon <= -85.7))
+    np.testing.assert_array_equal(index.query_bounds(bounds), expected)
+    assert index.mask_in_bounds(bounds).sum() == len(expected)
+
+
+def test_query_bounds_wrapping_view_returns_latitude_band():
+    lon, lat = _points()
+    index = GridIndex(lon, lat)
+    bounds = ((40, -300), (50, 60))
+    np.testing.assert_array_equal(index.query_bounds(bounds), np.flatnonzero((lat >= 40) & (lat <= 50)))
+
+
+def test_pad_bounds_clamps():
+    (south, west), (north, east) = pad_bounds(((-80, -170), (80, 170)))
+    assert (south, west, north, east) == (-90, -180, 90, 180)
+
+
+def test_cluster_points_breakdowns():
+    lon = np.array([0.1, 0.2, 0.3, 5.1])
+    lat = np.array([0.1, 0.4, 0.2, 5.5])
+    types = np.array([0, 1, 1, 2])
+    clusters = cluster_points(lon, lat, 1.0, {"type": (types, 3)})
+    assert len(clusters) == 2
+    np.testing.assert_array_equal(clusters.counts, [3, 1])
+    np.testing.assert_array_equal(clusters.breakdowns["type"], [[1, 2, 0], [0, 0, 1]])
+    np.testing.assert_allclose(clusters.lon, [0.2, 5.1])
+
+
+def test_query_radius_matches_haversine():
+    lon, lat = _points()
+    index = GridIndex(lon, lat)
+    found, distances = index.query_radius(-100.0, 40.0, 300)
+    all_distances = haversine_km(-100.0, 40.0, lon, lat)
+    np.testing.assert_array_equal(found, np.flatnonzero(all_distances <= 300))
+    np.testing.assert_allclose(distances, all_distances[found])
@@ -0,0 +1,143 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("cosmicds")
+
+from echo import CallbackProperty  # noqa: E402
+from glue.core import Data, DataCollection  # noqa: E402
+from glue.core.hub import HubListener  # noqa: E402
+from glue.core.message import SubsetUpdateMessage  # noqa: E402
+from glue.core.state_objects import State  # noqa: E402
+from ipyleaflet import Map  # noqa: E402
+
+from tempods.components.subset_control_widget import SubsetControlWidget  # noqa: E402
+
+
+class ViewerState(State):
+    zoom_level = CallbackProperty(7)
+    center = CallbackProperty((40, -100))
+
+
+class LayerState(State):
+    visible = CallbackProperty(True)
+    color_mode = CallbackProperty("Fixed")
+    cmap_att = CallbackProperty()
+    cmap = CallbackProperty()
+    cmap_vmin = CallbackProperty()
+    cmap_vmax = CallbackProperty()
+    size_mode = CallbackProperty("Fixed")
+    size_att = CallbackProperty()
+    size_vmin = CallbackProperty()
+    size_vmax = CallbackProperty()
+
+
+class LayerArtist(HubListener):
+    """
+    Records the plants it would draw each time its subset changes, and
+    whether the map's syncs were held at the time.
+    """
+
+    def __init__(self, subset, viewer):
+        self.subset = subset
+        self.viewer = viewer
+        self.state = LayerState()
+        self.updates = []
+        subset.data.hub.subscribe(self, SubsetUpdateMessage, handler=self._on_update,
+                                  filter=lambda msg: msg.subset is self.subset)
+
+    def _on_update(self, message):
+        self.updates.append((int(self.subset.to_mask().sum()), self.viewer.map._holding_sync))
+
+
+class Viewer:
+    def __init__(self):
+        self.map = Map()
+        self.state = ViewerState()
+        self.layers = []
+
+    def add_subset(self, subset):
+        self.layers.append(LayerArtist(subset, self))
+
+
+def plants():
+    rng = np.random.default_rng(0)
+    # Two groups of plants, about 20 degrees apart
+    lon = np.concatenate([rng.uniform(-101, -99, 30), rng.uniform(-81, -79, 20)])
+    lat = np.concatenate([rng.uniform(39, 41, 30), rng.uniform(34, 36, 20)])
+    types = np.array(["Coal", "Gas", "Solar"])[rng.integers(0, 3, 50)]
+    sizes = rng.choice([1, 4, 9], 50).astype(float)
+    data = Data(Longitude=lon, Latitude=lat, PrimSource=types, Size_binned=sizes, label="Power_Plants")
+    DataCollection([data])
+    return data
+
+
+def test_single_mode_only_resends_changed_tiles():
+    data = plants()
+    viewer = Viewer()
+    widget = SubsetControlWidget(data, viewer, render_mode="single")
+    assert viewer.layers == []
+
+    widget.set_selections([0, 1, 2], [0, 1, 2])
+    shown = [layer for layer in viewer.layers if layer.updates]
+    assert sum(layer.updates[-1][0] for layer in shown) == 30
+    # Each layer's update is sent once, while the map's syncs are held
+    assert all(layer.updates == [(layer.updates[0][0], True)] for layer in shown)
+    n_layers = len(viewer.layers)
+
+    # Moving to the other group reuses the layers, and only resends them
+    for layer in viewer.layers:
+        layer.updates.clear()
+    viewer.state.center = (35, -80)
+    widget._on_view_changed()
+    assert len(viewer.layers) == n_layers
+    assert sum(layer.subset.to_mask().sum() for layer in viewer.layers) == 20
+    assert all(len(layer.updates) <= 1 for layer in viewer.layers)
+
+    # A small pan changes nothing
+    for layer in viewer.layers:
+        layer.updates.clear()
+    viewer.state.center = (35.1, -80.1)
+    widget._on_view_changed()
+    assert all(layer.updates == [] for layer in viewer.layers)
+
+    # Below the clustering zoom level, the points are replaced by clusters
+    viewer.state.zoom_level = 4
+    assert sum(layer.subset.to_mask().sum() for layer in viewer.layers) == 0
+    assert len(widget.clusters) > 0
+    widget.disconnect()
+
+
+def test_single_mode_layers_are_colored_by_type_and_sized_by_bin():
+    data = plants()
+    viewer = Viewer()
+    widget = SubsetControlWidget(data, viewer, render_mode="single")
+    widget.set_selections([0, 1, 2], [0, 1, 2])
+    state = viewer.layers[0].state
+    assert state.color_mode == "Linear"
+    assert state.cmap_att is widget.type_code_att
+    np.testing.assert_array_equal(data[state.cmap_att], data.get_component("PrimSource").codes)
+    assert (state.cmap_vmin, state.cmap_vmax) == (-0.5, 2.5)
+    assert state.cmap.N == 3
+    assert state.size_mode == "Linear"
+    assert state.size_att is widget.size_att
+    assert (state.size_vmin, state.size_vmax) == (0, 9)
+    widget.disconnect()
+
+
+def test_subsets_mode_changes_visibilities_in_one_batch():
+    data = plants()
+    viewer = Viewer()
+    widget = SubsetControlWidget(data, viewer, render_mode="subsets")
+    changes = []
+    for layer in viewer.layers:
+        layer.state.add_callback("visible", lambda visible: changes.append(viewer.map._holding_sync))
+
+    widget.set_selections([0, 2], [1])
+    visible = [layer.state.visible for layer in viewer.layers]
+    assert visible == [(t, s) in [(0, 1), (2, 1)] for t, s in widget.indices]
+    # Only the two layers shown are changed, with the map's syncs held
+    assert changes == [True, True]
+
+    changes.clear()
+    widget.set_selections([0, 2], [1])
+    assert changes == []
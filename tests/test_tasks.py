@@ -0,0 +1,50 @@
+from threading import current_thread
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("cosmicds")
+
+from tempods.tasks import UiDispatcher, remote_executor  # noqa: E402
+
+
+def test_dispatcher_without_loop_runs_callbacks_on_creating_thread():
+    ui = UiDispatcher()
+    assert ui.loop is None
+    threads = []
+
+    def callback(value):
+        threads.append((current_thread(), value))
+
+    remote_executor().submit(ui, callback, 1).result()
+    remote_executor().submit(ui, callback, 2).result()
+    # Nothing runs until the creating thread asks for it
+    assert threads == []
+    with pytest.raises(RuntimeError):
+        remote_executor().submit(ui.run_pending).result()
+
+    # Dispatching from the creating thread runs the queued callbacks first
+    ui(callback, 3)
+    assert threads == [(current_thread(), 1), (current_thread(), 2), (current_thread(), 3)]
+
+    ui.defer(callback, 4)
+    ui.close()
+    remote_executor().submit(ui, callback, 5).result()
+    assert ui.run_pending() == 0
+    assert len(threads) == 3
+
+
+def test_dispatcher_with_loop_runs_callbacks_on_loop():
+    threads = []
+
+    async def main():
+        ui = UiDispatcher()
+        assert ui.loop is asyncio.get_running_loop()
+        ui.defer(threads.append, "deferred")
+        assert threads == []
+        await asyncio.get_running_loop().run_in_executor(remote_executor(), ui, threads.append, current_thread())
+        await asyncio.sleep(0)
+
+    asyncio.run(main())
+    assert threads == ["deferred", current_thread()]
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from tempods.time_axis import TimeAxis
+
+# 2024-11-13 at 12:00, 13:00, 13:40 and 15:00 UTC, deliberately unsorted
+STEPS = [1731502800000, 1731499200000, 1731505200000, 1731510000000]
+
+
+def test_sorted_values_and_labels():
+    axis = TimeAxis(STEPS)
+    assert axis.values.dtype == np.dtype("datetime64[ms]")
+    assert axis.tolist() == sorted(STEPS)
+    assert all(type(step) is int for step in axis.tolist())
+    assert axis.labels() == ["12:00", "13:00", "13:40", "15:00"]
+    assert axis.options()[1] == ("13:00", 1731502800000)
+
+
+def test_index_and_contains():
+    axis = TimeAxis(STEPS)
+    assert axis.index(1731505200000) == 2
+    assert axis.index(1731505200001) == -1
+    assert 1731510000000 in axis
+    assert 0 not in axis
+
+
+def test_nearest():
+    axis = TimeAxis(STEPS)
+    assert axis.nearest(0) == 1731499200000
+    assert axis.nearest(1731502800000 + 1) == 1731502800000
+    assert axis.nearest(1731505200000 + 60000) == 1731505200000
+    assert axis.nearest(10 ** 13) == 1731510000000
+
+
+def test_nearest_fraction():
+    axis = TimeAxis(STEPS)
+    assert axis.nearest_fraction(0) == 1731499200000
+    assert axis.nearest_fraction(1) == 1731510000000
+    # 13:40 is 55.6% of the way through the range
+    assert axis.nearest_fraction(0.55) == 1731505200000
+
+
+def test_single_step_and_empty():
+    axis = TimeAxis([1731499200000])
+    assert axis.nearest_fraction(0.7) == 1731499200000
+    with pytest.raises(ValueError):
+        TimeAxis().nearest(0)
+
+
+def test_timemark():
+    axis = TimeAxis(STEPS)
+    mark = axis.timemark(1731499200000)
+    assert mark.dtype == np.dtype("datetime64[ms]")
+    assert str(mark[0]) == "2024-11-13T12:00:00.000"
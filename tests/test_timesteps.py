@@ -0,0 +1,97 @@
+from datetime import date, timedelta
+
+import time
+
+import pytest
+
+pytest.importorskip("cosmicds")
+
+from tempods.timesteps import ImageServerTimeSteps, TimeStepCatalog  # noqa: E402
+from tempods.transport import Transport, TransportResponse, set_transport  # noqa: E402
+
+DAY = date(2024, 11, 13)
+
+
+class Fetch:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, key):
+        self.calls.append(key)
+        return [1, date.fromisoformat(key).toordinal()]
+
+
+def _settle(catalog):
+    # Wait for the background prefetches to finish
+    catalog._executor.shutdown(wait=True)
+
+
+def test_neighbours_are_prefetched():
+    fetch = Fetch()
+    catalog = TimeStepCatalog(fetch, prefetch_days=2)
+    assert catalog.get_time_steps(DAY) == [1, DAY.toordinal()]
+    _settle(catalog)
+    expected = {(DAY + timedelta(days=offset)).isoformat() for offset in range(-2, 3)}
+    assert set(fetch.calls) == expected
+    assert len(fetch.calls) == len(expected)
+
+
+def test_recent_dates_expire_and_settled_dates_do_not(monkeypatch):
+    fetch = Fetch()
+    catalog = TimeStepCatalog(fetch, ttl=timedelta(hours=1), settled_after=timedelta(days=3), prefetch_days=0)
+    today = date.today()
+    now = time.time()
+    catalog.get_time_steps(today)
+    catalog.get_time_steps(today - timedelta(days=10))
+    assert len(fetch.calls) == 2
+
+    # Two hours later, today's steps are refetched but the older date's aren't
+    monkeypatch.setattr(time, "time", lambda: now + 2 * 3600)
+    catalog.get_time_steps(today)
+    catalog.get_time_steps(today - timedelta(days=10))
+    assert fetch.calls == [today.isoformat(), (today - timedelta(days=10)).isoformat(), today.isoformat()]
+
+
+def test_cache_persists_between_catalogs(tmp_path):
+    path = tmp_path / "timesteps.json"
+    fetch = Fetch()
+    catalog = TimeStepCatalog(fetch, cache_path=path, prefetch_days=0)
+    steps = catalog.get_time_steps(DAY)
+    assert path.exists()
+
+    reloaded_fetch = Fetch()
+    reloaded = TimeStepCatalog(reloaded_fetch, cache_path=path, prefetch_days=0)
+    assert reloaded.get_time_steps(DAY) == steps
+    assert reloaded_fetch.calls == []
+
+
+def test_unreadable_cache_is_ignored(tmp_path):
+    path = tmp_path / "timesteps.json"
+    path.write_text("{not json")
+    fetch = Fetch()
+    catalog = TimeStepCatalog(fetch, cache_path=path, prefetch_days=0)
+    catalog.get_time_steps(DAY)
+    assert fetch.calls == [DAY.isoformat()]
+
+
+class Responses(Transport):
+    def __init__(self, content):
+        self.content = content
+
+    def get(self, url, params=None, timeout=None):
+        return TransportResponse(url, 200, self.content)
+
+
+@pytest.mark.parametrize("content, expected", [
+    (b'{"features": [{"attributes": {"StdTime": 2}}, {"attributes": {"StdTime": 1}}]}', [1, 2]),
+    (b'{"error": {"code": 400, "message": "Invalid query"}}', ["fallback"]),
+    (b'{"features": [{"attributes": {}}]}', ["fallback"]),
+    (b'{"features": []}', ["fallback"]),
+])
+def test_time_steps_fall_back_when_the_query_fails(content, expected):
+    set_transport(Responses(content))
+    try:
+        steps = ImageServerTimeSteps("https://example.com", fallback=lambda key: ["fallback"])
+        assert steps(DAY.isoformat()) == expected
+    finally:
+        set_transport(None)
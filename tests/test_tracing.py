@@ -0,0 +1,70 @@
+import json
+import logging
+
+import pytest
+
+pytest.importorskip("cosmicds")
+
+from tempods.timing import PhaseTimer  # noqa: E402
+from tempods import tracing  # noqa: E402
+from tempods.tracing import Histogram, Tracer  # noqa: E402
+
+
+def test_histogram_percentiles_within_bucket():
+    histogram = Histogram()
+    for ms in range(1, 101):
+        histogram.add(float(ms))
+    summary = histogram.summary()
+    assert summary["count"] == 100
+    assert summary["mean_ms"] == pytest.approx(50.5)
+    assert summary["min_ms"] == 1 and summary["max_ms"] == 100
+    # Buckets double in size, so estimates are within a factor of two
+    assert 50 <= summary["p50_ms"] <= 100
+    assert 95 <= summary["p95_ms"] <= 100
+
+
+def test_tracer_span_and_decorator():
+    tracer = Tracer()
+
+    @tracer.traced("callback")
+    def callback(x):
+        return x * 2
+
+    assert callback(3) == 6
+    with tracer.span("phase"):
+        pass
+    with pytest.raises(ValueError):
+        with tracer.span("phase"):
+            raise ValueError()
+
+    snapshot = tracer.snapshot()
+    assert snapshot["callback"]["count"] == 1
+    assert snapshot["phase"]["count"] == 2
+    tracer.reset()
+    assert tracer.snapshot() == {}
+
+
+def test_disabled_tracer_records_nothing():
+    tracer = Tracer(enabled=False)
+    tracer.traced("callback")(lambda: None)()
+    tracer.record("phase", 0.1)
+    assert tracer.snapshot() == {}
+
+
+def test_log_snapshot(monkeypatch):
+    records = []
+    monkeypatch.setattr(tracing.logger, "log", lambda level, message: records.append((level, message)))
+    tracer = Tracer()
+    tracer.record("phase", 0.002)
+    tracer.log_snapshot()
+    level, message = records[0]
+    assert level == logging.INFO
+    assert json.loads(message)["trace"]["phase"]["count"] == 1
+
+
+def test_phase_timer_records_phases(monkeypatch):
+    tracer = Tracer()
+    monkeypatch.setattr("tempods.timing.TRACER", tracer)
+    timer = PhaseTimer(trace="startup")
+    timer.mark("load_data")
+    assert tracer.snapshot()["startup.load_data"]["count"] == 1
@@ -0,0 +1,116 @@
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+
+import time
+
+import pytest
+
+pytest.importorskip("cosmicds")
+
+from tempods.transport import (  # noqa: E402
+    LiveTransport, RecordingTransport, ReplayTransport, Transport, TransportError, TransportResponse,
+)
+
+
+class FakeTransport(Transport):
+    def __init__(self):
+        self.calls = []
+
+    def get(self, url, params=None, timeout=None):
+        self.calls.append((url, params))
+        body = f"{url} {sorted((params or {}).items())}".encode()
+        return TransportResponse(url, 200, body, {"Content-Type": "application/json", "Date": "now"})
+
+
+def test_recorded_responses_replay(tmp_path):
+    live = FakeTransport()
+    recorder = RecordingTransport(tmp_path, live)
+    url = "https://example.com/ImageServer/exportImage"
+    recorded = recorder.get(url, params={"time": 1, "f": "image"})
+
+    replay = ReplayTransport(tmp_path)
+    # Parameter order doesn't matter
+    replayed = replay.get(url, params={"f": "image", "time": 1})
+    assert replayed.status_code == recorded.status_code
+    assert replayed.content == recorded.content
+    assert replayed.headers == {"Content-Type": "application/json"}
+    assert len(live.calls) == 1
+
+    with pytest.raises(TransportError):
+        replay.get(url, params={"time": 2, "f": "image"})
+
+
+class Handler(BaseHTTPRequestHandler):
+    # Set by each test: a list of (status, headers) to reply with, then 200s
+    replies = []
+    delay = 0
+    active = 0
+    max_active = 0
+    lock = Lock()
+
+    def do_GET(self):
+        cls = type(self)
+        with cls.lock:
+            cls.active += 1
+            cls.max_active = max(cls.max_active, cls.active)
+            status, headers = cls.replies.pop(0) if cls.replies else (200, {})
+        time.sleep(cls.delay)
+        with cls.lock:
+            cls.active -= 1
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    Handler.replies, Handler.delay, Handler.active, Handler.max_active = [], 0, 0, 0
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}/"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_retries_after_requested_delay(server):
+    Handler.replies = [(503, {"Retry-After": "0.3"}), (500, {})]
+    transport = LiveTransport(retries=2, backoff_factor=0.01)
+    start = time.perf_counter()
+    response = transport.get(server)
+    assert response.status_code == 200
+    assert time.perf_counter() - start >= 0.3
+    host = transport.metrics.snapshot()
+    assert next(iter(host.values()))["requests"] == 3
+
+    Handler.replies = [(503, {})] * 3
+    assert LiveTransport(retries=1, backoff_factor=0.01).get(server).status_code == 503
+
+
+def test_limits_concurrent_requests_per_host(server):
+    Handler.delay = 0.1
+    transport = LiveTransport(max_per_host=2)
+    with ThreadPoolExecutor(6) as executor:
+        statuses = list(executor.map(lambda _: transport.get(server).status_code, range(6)))
+    assert statuses == [200] * 6
+    assert Handler.max_active == 2
+
+
+def test_waiting_retry_does_not_hold_host_slot(server):
+    Handler.replies = [(429, {"Retry-After": "1"})]
+    transport = LiveTransport(max_per_host=1, retries=1)
+    with ThreadPoolExecutor(1) as executor:
+        retried = executor.submit(transport.get, server)
+        time.sleep(0.2)
+        start = time.perf_counter()
+        assert transport.get(server).status_code == 200
+        assert time.perf_counter() - start < 0.5
+        assert not retried.done()
+        assert retried.result(timeout=5).status_code == 200